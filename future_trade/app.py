@@ -14,6 +14,7 @@ from typing import Any, Dict
 # =========================
 from future_trade.config_loader import load_config
 from future_trade.exchange_utils import ExchangeNormalizer
+from future_trade.exchange_cache import ExchangeMetaCache
 
 # =========================
 # 2) Temel Bileşenler
@@ -32,11 +33,18 @@ from future_trade.order_reconciler import OrderReconciler
 from future_trade.order_manager import OrderManager
 from future_trade.position_supervisor import PositionSupervisor
 from future_trade.stop_manager import StopManager
+from future_trade.trailing_engine import TrailingEngine
 from future_trade.take_profit_manager import TakeProfitManager
 from future_trade.protective_sweeper import ProtectiveSweeper
 from future_trade.oco_watcher import OCOWatcher
 from future_trade.klines_cache import KlinesCache
 from future_trade.loops import position_risk_guard_loop
+from future_trade.liquidation_guard import LiquidationGuard
+from future_trade.equity_tracker import EquityTracker
+from future_trade.cooldown import CooldownService
+from future_trade.position_index import PositionIndex
+from future_trade.strategy_runtime import StrategyRuntime
+from future_trade.shard_coordinator import CoordinatorClient, ShardLink, shard_db_path, shard_symbols
 from future_trade.loops import performance_guard_loop
 # =========================
 # 4) Strateji Sistemi
@@ -65,11 +73,20 @@ from future_trade.loops import (
 CONFIG_PATH = Path("/opt/tradebot/future_trade/config.json")
 
 
-async def main() -> None:
+async def main(shard_index: int = None, shard_count: int = None, coordinator_path: str = None) -> None:
+    """
+    Tek süreç (varsayılan) ya da shard worker'ı: shard_count > 1 iken whitelist'in
+    shard_index. parçası işlenir, positions_cache shard'a özel DB'dedir ve global limitler /
+    kill-switch coordinator_path'teki ShardCoordinator üzerinden paylaşılır (run_futures.py --workers).
+    """
+    sharded = bool(shard_count and shard_count > 1 and coordinator_path)
     # ================
     # 1) LOG & BOOT
     # ================
-    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    log_fmt = "%(asctime)s %(levelname)s %(message)s"
+    if sharded:
+        log_fmt = f"%(asctime)s %(levelname)s [shard {shard_index}/{shard_count}] %(message)s"
+    logging.basicConfig(level=logging.INFO, format=log_fmt)
     logger = logging.getLogger("TradeBot")
     print("Futures bot starting...")
 
@@ -86,6 +103,16 @@ async def main() -> None:
         logging.error(f"Config load failed: {e}")
         return
 
+    if sharded:
+        # worker yalnız kendi sembollerini işler; pozisyon DB'si shard'a özel
+        cfg["symbols_whitelist"] = shard_symbols(cfg.get("symbols_whitelist") or [], shard_index, shard_count)
+        cfg["database"]["path"] = shard_db_path(cfg["database"]["path"], shard_index)
+        logging.info(f"[SHARD] {shard_index}/{shard_count}: {len(cfg['symbols_whitelist'])} symbols, "
+                     f"db={cfg['database']['path']}")
+        if not cfg["symbols_whitelist"]:
+            logging.warning("[SHARD] empty shard; worker exiting")
+            return
+
     # =======================
     # 3) NOTIFIER (persistence henüz yok → None ver)
     # =======================
@@ -107,6 +134,14 @@ async def main() -> None:
             logger=logging.getLogger("db"),
         )
         persistence.init_schema()
+        # symbol_state bellekte; yazmalar toplu flush ile
+        state_store = persistence.enable_state_store(
+            flush_sec=float((cfg.get("persistence") or {}).get("state_flush_sec", 2.0))
+        )
+        # giriş kapıları için pozisyon sayaç indeksi (supervisor + order manager ortak)
+        persistence.attach_position_index(PositionIndex(
+            groups=cfg.get("correlation_groups") or {}, logger=logging.getLogger("position_index"),
+        ))
         # Notifier’a persistence bağla (DB aynalama için)
         notifier.persistence = persistence
         await notifier.info_trades({"event": "startup", "msg": "✅ Database schema OK"})
@@ -148,14 +183,16 @@ async def main() -> None:
     try:
         portfolio = Portfolio(persistence)
 
-        # 6.1) exchangeInfo cache
+        # 6.1) exchangeInfo + leverageBracket ön-yükleme (disk önbelleği, tek çağrı/uç)
+        meta_cache = ExchangeMetaCache(client, cfg.get("exchange_cache", {}), logger=logging.getLogger("exchange_cache"))
         try:
-            ex_info = await client.exchange_info()
-            portfolio.exchange_info_cache = ex_info
-            logging.info("ExchangeInfo cached (%d symbols)", len(ex_info.get("symbols", [])))
+            src = await meta_cache.preload()
+            logging.info("ExchangeInfo cached (%d symbols, %d bracket sets, source=%s)",
+                         len(meta_cache.exchange_info.get("symbols", [])), len(meta_cache.brackets), src)
         except Exception as e:
-            logging.warning(f"exchangeInfo fetch skipped: {e}")
-            portfolio.exchange_info_cache = {"symbols": []}
+            logging.warning(f"exchangeInfo preload skipped: {e}")
+        portfolio.exchange_info_cache = meta_cache.exchange_info
+        meta_cache.add_listener(lambda c: setattr(portfolio, "exchange_info_cache", c.exchange_info))
 
         # 6.2) RiskManager
         risk = RiskManager(cfg.get("risk", {}), cfg.get("leverage", {}), portfolio)
@@ -163,6 +200,7 @@ async def main() -> None:
         risk.bind_trailing_cfg(cfg.get("trailing", {}))
         risk.bind_client(client)
         risk.bind_margin_cfg(cfg.get("margin_guard", {}))
+        meta_cache.add_listener(lambda c: risk.seed_brackets(c.brackets))
         # ATR provider, klines kurulduktan sonra bağlanacak
         logging.info("Portfolio and RiskManager ready")
     except Exception as e:
@@ -179,6 +217,7 @@ async def main() -> None:
             logger=logger,
             whitelist=cfg["symbols_whitelist"],
             tf_entry=cfg["strategy"]["timeframe_entry"],
+            tf_confirm=cfg["strategy"].get("timeframe_confirm"),
             global_db="/opt/tradebot/veritabani/global_data.db",
         )
         logging.info("MarketStream initialized")
@@ -193,6 +232,12 @@ async def main() -> None:
     try:
         strat_cfg = cfg.get("strategy", {}) or {}
         strat_name = strat_cfg.get("name", "dominance_trend")
+        if cfg.get("strategies"):
+            # çoklu strateji: tek veri hattı, N on_bar; strat_loop'a tek strateji gibi görünür
+            strategy = StrategyRuntime.from_cfg(
+                cfg, STRATEGY_REGISTRY, persistence=persistence, logger=logging.getLogger("strategy_runtime"),
+            )
+            logging.info(f"✅ Strategy runtime: {[s.id for s in strategy.slots]}")
         strat_cls = (
             STRATEGY_REGISTRY.get(strat_name)
             or STRATEGY_REGISTRY.get("dominance_trend")
@@ -200,8 +245,9 @@ async def main() -> None:
         )
         if strat_cls is None:
             raise RuntimeError(f"Strategy registry boş; '{strat_name}' yüklenemedi")
-        strategy = strat_cls(strat_cfg)
-        logging.info(f"✅ Strategy selected: {strat_name} → {strategy.__class__.__name__}")
+        if not cfg.get("strategies"):
+            strategy = strat_cls(strat_cfg)
+            logging.info(f"✅ Strategy selected: {strat_name} → {strategy.__class__.__name__}")
     except Exception as e:
         logging.error(f"❌ Strategy init failed: {e}")
         await notifier.alert({"event": "startup_error", "msg": f"❌ Strategy failed: {e}"})
@@ -225,6 +271,7 @@ async def main() -> None:
     # =======================
     try:
         normalizer = ExchangeNormalizer(binance_client=client, logger=logging.getLogger("normalizer"))
+        meta_cache.add_listener(lambda c: normalizer.load_exchange_info(c.exchange_info))
 
         router = OrderRouter(
             config=cfg,
@@ -323,6 +370,62 @@ async def main() -> None:
         interval_sec=5,
     )
 
+    # Olay veriyolu: koruyucu yöneticiler emir/pozisyon olayıyla uyanır, interval yalnız güvenlik turu
+    bus = stream.bus
+    bus_cfg = cfg.get("event_bus") or {}
+    idle_sec = float(bus_cfg.get("idle_sweep_sec", 120))
+    tp_manager.bind_bus(bus, idle_sec=idle_sec)
+    sweeper.bind_bus(bus, idle_sec=idle_sec)
+    oco.bind_bus(bus, idle_sec=max(5.0, float(bus_cfg.get("oco_idle_sec", 30))))
+    reconciler.bind_bus(bus)
+
+    # Shard modu: global limit rezervasyonu + global halt koordinatör üzerinden
+    shard_link = None
+    if sharded:
+        sh_cfg = cfg.get("shard") or {}
+        shard_link = ShardLink(
+            CoordinatorClient(coordinator_path, shard_index, timeout=float(sh_cfg.get("timeout_sec", 3.0)),
+                              logger=logging.getLogger("shard_client")),
+            persistence, kill_switch=kill_switch,
+            interval_sec=float(sh_cfg.get("sync_sec", 5.0)),
+            fail_open=bool(sh_cfg.get("fail_open", False)),
+            logger=logging.getLogger("shard_link"),
+        )
+        shard_link.bind_bus(bus)
+        order_manager.bind_coordinator(shard_link)
+        kill_switch.bind_coordinator(shard_link)
+        sweeper.bind_scope(cfg["symbols_whitelist"])
+
+    # Dinamik cooldown: faktörler bar kapanışında paylaşılan klines'tan, giriş sayacı bellekte
+    cooldown_svc = CooldownService(
+        cfg, klines=klines, persistence=persistence,
+        tf_entry=cfg["strategy"]["timeframe_entry"],
+        logger=logging.getLogger("cooldown"),
+    )
+    cooldown_svc.seed_entries(cfg.get("symbols_whitelist") or [])
+    klines.add_listener(cooldown_svc.on_klines)
+    cooldown_svc.bind_bus(bus)
+    supervisor.bind_cooldown_service(cooldown_svc)
+    cooldown_svc.add_entry_listener(supervisor.start_cooldown)
+    order_manager.bind_cooldown(cooldown_svc)
+
+    # Gerçek zamanlı equity: ACCOUNT_UPDATE → cüzdan, tick → uPnL; Kill-Switch her değişimde değerlendirir
+    equity_tracker = EquityTracker(
+        start_equity=float((cfg.get("risk") or {}).get("start_equity_usdt", 0) or 0),
+        logger=logging.getLogger("equity_tracker"),
+    )
+    if shard_link is not None:
+        # diğer shard'ların tick'i bu süreçte akmaz → yalnız kendi uPnL'imiz; hesap equity'si koordinatörde
+        equity_tracker.bind_scope(cfg["symbols_whitelist"])
+        shard_link.bind_equity_tracker(equity_tracker)
+    await equity_tracker.seed(client=client, persistence=persistence, price_provider=stream.get_last_price)
+    if getattr(client, "paper", False):
+        # paper: ACCOUNT_UPDATE yok → açılan/kapanan pozisyonlar positions_cache yazımlarından
+        persistence.attach_equity_tracker(equity_tracker)
+    stream.add_tick_listener(equity_tracker.on_tick)
+    portfolio.bind_equity_tracker(equity_tracker)
+    kill_switch.bind_equity_tracker(equity_tracker)
+
     # =======================
     # 12) USER-DATA STREAM (WS + keepalive)
     # =======================
@@ -336,6 +439,8 @@ async def main() -> None:
         logger=logging.getLogger("uds"),
         ws_base_url=cfg["binance"].get("ws_url", "wss://fstream.binance.com"),
         risk=risk,
+        bus=bus,
+        equity_tracker=equity_tracker,
     )
 
     # =======================
@@ -357,8 +462,13 @@ async def main() -> None:
     # 14.1 – MarketStream
     tasks.append(asyncio.create_task(stream.run(), name="stream"))
 
-    # 14.2 – Klines/ATR
+    # 14.2 – Klines/ATR (+ cooldown giriş sayacı)
     tasks.append(asyncio.create_task(klines.run(stop), name="klines"))
+    tasks.append(asyncio.create_task(cooldown_svc.run(stop), name="cooldown"))
+    tasks.append(asyncio.create_task(state_store.run(stop), name="symbol_state_flush"))
+
+    if shard_link is not None:
+        tasks.append(asyncio.create_task(shard_link.run(stop), name="shard_link"))
 
     # 14.3 – Strateji
     tasks.append(asyncio.create_task(
@@ -369,15 +479,32 @@ async def main() -> None:
         name="strat_loop",
     ))
 
-    # 14.4 – Trailing
-    tasks.append(asyncio.create_task(
-        trailing_loop(router, stream, notifier, cfg, stop),
-        name="trailing",
-    ))
+    # 14.4 – Trailing (event: tick güdümlü motor | poll: eski periyodik döngü)
+    tr_cfg = cfg.get("trailing") or {}
+    tr_engine_mode = (tr_cfg.get("engine") or "event").lower()
+    if tr_engine_mode == "poll" and (tr_cfg.get("mode") or "emulated").lower() != "native":
+        tasks.append(asyncio.create_task(
+            trailing_loop(router, stream, notifier, cfg, stop, bus=bus),
+            name="trailing",
+        ))
+    else:
+        trailing_engine = TrailingEngine(
+            cfg, stop_manager, persistence,
+            get_atr=klines.get_atr,
+            get_price=stream.get_last_price,
+            logger=logging.getLogger("trailing_engine"),
+        )
+        trailing_engine.sync_positions()
+        trailing_engine.bind_bus(bus)
+        stream.add_tick_listener(trailing_engine.on_tick)
+        tasks.append(asyncio.create_task(
+            trailing_engine.run(stop),
+            name="trailing",
+        ))
 
     # 14.5 – Kill-Switch loop
     tasks.append(asyncio.create_task(
-        kill_switch_loop(kill_switch, notifier, interval_sec=10, stop_event=stop),
+        kill_switch_loop(kill_switch, notifier, interval_sec=10, stop_event=stop, bus=bus),
         name="kill_switch",
     ))
 
@@ -428,12 +555,28 @@ async def main() -> None:
     name="pnl_daily_summary",
     ))
 
+    # 14.13 – exchangeInfo/leverageBracket arka plan yenileme
+    tasks.append(asyncio.create_task(
+        meta_cache.run(stop),
+        name="exchange_meta_refresh",
+    ))
+
     await notifier.info_trades({"event": "startup", "msg": "✅ All modules initialized. Bot is running."})
     logging.info("All tasks scheduled. Bot is running.")
 
-     # 14.13 – Position Risk Guard (liq proximity)
+     # 14.14 – Position Risk Guard (liq proximity)
     pr_cfg = cfg.get("position_risk_guard", {}) or {}
-    if pr_cfg.get("enabled", True):
+    if pr_cfg.get("enabled", True) and (pr_cfg.get("engine") or "local").lower() != "poll":
+        # yerel liq hesabı + tick kontrolü; positionRisk yalnız periyodik doğrulama
+        liq_guard = LiquidationGuard(
+            pr_cfg, notifier, persistence, client=client, risk=risk,
+            logger=logging.getLogger("pos_risk_guard"),
+        )
+        liq_guard.sync_positions()
+        liq_guard.bind_bus(bus)
+        stream.add_tick_listener(liq_guard.on_tick)
+        tasks.append(asyncio.create_task(liq_guard.run(stop), name="position_risk_guard"))
+    elif pr_cfg.get("enabled", True):
         pr_symbols = pr_cfg.get("symbols") or cfg.get("symbols_whitelist") or []
         tasks.append(asyncio.create_task(
             position_risk_guard_loop(
@@ -445,11 +588,12 @@ async def main() -> None:
                 interval_sec=int(pr_cfg.get("interval_sec", 60)),
                 warn_pct=float(pr_cfg.get("distance_warn_pct", 3.0)),
                 crit_pct=float(pr_cfg.get("distance_crit_pct", 1.5)),
+                bus=bus,
             ),
             name="position_risk_guard",
         ))
         
-        # 14.14 Performance Guard (intra-day PF & loss streak)
+        # 14.15 Performance Guard (intra-day PF & loss streak)
     pg = cfg.get("performance_guard", {}) or {}
     if pg.get("enabled", True):
         tasks.append(asyncio.create_task(
@@ -463,6 +607,7 @@ async def main() -> None:
                 min_trades=int(pg.get("min_trades", 5)),
                 cooldown_sec=int(pg.get("cooldown_sec", 900)),
                 tz_offset_hours=int(pg.get("tz_offset_hours", 3)),
+                bus=bus,
             ),
             name="performance_guard",
         ))
@@ -0,0 +1,205 @@
+# /opt/tradebot/future_trade/bar_aggregator.py
+# -*- coding: utf-8 -*-
+"""
+Çoklu zaman dilimi bar toplayıcı.
+
+Sembol başına TEK besleme (1m kline ya da trade/tick fiyatı) alır; 1m/5m/15m/1h/4h/1d
+barlarını yerelde kurar. Kova sınırları epoch'a hizalıdır: start = ts // tf_sec * tf_sec,
+bar kapanış zamanı = start + tf_sec (Binance kline sınırlarıyla aynı, UTC).
+
+- on_trade(symbol, price, ts, qty): her fiyat tüm açık kovaları günceller; kova sınırı
+  aşılınca eski kova kapanır.
+- on_kline(symbol, open_time, o, h, l, c, v): kapanmış 1m mum üst TF'lere katlanır; üst TF'nin
+  son dakikası geldiyse sonraki beslemeyi beklemeden kapanır.
+- flush(now): işlem gelmeyen sembollerde süresi dolan kovaları zamanlayıcıyla kapatır.
+
+Her kapanışta on_bar(event) çağrılır:
+    {"type":"bar_closed","symbol","tf","open","high","low","close","volume",
+     "open_time","time"(=kapanış sınırı),"ema20"}
+Kapanmış barlar TF başına sınırlı geçmişte tutulur (history / last / snapshot).
+"""
+from __future__ import annotations
+
+import logging
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from future_trade.strategy.indicators import EmaState
+
+DEFAULT_TIMEFRAMES = ("1m", "5m", "15m", "1h", "4h", "1d")
+
+_UNIT_SEC = {"m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+
+def tf_seconds(tf: str) -> int:
+    """'15m' → 900, '4h' → 14400, '1d' → 86400. Tanınmayan TF için ValueError."""
+    s = str(tf).strip().lower()
+    try:
+        n = int(s[:-1])
+        unit = _UNIT_SEC[s[-1]]
+    except (ValueError, KeyError, IndexError):
+        raise ValueError(f"unsupported timeframe: {tf}")
+    if n <= 0:
+        raise ValueError(f"unsupported timeframe: {tf}")
+    return n * unit
+
+
+class BarAggregator:
+    def __init__(
+        self,
+        timeframes: Iterable[str] = DEFAULT_TIMEFRAMES,
+        history: int = 200,
+        ema_period: int = 20,
+        on_bar: Optional[Callable[[Dict[str, Any]], Any]] = None,
+        logger=None,
+    ):
+        tfs = {str(t).lower() for t in (timeframes or DEFAULT_TIMEFRAMES)}
+        # küçükten büyüğe: kapanışlar da bu sırada yayınlanır (1m → 5m → … → 1d)
+        self.timeframes: List[str] = sorted(tfs, key=tf_seconds)
+        self._sec = {tf: tf_seconds(tf) for tf in self.timeframes}
+        self.history = max(1, int(history))
+        self.ema_period = int(ema_period)
+        self.on_bar = on_bar
+        self.logger = logger or logging.getLogger("bar_aggregator")
+
+        self._open: Dict[str, Dict[str, Dict[str, Any]]] = {}      # {symbol: {tf: açık kova}}
+        self._closed: Dict[str, Dict[str, deque]] = {}              # {symbol: {tf: deque[bar]}}
+        self._ema: Dict[str, Dict[str, EmaState]] = {}              # {symbol: {tf: EmaState}}
+
+    # ---------- iç ----------
+    def _sym(self, symbol: str) -> Dict[str, Dict[str, Any]]:
+        o = self._open.get(symbol)
+        if o is None:
+            o = self._open[symbol] = {}
+            self._closed[symbol] = {tf: deque(maxlen=self.history) for tf in self.timeframes}
+            self._ema[symbol] = {tf: EmaState(self.ema_period) for tf in self.timeframes}
+        return o
+
+    def _close(self, symbol: str, tf: str, bar: Dict[str, Any]) -> Dict[str, Any]:
+        ev = {
+            "type": "bar_closed",
+            "symbol": symbol,
+            "tf": tf,
+            "open": bar["open"],
+            "high": bar["high"],
+            "low": bar["low"],
+            "close": bar["close"],
+            "volume": bar["volume"],
+            "open_time": bar["start"],
+            "time": bar["start"] + self._sec[tf],
+            "ema20": self._ema[symbol][tf].update(bar["close"]),
+        }
+        self._closed[symbol][tf].append(ev)
+        if self.on_bar is not None:
+            try:
+                self.on_bar(ev)
+            except Exception as e:
+                self.logger.debug(f"[BARS] on_bar failed for {symbol} {tf}: {e}")
+        return ev
+
+    def _stale(self, symbol: str, tf: str, start: int) -> bool:
+        """Kova zaten kapandıysa (geç gelen veri) True — aynı bar iki kez yayınlanmaz."""
+        dq = self._closed[symbol][tf]
+        return bool(dq) and start <= dq[-1]["open_time"]
+
+    @staticmethod
+    def _merge(bar: Dict[str, Any], o: float, h: float, l: float, c: float, v: float) -> None:
+        if h > bar["high"]:
+            bar["high"] = h
+        if l < bar["low"]:
+            bar["low"] = l
+        bar["close"] = c
+        bar["volume"] += v
+
+    # ---------- besleme ----------
+    def on_trade(self, symbol: str, price: float, ts: Optional[float] = None, qty: float = 0.0) -> List[Dict[str, Any]]:
+        """Tek fiyat/işlem: sınırı aşılan kovalar kapanır; kapanan bar event'leri döndürülür."""
+        price = float(price)
+        if price <= 0:
+            return []
+        ts = int(ts if ts is not None else time.time())
+        opened = self._sym(symbol)
+        out: List[Dict[str, Any]] = []
+        for tf in self.timeframes:
+            start = ts - ts % self._sec[tf]
+            bar = opened.get(tf)
+            if bar is not None and start > bar["start"]:
+                out.append(self._close(symbol, tf, bar))
+                bar = None
+            if bar is None:
+                if self._stale(symbol, tf, start):
+                    continue
+                opened[tf] = {"start": start, "open": price, "high": price, "low": price,
+                              "close": price, "volume": float(qty or 0.0)}
+            elif start == bar["start"]:
+                self._merge(bar, price, price, price, price, float(qty or 0.0))
+        return out
+
+    def on_kline(self, symbol: str, open_time: float, o: float, h: float, l: float, c: float,
+                 v: float = 0.0, interval_sec: int = 60) -> List[Dict[str, Any]]:
+        """
+        KAPANMIŞ taban mum (varsayılan 1m). Mum, sınırı içine düşen her TF kovasına katlanır;
+        mumun bitişi TF sınırına denk geliyorsa o TF hemen kapanır (sonraki beslemeyi beklemez).
+        """
+        start_base = int(open_time)
+        end = start_base + int(interval_sec)
+        o, h, l, c, v = float(o), float(h), float(l), float(c), float(v or 0.0)
+        opened = self._sym(symbol)
+        out: List[Dict[str, Any]] = []
+        for tf in self.timeframes:
+            sec = self._sec[tf]
+            if sec < interval_sec:
+                continue  # tabandan küçük TF taban mumdan kurulamaz
+            start = start_base - start_base % sec
+            bar = opened.get(tf)
+            if bar is not None and start > bar["start"]:
+                out.append(self._close(symbol, tf, bar))   # boşluk sonrası yarım kalan kova
+                bar = None
+            if bar is None:
+                if self._stale(symbol, tf, start):
+                    continue
+                bar = opened[tf] = {"start": start, "open": o, "high": h, "low": l, "close": c, "volume": v}
+            elif start == bar["start"]:
+                self._merge(bar, o, h, l, c, v)
+            else:
+                continue
+            if end >= start + sec:
+                out.append(self._close(symbol, tf, bar))
+                opened.pop(tf, None)
+        return out
+
+    def flush(self, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Süresi dolmuş açık kovaları kapatır (sessiz semboller için zamanlayıcı)."""
+        now = int(now if now is not None else time.time())
+        out: List[Dict[str, Any]] = []
+        for symbol, opened in self._open.items():
+            for tf in self.timeframes:
+                bar = opened.get(tf)
+                if bar is not None and now >= bar["start"] + self._sec[tf]:
+                    out.append(self._close(symbol, tf, bar))
+                    opened.pop(tf, None)
+        return out
+
+    # ---------- okuma ----------
+    def history_of(self, symbol: str, tf: str, n: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Kapanmış barlar (eski → yeni); n verilirse son n bar."""
+        dq = (self._closed.get(symbol) or {}).get(tf)
+        if not dq:
+            return []
+        bars = list(dq)
+        return bars[-int(n):] if n else bars
+
+    def last(self, symbol: str, tf: str) -> Optional[Dict[str, Any]]:
+        dq = (self._closed.get(symbol) or {}).get(tf)
+        return dq[-1] if dq else None
+
+    def forming(self, symbol: str, tf: str) -> Optional[Dict[str, Any]]:
+        """Henüz kapanmamış kova (kopya) — yalnız bilgi amaçlı; sinyalde kapanmış bar kullanın."""
+        bar = (self._open.get(symbol) or {}).get(tf)
+        return dict(bar) if bar else None
+
+    def snapshot(self, symbol: str) -> Dict[str, Optional[Dict[str, Any]]]:
+        """{tf: son kapanmış bar | None} — strateji bağlamı için."""
+        closed = self._closed.get(symbol) or {}
+        return {tf: (closed[tf][-1] if closed.get(tf) else None) for tf in self.timeframes}
@@ -162,11 +162,7 @@ class BinanceClient:
                 "availableBalance": "1000"
             }
 
-        get = getattr(self, "_get_signed", None) or getattr(self, "http_get_signed", None)
-        if not callable(get):
-            raise RuntimeError("signed GET helper not found")
-
-        return await get("/fapi/v2/account", params={})
+        return await self._signed("GET", "/fapi/v2/account", {})
     
     
     async def get_position_risk(self, symbol: str = None):
@@ -221,6 +217,17 @@ class BinanceClient:
 
         return [{"symbol": symbol, "brackets": brackets}]
 
+    async def get_all_leverage_brackets(self):
+        """
+        /fapi/v1/leverageBracket (symbol parametresiz) – TÜM semboller tek çağrıda.
+        Ham Binance listesi döner: [{"symbol": "...", "brackets": [{"notionalFloor", "notionalCap", "maintMarginRatio", "cum"}, ...]}, ...]
+        """
+        if getattr(self, "mode", "paper").lower() == "paper" and getattr(self, "_paper_network_disabled", True):
+            return [{"symbol": s, "brackets": [{"floor": 0.0, "cap": 1e12, "mmr": 0.004}]}
+                    for s in ("BTCUSDT", "ETHUSDT", "SOLUSDT")]
+        res = await self._signed("GET", "/fapi/v1/leverageBracket", {})
+        return res if isinstance(res, list) else [res]
+
 
     async def get_available_usdt(self) -> float:
         acc = await self.get_account()
@@ -286,6 +293,66 @@ class BinanceClient:
         if origClientOrderId: p["origClientOrderId"] = origClientOrderId
         return await self._signed("DELETE", "/fapi/v1/order", p)
 
+    async def cancel_batch_orders(self, symbol: str, order_ids=None, client_order_ids=None):
+        """
+        Tek istekte en fazla 10 emir iptali (DELETE /fapi/v1/batchOrders).
+        Dönüş: emir başına sonuç listesi (başarısız olanlar {"code","msg"} taşır).
+        """
+        import json
+        order_ids = [int(x) for x in (order_ids or [])][:10]
+        client_order_ids = [str(x) for x in (client_order_ids or [])][:10]
+        if self.paper:
+            logging.info("paper: cancel_batch_orders stub %s %s %s", symbol, order_ids, client_order_ids)
+            return [{"paper": True, "status": "CANCELED", "orderId": i} for i in order_ids] + \
+                   [{"paper": True, "status": "CANCELED", "clientOrderId": c} for c in client_order_ids]
+        p = {"symbol": symbol}
+        if order_ids:
+            p["orderIdList"] = json.dumps(order_ids, separators=(",", ":"))
+        elif client_order_ids:
+            p["origClientOrderIdList"] = json.dumps(client_order_ids, separators=(",", ":"))
+        else:
+            return []
+        return await self._signed("DELETE", "/fapi/v1/batchOrders", p)
+
+    async def cancel_all_open_orders(self, symbol: str):
+        """Sembolün TÜM açık emirlerini tek istekte iptal eder (DELETE /fapi/v1/allOpenOrders)."""
+        if self.paper:
+            logging.info("paper: cancel_all_open_orders stub %s", symbol)
+            return {"paper": True, "code": 200, "msg": "success"}
+        return await self._signed("DELETE", "/fapi/v1/allOpenOrders", {"symbol": symbol})
+
+    async def place_batch_orders(self, orders):
+        """
+        Tek istekte en fazla 5 emir (POST /fapi/v1/batchOrders).
+        orders: [{"symbol","side","type","quantity",...}, ...] (değerler string'e çevrilir)
+        Dönüş: emir başına sonuç listesi (başarısız olanlar {"code","msg"} taşır).
+        """
+        import json
+        batch = [{k: (v if isinstance(v, str) else str(v).lower() if isinstance(v, bool) else str(v))
+                  for k, v in o.items() if v is not None} for o in (orders or [])[:5]]
+        if not batch:
+            return []
+        if self.paper:
+            logging.info("paper: place_batch_orders stub %s", batch)
+            return [{"paper": True, "status": "FILLED", **o} for o in batch]
+        return await self._signed("POST", "/fapi/v1/batchOrders",
+                                  {"batchOrders": json.dumps(batch, separators=(",", ":"))})
+
+    async def modify_order(self, symbol: str, side: str, quantity, price, orderId: int = None,
+                           origClientOrderId: str = None, **kwargs) -> Dict[str, Any]:
+        """
+        PUT /fapi/v1/order – yerinde değiştirme (Binance yalnız LIMIT emirlerde price/quantity değiştirir).
+        orderId ve clientOrderId korunur; iptal+yeni emir gerekmez.
+        """
+        p = {"symbol": symbol, "side": side, "quantity": quantity, "price": price}
+        if orderId: p["orderId"] = orderId
+        if origClientOrderId: p["origClientOrderId"] = origClientOrderId
+        p.update(kwargs)
+        if self.paper:
+            logging.info("paper: modify_order stub %s", p)
+            return {"paper": True, "status": "NEW", "orderId": orderId, "clientOrderId": origClientOrderId, "params": p}
+        return await self._signed("PUT", "/fapi/v1/order", p)
+
     async def get_order(self, symbol: str, **kwargs) -> dict:
         if self.paper:
             return {"paper": True, "symbol": symbol, **kwargs}
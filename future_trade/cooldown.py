@@ -1,6 +1,8 @@
 # /opt/tradebot/future_trade/cooldown.py
 from __future__ import annotations
-from typing import Dict, Any, Tuple
+from collections import deque
+from typing import Dict, Any, Optional, Tuple
+import logging
 import math
 import time
 
@@ -32,15 +34,21 @@ def _series_from_kl(kl):
     return highs, lows, closes
 
 async def volatility_factor(client, symbol: str, tf: str, vol_cfg: Dict[str, Any]) -> float:
+    lb = int(vol_cfg.get("lookback_bars", 14))
+    kl = await _klines(client, symbol, tf, max(lb + 2, 20))
+    if len(kl) < lb + 1:
+        return 1.0
+    h, l, c = _series_from_kl(kl)
+    return _volatility_from_series(h, l, c, vol_cfg)
+
+def _volatility_from_series(h, l, c, vol_cfg: Dict[str, Any]) -> float:
     lb = int(vol_cfg.get("lookback_bars", 14))
     v_lo = float(vol_cfg.get("natr_low", 0.01))
     v_hi = float(vol_cfg.get("natr_high", 0.05))
     f_lo = float(vol_cfg.get("factor_low", 1.3))
     f_hi = float(vol_cfg.get("factor_high", 0.7))
-    kl = await _klines(client, symbol, tf, max(lb + 2, 20))
-    if len(kl) < lb + 1:
+    if len(c) < lb + 1:
         return 1.0
-    h, l, c = _series_from_kl(kl)
     a = atr(h, l, c, period=lb)
     if not a or math.isnan(a):
         return 1.0
@@ -82,12 +90,15 @@ def _count_recent_entries_fallback(persistence, symbol: str, since_ts: int) -> i
 
 async def frequency_factor(persistence, symbol: str, tf: str, freq_cfg: Dict[str, Any]) -> float:
     window_bars = int(freq_cfg.get("window_bars", 50))
-    max_trades  = int(freq_cfg.get("max_trades", 5))
-    f_lo = float(freq_cfg.get("factor_low", 0.9))
-    f_hi = float(freq_cfg.get("factor_high", 1.5))
     tf_sec = TF_SECONDS.get(tf.lower(), 3600)
     since_ts = int(time.time()) - window_bars * tf_sec
     cnt = _count_recent_entries_fallback(persistence, symbol, since_ts)
+    return _frequency_from_count(cnt, freq_cfg)
+
+def _frequency_from_count(cnt: int, freq_cfg: Dict[str, Any]) -> float:
+    max_trades  = int(freq_cfg.get("max_trades", 5))
+    f_lo = float(freq_cfg.get("factor_low", 0.9))
+    f_hi = float(freq_cfg.get("factor_high", 1.5))
     # 0 → f_lo, >=max_trades → f_hi
     return _lerp(float(cnt), 0.0, float(max_trades), f_lo, f_hi)
 
@@ -95,16 +106,23 @@ async def signal_factor(client, symbol: str, tf: str, sig_cfg: Dict[str, Any]) -
     # ADX: düşük→uzun, yüksek→kısa cooldown
     metric = (sig_cfg.get("metric") or "adx").lower()
     period = int(sig_cfg.get("period", 14))
-    lo = float(sig_cfg.get("low", 18.0))
-    hi = float(sig_cfg.get("high", 30.0))
-    f_lo = float(sig_cfg.get("factor_low", 1.2))
-    f_hi = float(sig_cfg.get("factor_high", 0.85))
     if metric != "adx":
         return 1.0
     kl = await _klines(client, symbol, tf, max(period + 20, 60))
     if len(kl) < period + 10:
         return 1.0
     h, l, c = _series_from_kl(kl)
+    return _signal_from_series(h, l, c, sig_cfg)
+
+def _signal_from_series(h, l, c, sig_cfg: Dict[str, Any]) -> float:
+    metric = (sig_cfg.get("metric") or "adx").lower()
+    period = int(sig_cfg.get("period", 14))
+    lo = float(sig_cfg.get("low", 18.0))
+    hi = float(sig_cfg.get("high", 30.0))
+    f_lo = float(sig_cfg.get("factor_low", 1.2))
+    f_hi = float(sig_cfg.get("factor_high", 0.85))
+    if metric != "adx" or len(c) < period + 10:
+        return 1.0
     val = adx(h, l, c, period=period)
     if not val or math.isnan(val):
         return 1.0
@@ -118,8 +136,11 @@ async def compute_dynamic_cooldown_sec(
     client,
     persistence,
     symbol: str,
-    tf_entry: str
+    tf_entry: str,
+    service: Optional["CooldownService"] = None,
 ) -> int:
+    if service is not None:
+        return service.cooldown_for(symbol)  # önbellekli yol: REST/DB yok
     cd = cfg.get("cooldown", {}) or {}
     if cd.get("mode", "dynamic").lower() != "dynamic":
         # Fallback: static base or default 1800
@@ -139,3 +160,174 @@ async def compute_dynamic_cooldown_sec(
 
     sec = base * tf_sc * vol_f * freq_f * sig_f
     return int(_clamp(sec, mn, mx))
+
+
+class CooldownService:
+    """
+    compute_dynamic_cooldown_sec'in önbellekli karşılığı:
+      - volatilite ve sinyal faktörleri KlinesCache'in paylaşılan OHLCV'sinden, sembol başına
+        YALNIZ yeni bar kapandığında (son bar zamanı değiştiğinde) hesaplanır,
+      - frekans faktörü bellekteki giriş sayacından (deque) gelir; DB yalnız açılışta bir kez okunur,
+      - cooldown_for(symbol) O(1): REST/DB çağrısı yok.
+    """
+
+    def __init__(self, cfg: Dict[str, Any], klines=None, persistence=None, tf_entry: str = "1h", logger=None):
+        self.cd = (cfg or {}).get("cooldown", {}) or {}
+        self.klines = klines
+        self.persistence = persistence
+        self.tf = (tf_entry or "1h").lower()
+        self.logger = logger or logging.getLogger("cooldown")
+
+        self.dynamic = (self.cd.get("mode", "dynamic") or "dynamic").lower() == "dynamic"
+        self.base = float(self.cd.get("base_sec", 1800))
+        self.mn = float(self.cd.get("min_sec", 300))
+        self.mx = float(self.cd.get("max_sec", 7200))
+        self.tf_sc = tf_factor(self.tf, self.cd.get("tf_scale", {}))
+        freq = self.cd.get("frequency", {}) or {}
+        self.window_sec = int(freq.get("window_bars", 50)) * TF_SECONDS.get(self.tf, 3600)
+
+        self._bar: Dict[str, Tuple[int, float]] = {}      # {sym: (son bar ts, vol_f*sig_f)}
+        self._entries: Dict[str, deque] = {}              # {sym: deque[giriş ts]}
+        self._sub = None
+        self._entry_listeners = []
+        # OrderManager'ın hemen yazdığı girişler: {sym: (ts, {orderId, clientOrderId})}; aynı emrin
+        # sonradan gelen UDS dolumu ikinci kez sayılmaz
+        self._local: Dict[str, Tuple[float, set]] = {}
+        self.dedupe_sec = float(self.cd.get("dedupe_sec", 120))
+
+    # ---------- giriş sayacı ----------
+    def seed_entries(self, symbols) -> int:
+        """Açılışta pencere içindeki girişleri TEK sorguyla yükler."""
+        if self.persistence is None:
+            return 0
+        since = int(time.time()) - self.window_sec
+        rows = []
+        for sql in ("SELECT symbol, ts FROM signal_audit WHERE decision=1 AND ts>=?",
+                    "SELECT symbol, created_at FROM futures_orders WHERE created_at>=?"):
+            try:
+                c = self.persistence._conn()
+                try:
+                    rows = c.execute(sql, (since,)).fetchall()
+                finally:
+                    c.close()             # "with conn" yalnız commit eder, bağlantıyı kapatmaz
+                break
+            except Exception:
+                rows = []
+        wanted = set(symbols or [])
+        for sym, ts in rows:
+            if not wanted or sym in wanted:
+                self._entries.setdefault(sym, deque()).append(int(ts or 0))
+        for dq in self._entries.values():
+            dq_sorted = sorted(dq)
+            dq.clear()
+            dq.extend(dq_sorted)
+        return len(rows)
+
+    def record_entry(self, symbol: str, ts: Optional[int] = None) -> None:
+        ts = int(ts or time.time())
+        self._entries.setdefault(symbol, deque()).append(ts)
+        for cb in self._entry_listeners:
+            try:
+                cb(symbol, ts)
+            except Exception as e:
+                self.logger.debug(f"cooldown entry listener error: {e}")
+
+    def record_local_entry(self, symbol: str, order_id=None, client_id=None) -> None:
+        """
+        OrderManager: giriş emri başarılı → cooldown hemen başlar (paper/ACK ya da user-data stream'siz
+        kurulumlarda UDS dolumu hiç gelmeyebilir). Kimlikler sonraki UDS dolumunu eşlemek için tutulur.
+        """
+        self._local[symbol] = (time.time(), {str(x) for x in (order_id, client_id) if x})
+        self.record_entry(symbol)
+
+    def _consume_local(self, ev: Dict[str, Any]) -> bool:
+        """UDS dolumu yerelde zaten kaydedilmiş girişe aitse True (kayıt tüketilir)."""
+        sym = ev.get("symbol")
+        hit = self._local.get(sym)
+        if hit is None:
+            return False
+        ts, ids = hit
+        if time.time() - ts > self.dedupe_sec:
+            self._local.pop(sym, None)
+            return False
+        ev_ids = {str(x) for x in (ev.get("order_id"), ev.get("client_id")) if x}
+        if ids and ev_ids and not (ids & ev_ids):
+            return False                      # başka bir emir (ör. ekleme) → ayrı giriş
+        self._local.pop(sym, None)
+        return True
+
+    def add_entry_listener(self, cb) -> None:
+        """Her giriş kaydında cb(symbol, ts) (ör. PositionSupervisor.start_cooldown)."""
+        self._entry_listeners.append(cb)
+
+    def _entry_count(self, symbol: str, now: int) -> int:
+        dq = self._entries.get(symbol)
+        if not dq:
+            return 0
+        since = now - self.window_sec
+        while dq and dq[0] < since:
+            dq.popleft()
+        return len(dq)
+
+    # ---------- bar bazlı faktörler ----------
+    def on_klines(self, klines=None) -> int:
+        """KlinesCache dinleyicisi: son barı değişen semboller için faktörleri yeniden hesaplar."""
+        src = klines or self.klines
+        if src is None or not self.dynamic:
+            return 0
+        n = 0
+        for sym in list(getattr(src, "symbols", []) or []):
+            buf = src.series(sym)
+            if not buf or not buf.get("t"):
+                continue
+            last = int(buf["t"][-1])
+            hit = self._bar.get(sym)
+            if hit and hit[0] == last:
+                continue
+            h, l, c = buf["h"], buf["l"], buf["c"]
+            f = _volatility_from_series(h, l, c, self.cd.get("volatility", {}) or {}) * \
+                _signal_from_series(h, l, c, self.cd.get("signal", {}) or {})
+            self._bar[sym] = (last, f)
+            n += 1
+        return n
+
+    def cooldown_for(self, symbol: str, now: Optional[int] = None) -> int:
+        if not self.dynamic:
+            return int(_clamp(self.base, self.mn, self.mx))
+        hit = self._bar.get(symbol)
+        bar_f = hit[1] if hit else 1.0
+        freq_f = _frequency_from_count(self._entry_count(symbol, int(now or time.time())),
+                                       self.cd.get("frequency", {}) or {})
+        return int(_clamp(self.base * self.tf_sc * bar_f * freq_f, self.mn, self.mx))
+
+    # ---------- giriş olayları ----------
+    _EXIT_TYPE_MARKERS = ("STOP", "TAKE_PROFIT", "TRAILING", "LIQUIDATION")
+
+    @classmethod
+    def _is_entry_fill(cls, ev: Dict[str, Any]) -> bool:
+        """
+        Yalnız giriş dolumları: reduceOnly, closePosition (raw["cp"]), koruyucu tipler
+        (STOP*/TAKE_PROFIT*/TRAILING_STOP_MARKET) ve tasfiye/ADL (autoclose-/adl_autoclose) sayılmaz.
+        """
+        if ev.get("status") != "FILLED" or ev.get("reduce_only") or not ev.get("symbol"):
+            return False
+        raw = ev.get("raw") or {}
+        if raw.get("cp"):
+            return False
+        typ = (ev.get("order_type") or raw.get("ot") or raw.get("o") or "").upper()
+        if any(m in typ for m in cls._EXIT_TYPE_MARKERS):
+            return False
+        coid = str(ev.get("client_id") or raw.get("c") or "")
+        return not coid.startswith(("autoclose-", "adl_autoclose"))
+
+    def bind_bus(self, bus) -> None:
+        """Dolan giriş emirleri (bkz. _is_entry_fill) giriş sayacına yazılır."""
+        self._sub = bus.subscribe("cooldown", types=("order_update",), maxsize=256)
+
+    async def run(self, stop_event=None):
+        if self._sub is None:
+            return
+        while not (stop_event and stop_event.is_set()):
+            for ev in await self._sub.wait(timeout=30):
+                if self._is_entry_fill(ev) and not self._consume_local(ev):
+                    self.record_entry(ev["symbol"], int((ev.get("time") or 0) / 1000) or None)
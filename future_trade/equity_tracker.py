@@ -0,0 +1,187 @@
+# /opt/tradebot/future_trade/equity_tracker.py
+# -*- coding: utf-8 -*-
+"""
+Gerçek zamanlı equity izleyici.
+
+- Cüzdan bakiyesi (USDT wb) ACCOUNT_UPDATE olaylarından güncellenir.
+- Gerçekleşmemiş PnL pozisyon başına tutulur; her fiyat tick'inde yalnız o sembolün
+  katkısı farkla (delta) toplam PnL'e eklenir → equity/peak/drawdown O(1).
+- Dinleyiciler (ör. KillSwitch.on_equity) her equity değişiminde senkron çağrılır.
+Açılışta seed() ile REST'ten (account + positionRisk) ya da yerel DB'den tohumlanır.
+Paper modda REST tohumu atlanır (stub bakiye start_equity'yi ezmez); ACCOUNT_UPDATE de gelmediği
+için pozisyonlar positions_cache yazımlarından on_cache_position ile beslenir.
+Shard modunda bind_scope() ile yalnız worker'ın sembolleri izlenir (diğer shard'ların fiyatı
+bu süreçte akmadığı için uPnL'leri bayatlar); hesap equity'si koordinatörde toplanır.
+"""
+from __future__ import annotations
+
+import logging
+from typing import Any, Callable, Dict, List, Optional
+
+
+class EquityTracker:
+    def __init__(self, start_equity: float = 0.0, asset: str = "USDT", logger=None):
+        self.asset = asset.upper()
+        self.logger = logger or logging.getLogger("equity_tracker")
+        self.wallet: Optional[float] = float(start_equity) if start_equity else None
+        # {symbol: [qty(signed), entry, upnl]}
+        self._pos: Dict[str, List[float]] = {}
+        self._upnl = 0.0
+        self.peak: Optional[float] = None
+        self._listeners: List[Callable[[float], Any]] = []
+        self.scope: Optional[set] = None      # shard modu: izlenen semboller (None = tümü)
+
+    def bind_scope(self, symbols) -> None:
+        """Yalnız bu semboller izlenir; kapsam dışı mevcut kayıtlar düşülür."""
+        self.scope = {str(s).upper() for s in symbols or []}
+        for sym in [s for s in self._pos if s not in self.scope]:
+            self._upnl -= self._pos.pop(sym)[2]
+
+    # ---------- okuma ----------
+    @property
+    def ready(self) -> bool:
+        return self.wallet is not None
+
+    @property
+    def unrealized(self) -> float:
+        return self._upnl
+
+    @property
+    def equity(self) -> float:
+        return (self.wallet or 0.0) + self._upnl
+
+    def drawdown_pct(self) -> float:
+        eq = self.equity
+        return 0.0 if not self.peak or self.peak <= 0 else max(0.0, (self.peak - eq) / self.peak * 100.0)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"wallet": self.wallet, "unrealized": self._upnl, "equity": self.equity,
+                "peak": self.peak, "dd_pct": self.drawdown_pct(), "positions": len(self._pos)}
+
+    def add_listener(self, cb: Callable[[float], Any]) -> None:
+        self._listeners.append(cb)
+
+    def reset_peak(self) -> None:
+        """Gün başında çağrılır: gün içi zirve mevcut equity'den başlar."""
+        self.peak = self.equity if self.ready else None
+
+    # ---------- yazma ----------
+    def _changed(self) -> None:
+        if not self.ready:
+            return
+        eq = self.equity
+        if self.peak is None or eq > self.peak:
+            self.peak = eq
+        for cb in self._listeners:
+            try:
+                cb(eq)
+            except Exception as e:
+                self.logger.debug(f"[EQ] listener error: {e}")
+
+    def set_position(self, symbol: str, qty: float, entry: float, mark: Optional[float] = None,
+                     upnl: Optional[float] = None) -> None:
+        if self.scope is not None and symbol not in self.scope:
+            return
+        old = self._pos.pop(symbol, None)
+        if old:
+            self._upnl -= old[2]
+        qty, entry = float(qty or 0.0), float(entry or 0.0)
+        if qty == 0.0 or entry <= 0:
+            return
+        if upnl is None:
+            upnl = qty * (float(mark) - entry) if mark else 0.0
+        self._pos[symbol] = [qty, entry, float(upnl)]
+        self._upnl += float(upnl)
+
+    def on_tick(self, symbol: str, price: float, ts: Optional[float] = None) -> None:
+        p = self._pos.get(symbol)
+        if p is None or not price or price <= 0:
+            return
+        new = p[0] * (float(price) - p[1])
+        self._upnl += new - p[2]
+        p[2] = new
+        self._changed()
+
+    def on_cache_position(self, symbol: str, side: str, qty: float, entry: float) -> None:
+        """
+        Paper modu (Persistence hook'u): positions_cache'teki pozisyon durumu. Azalan miktarın
+        son işaretlenmiş uPnL'i cüzdana gerçekleşmiş kâr/zarar olarak yazılır.
+        """
+        if self.scope is not None and symbol not in self.scope:
+            return
+        s = (side or "").upper()
+        new_qty = abs(float(qty or 0.0)) * (1.0 if s in ("LONG", "BUY") else -1.0)
+        old = self._pos.get(symbol)
+        mark = None
+        if old and old[0]:
+            mark = old[1] + old[2] / old[0]                       # son tick'ten türetilen fiyat
+            if abs(new_qty) < abs(old[0]) and self.wallet is not None:
+                self.wallet += old[2] * (1.0 - abs(new_qty) / abs(old[0]))
+        self.set_position(symbol, new_qty, entry if new_qty else 0.0, mark=mark)
+        self._changed()
+
+    def on_account_update(self, data: Dict[str, Any]) -> None:
+        """Ham ACCOUNT_UPDATE mesajı: B → cüzdan, P → pozisyon (pa, ep, up)."""
+        a = data.get("a") or {}
+        for b in a.get("B") or []:
+            if str(b.get("a")).upper() == self.asset:
+                try:
+                    self.wallet = float(b.get("wb"))
+                except (TypeError, ValueError):
+                    pass
+        for p in a.get("P") or []:
+            try:
+                up = p.get("up")
+                self.set_position(p.get("s"), float(p.get("pa") or 0.0), float(p.get("ep") or 0.0),
+                                  upnl=float(up) if up is not None else None)
+            except Exception as e:
+                self.logger.debug(f"[EQ] position parse error: {e}")
+        self._changed()
+
+    async def seed(self, client=None, persistence=None, price_provider: Optional[Callable] = None) -> str:
+        """
+        Açılış tohumlaması: önce REST (account + positionRisk), olmazsa yerel DB.
+        client.paper ise REST atlanır; cüzdan yapılandırılan start_equity olarak kalır.
+        Dönüş: "rest" | "db" | "none".
+        """
+        src = "none"
+        if getattr(client, "paper", False):
+            # paper: get_account stub bakiyesi (1000) yapılandırılan start_equity'yi ezmesin
+            client = None
+        if client is not None:
+            try:
+                acct = await client.get_account()
+                wb = acct.get("totalWalletBalance")
+                if wb is not None:
+                    self.wallet = float(wb)
+                    src = "rest"
+            except Exception as e:
+                self.logger.warning(f"[EQ] account seed failed: {e}")
+
+        rows = None
+        fn = getattr(client, "position_risk", None)
+        if callable(fn):
+            try:
+                rows = await fn()
+                for r in rows or []:
+                    amt = float(r.get("positionAmt") or 0.0)
+                    if amt:
+                        self.set_position(r.get("symbol"), amt, float(r.get("entryPrice") or 0.0),
+                                          upnl=float(r.get("unRealizedProfit") or 0.0))
+            except Exception as e:
+                self.logger.debug(f"[EQ] positionRisk seed failed: {e}")
+                rows = None
+        if not rows and persistence is not None:
+            try:
+                for p in persistence.list_open_positions() or []:
+                    side = (p.get("side") or "").upper()
+                    qty = abs(float(p.get("qty") or 0.0)) * (1.0 if side in ("LONG", "BUY") else -1.0)
+                    mark = price_provider(p.get("symbol")) if callable(price_provider) else None
+                    self.set_position(p.get("symbol"), qty, float(p.get("entry_price") or 0.0), mark=mark)
+                if src == "none" and self.wallet is not None:
+                    src = "db"
+            except Exception as e:
+                self.logger.debug(f"[EQ] db seed failed: {e}")
+        self.reset_peak()
+        self.logger.info(f"[EQ] seeded from {src}: {self.snapshot()}")
+        return src
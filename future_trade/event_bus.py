@@ -0,0 +1,233 @@
+# /opt/tradebot/future_trade/event_bus.py
+# -*- coding: utf-8 -*-
+"""
+Süreç içi öncelikli olay veriyolu.
+
+- Tipler: bar_closed, tick, order_update, account_update, position_change
+- Her abonenin kendi SINIRLI kuyruğu vardır; yavaş abone yayıncıyı/diğer aboneleri bekletmez.
+- Öncelik şeritleri: protective (0) > entries (1) > telemetry (2). get() her zaman en yüksek
+  öncelikli şeritten alır; kuyruk dolunca önce daha düşük öncelikli en eski olay, o yoksa
+  aynı şeridin en eski olayı düşürülür (yeni gelen order_update/bar_closed kaybolmaz).
+- Abonelik tip dışında accept(ev) ile de süzülebilir (ör. strateji yalnız giriş/onay TF barları).
+- tick olayları sembol başına birleştirilir (coalesce): tüketici geride kaldıysa yalnız son fiyat kalır.
+- Metrikler: published / delivered / dropped / coalesced / max_lag_ms (abone bazında).
+publish() senkron ve bloklamasızdır (tick dinleyicilerinden de çağrılabilir).
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+EVENT_TYPES = ("bar_closed", "tick", "order_update", "account_update", "position_change")
+
+LANE_PROTECTIVE = 0
+LANE_ENTRIES = 1
+LANE_TELEMETRY = 2
+
+DEFAULT_LANES = {
+    "order_update": LANE_PROTECTIVE,
+    "account_update": LANE_PROTECTIVE,
+    "position_change": LANE_PROTECTIVE,
+    "bar_closed": LANE_ENTRIES,
+    "tick": LANE_TELEMETRY,
+}
+
+
+class Subscription:
+    def __init__(self, bus: "EventBus", name: str, types: Optional[Iterable[str]], maxsize: int, coalesce_ticks: bool,
+                 accept: Optional[Callable[[Dict[str, Any]], bool]] = None):
+        self.bus = bus
+        self.name = name
+        self.types = frozenset(types) if types else None
+        self.accept = accept
+        self.maxsize = max(1, int(maxsize))
+        self.coalesce_ticks = bool(coalesce_ticks)
+        self._lanes = (deque(), deque(), deque())
+        self._ticks: Dict[str, tuple] = {}          # {symbol: (ts, ev)} – birleştirilmiş son tick
+        self._size = 0
+        self._ready = asyncio.Event()
+        self.closed = False
+        self.stats = {"delivered": 0, "dropped": 0, "coalesced": 0, "max_lag_ms": 0.0, "last_lag_ms": 0.0}
+
+    def __len__(self) -> int:
+        return self._size + len(self._ticks)
+
+    def wants(self, etype: str) -> bool:
+        return self.types is None or etype in self.types
+
+    # ---------- yayıncı tarafı ----------
+    def _offer(self, ev: Dict[str, Any], lane: int, now: float) -> None:
+        if self.closed:
+            return
+        if self.accept is not None and not self.accept(ev):
+            return
+        if lane == LANE_TELEMETRY and self.coalesce_ticks and ev.get("type") == "tick":
+            sym = ev.get("symbol")
+            if sym in self._ticks:
+                self.stats["coalesced"] += 1
+                self._ticks[sym] = (self._ticks[sym][0], ev)   # ilk bekleme zamanı korunur (lag ölçümü)
+                return
+            if len(self) >= self.maxsize and not self._evict(lane):
+                self.stats["dropped"] += 1
+                return
+            self._ticks[sym] = (now, ev)
+        else:
+            if len(self) >= self.maxsize and not self._evict(lane):
+                self.stats["dropped"] += 1
+                return
+            self._lanes[lane].append((now, ev))
+            self._size += 1
+        self._ready.set()
+
+    def _evict(self, incoming_lane: int) -> bool:
+        """
+        Gelen olaydan DAHA DÜŞÜK öncelikli en eski olayı düşür; yoksa (protective/entries için)
+        aynı şeridin en eskisini — en yeni durum kaybolmasın. Yer açıldıysa True.
+        """
+        for lane in (LANE_TELEMETRY, LANE_ENTRIES):
+            if lane <= incoming_lane:
+                break
+            if lane == LANE_TELEMETRY and self._ticks:
+                self._ticks.pop(next(iter(self._ticks)))
+                self.stats["dropped"] += 1
+                return True
+            if self._lanes[lane]:
+                self._lanes[lane].popleft()
+                self._size -= 1
+                self.stats["dropped"] += 1
+                return True
+        if incoming_lane != LANE_TELEMETRY and self._lanes[incoming_lane]:
+            self._lanes[incoming_lane].popleft()
+            self._size -= 1
+            self.stats["dropped"] += 1
+            return True
+        return False
+
+    # ---------- tüketici tarafı ----------
+    def get_nowait(self) -> Optional[Dict[str, Any]]:
+        item = None
+        for lane in (LANE_PROTECTIVE, LANE_ENTRIES, LANE_TELEMETRY):
+            if self._lanes[lane]:
+                item = self._lanes[lane].popleft()
+                self._size -= 1
+                break
+            if lane == LANE_TELEMETRY and self._ticks:
+                item = self._ticks.pop(next(iter(self._ticks)))
+        if item is None:
+            self._ready.clear()
+            return None
+        ts, ev = item
+        lag = (time.monotonic() - ts) * 1000.0
+        st = self.stats
+        st["delivered"] += 1
+        st["last_lag_ms"] = lag
+        if lag > st["max_lag_ms"]:
+            st["max_lag_ms"] = lag
+        if not len(self):
+            self._ready.clear()
+        return ev
+
+    async def get(self) -> Dict[str, Any]:
+        while True:
+            ev = self.get_nowait()
+            if ev is not None:
+                return ev
+            await self._ready.wait()
+
+    async def wait(self, timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Olay gelene ya da timeout dolana dek bekler; bekleyen TÜM olayları öncelik sırasıyla döndürür.
+        Timeout'ta boş liste (periyodik güvenlik turu için).
+        """
+        if not len(self):
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                return []
+        out = []
+        while True:
+            ev = self.get_nowait()
+            if ev is None:
+                return out
+            out.append(ev)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> Dict[str, Any]:
+        return await self.get()
+
+    def close(self) -> None:
+        self.bus.unsubscribe(self)
+
+
+class EventBus:
+    def __init__(self, lanes: Optional[Dict[str, int]] = None, logger=None):
+        self.lanes = dict(DEFAULT_LANES)
+        if lanes:
+            self.lanes.update(lanes)
+        self.logger = logger or logging.getLogger("event_bus")
+        self._subs: List[Subscription] = []
+        self._by_type: Dict[str, List[Subscription]] = {}
+        self.published: Dict[str, int] = {}
+
+    def subscribe(self, name: str, types: Optional[Iterable[str]] = None, maxsize: int = 1000,
+                  coalesce_ticks: bool = True,
+                  accept: Optional[Callable[[Dict[str, Any]], bool]] = None) -> Subscription:
+        sub = Subscription(self, name, types, maxsize, coalesce_ticks, accept=accept)
+        self._subs.append(sub)
+        self._by_type.clear()
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        sub.closed = True
+        try:
+            self._subs.remove(sub)
+        except ValueError:
+            pass
+        self._by_type.clear()
+
+    def has_subscribers(self, etype: str) -> bool:
+        return bool(self._targets(etype))
+
+    def _targets(self, etype: str) -> List[Subscription]:
+        t = self._by_type.get(etype)
+        if t is None:
+            t = [s for s in self._subs if s.wants(etype)]
+            self._by_type[etype] = t
+        return t
+
+    def publish(self, ev: Dict[str, Any]) -> int:
+        """Olayı ilgili abonelere dağıtır; teslim edilen abone sayısını döndürür."""
+        etype = ev.get("type")
+        self.published[etype] = self.published.get(etype, 0) + 1
+        targets = self._targets(etype)
+        if not targets:
+            return 0
+        lane = self.lanes.get(etype, LANE_TELEMETRY)
+        now = time.monotonic()
+        for sub in targets:
+            sub._offer(ev, lane, now)
+        return len(targets)
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "published": dict(self.published),
+            "subscribers": {
+                s.name: dict(s.stats, pending=len(s), maxsize=s.maxsize) for s in self._subs
+            },
+        }
+
+
+async def idle_wait(sub: Optional[Subscription], timeout: float) -> List[Dict[str, Any]]:
+    """
+    Periyodik döngüler için uyku yerine: abonelik varsa ilk olayda (ya da timeout'ta) uyanır,
+    yoksa düz asyncio.sleep. Bekleyen olaylar döndürülür.
+    """
+    if sub is None:
+        await asyncio.sleep(timeout)
+        return []
+    return await sub.wait(timeout=timeout)
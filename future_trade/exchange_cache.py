@@ -0,0 +1,214 @@
+# /opt/tradebot/future_trade/exchange_cache.py
+# -*- coding: utf-8 -*-
+"""
+exchangeInfo + leverageBracket için açılış ön-yükleyicisi ve disk önbelleği.
+
+- Açılışta disk önbelleği tazeyse (ttl_sec) ağa hiç çıkmadan kullanılır.
+- Değilse her biri TEK çağrı ile çekilir: GET /fapi/v1/exchangeInfo ve
+  GET /fapi/v1/leverageBracket (symbol parametresiz → tüm semboller).
+- Dosya sürümlüdür (CACHE_VERSION) ve mode/base_url ile damgalanır; paper modun
+  sentetik exchangeInfo'su canlı moda sızmaz.
+- run(stop_event) arka planda refresh_sec aralıkla yeniler ve dinleyicileri
+  (normalizer.load_exchange_info, risk.seed_brackets ...) günceller.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+CACHE_VERSION = 1
+DEFAULT_CACHE_PATH = "/opt/tradebot/future_trade/cache/exchange_meta.json"
+
+
+def normalize_brackets(raw: Any) -> Dict[str, List[Dict[str, float]]]:
+    """
+    Binance leverageBracket yanıtını {SYMBOL: [{"floor","cap","mmr","cum"}, ...]} yapar.
+    Hem ham ("notionalFloor"/"maintMarginRatio") hem normalize ("floor"/"mmr") anahtarları kabul edilir.
+    """
+    out: Dict[str, List[Dict[str, float]]] = {}
+    if isinstance(raw, dict):
+        raw = [raw]
+    if not isinstance(raw, list):
+        return out
+    for item in raw:
+        if not isinstance(item, dict) or not item.get("symbol"):
+            continue
+        norm = []
+        for r in item.get("brackets") or []:
+            try:
+                floor_ = float(r.get("notionalFloor", r.get("floor", 0)))
+                cap_ = float(r.get("notionalCap", r.get("cap", float("inf"))))
+                mmr_ = float(r.get("maintMarginRatio", r.get("mmr", 0.004)))
+                cum_ = float(r.get("cum", 0.0) or 0.0)
+                norm.append({"floor": floor_, "cap": cap_, "mmr": max(0.0, mmr_), "cum": cum_})
+            except Exception:
+                continue
+        norm.sort(key=lambda x: x["floor"])
+        out[str(item["symbol"]).upper()] = norm
+    return out
+
+
+class ExchangeMetaCache:
+    def __init__(self, client, cfg: Optional[Dict[str, Any]] = None, logger=None):
+        cfg = cfg or {}
+        self.client = client
+        self.path = str(cfg.get("path") or DEFAULT_CACHE_PATH)
+        self.ttl_sec = int(cfg.get("ttl_sec", 6 * 3600))
+        self.refresh_sec = int(cfg.get("refresh_sec", 3600))
+        self.logger = logger or logging.getLogger("exchange_cache")
+
+        self.exchange_info: Dict[str, Any] = {"symbols": []}
+        self.brackets: Dict[str, List[Dict[str, float]]] = {}
+        self.saved_at: float = 0.0
+        self._listeners: List[Callable[["ExchangeMetaCache"], Any]] = []
+
+    # ---------- kimlik / dinleyiciler ----------
+    def _stamp(self) -> Dict[str, Any]:
+        return {
+            "mode": str(getattr(self.client, "mode", "") or ""),
+            "base": str(getattr(self.client, "base", "") or ""),
+        }
+
+    def add_listener(self, cb: Callable[["ExchangeMetaCache"], Any]) -> None:
+        """cb(cache) — her yüklemede/yenilemede çağrılır; hemen bir kez de uygulanır."""
+        self._listeners.append(cb)
+        if self.saved_at:
+            self._apply(cb)
+
+    def _apply(self, cb) -> None:
+        try:
+            cb(self)
+        except Exception as e:
+            self.logger.warning(f"[EXCACHE] listener failed: {e}")
+
+    def _notify(self) -> None:
+        for cb in list(self._listeners):
+            self._apply(cb)
+
+    # ---------- disk ----------
+    def _load_disk(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            self.logger.warning(f"[EXCACHE] unreadable cache {self.path}: {e}")
+            return None
+        if not isinstance(data, dict) or data.get("version") != CACHE_VERSION:
+            return None
+        if data.get("stamp") != self._stamp():
+            return None
+        if not (data.get("exchange_info") or {}).get("symbols"):
+            return None
+        return data
+
+    def _save_disk(self) -> None:
+        payload = {
+            "version": CACHE_VERSION,
+            "stamp": self._stamp(),
+            "saved_at": self.saved_at,
+            "exchange_info": self.exchange_info,
+            "brackets": self.brackets,
+        }
+        d = os.path.dirname(self.path) or "."
+        try:
+            os.makedirs(d, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(prefix=".exchange_meta.", dir=d)
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(payload, f, separators=(",", ":"))
+                os.replace(tmp, self.path)          # atomik: okurlar yarım dosya görmez
+            except Exception:
+                _unlink_quiet(tmp)
+                raise
+        except Exception as e:
+            self.logger.warning(f"[EXCACHE] cache write failed: {e}")
+
+    # ---------- ağ ----------
+    async def fetch(self) -> bool:
+        """exchangeInfo + tüm bracket'ları çeker; başarıda diske yazar ve dinleyicileri günceller."""
+        try:
+            ex_info, raw_br = await asyncio.gather(
+                self.client.exchange_info(),
+                self._fetch_brackets(),
+            )
+        except Exception as e:
+            self.logger.warning(f"[EXCACHE] fetch failed: {e}")
+            return False
+        if not (ex_info or {}).get("symbols"):
+            self.logger.warning("[EXCACHE] fetch returned empty exchangeInfo; keeping previous")
+            return False
+
+        self.exchange_info = ex_info
+        brackets = normalize_brackets(raw_br)
+        if brackets or not self.brackets:
+            self.brackets = brackets
+        self.saved_at = time.time()
+        self._save_disk()
+        self._notify()
+        self.logger.info(
+            f"[EXCACHE] refreshed: {len(ex_info.get('symbols', []))} symbols, {len(self.brackets)} bracket sets"
+        )
+        return True
+
+    async def _fetch_brackets(self):
+        fn = getattr(self.client, "get_all_leverage_brackets", None)
+        if not callable(fn):
+            return []
+        try:
+            return await fn()
+        except Exception as e:
+            # bracket'lar opsiyonel: RiskManager sembol bazlı tembel yüklemeye düşer
+            self.logger.warning(f"[EXCACHE] leverageBracket bulk fetch failed: {e}")
+            return []
+
+    # ---------- yaşam döngüsü ----------
+    async def preload(self) -> str:
+        """
+        Dönüş: "disk" | "network" | "stale_disk" | "empty"
+        Ağ hatasında bayat disk önbelleği de kabul edilir (hiç yoktan iyidir).
+        """
+        data = self._load_disk()
+        if data is not None:
+            self.exchange_info = data["exchange_info"]
+            self.brackets = data.get("brackets") or {}
+            self.saved_at = float(data.get("saved_at") or 0.0)
+            if time.time() - self.saved_at < self.ttl_sec:
+                self._notify()
+                return "disk"
+
+        if await self.fetch():
+            return "network"
+        if data is not None:
+            self._notify()
+            return "stale_disk"
+        return "empty"
+
+    def age_sec(self) -> float:
+        return (time.time() - self.saved_at) if self.saved_at else float("inf")
+
+    async def run(self, stop_event: asyncio.Event = None):
+        """Arka plan yenileme; disk önbelleği yaşlıysa ilk tur en geç 60 sn içinde çalışır."""
+        while not (stop_event and stop_event.is_set()):
+            wait = max(60.0, self.refresh_sec - self.age_sec())
+            try:
+                if stop_event is not None:
+                    await asyncio.wait_for(stop_event.wait(), timeout=wait)
+                    break
+                await asyncio.sleep(wait)
+            except asyncio.TimeoutError:
+                pass
+            await self.fetch()
+
+
+def _unlink_quiet(path: str) -> None:
+    try:
+        os.unlink(path)
+    except Exception:
+        pass
@@ -1,45 +1,179 @@
 from __future__ import annotations
-from typing import Dict, Any, Optional
-import math, logging
+from dataclasses import dataclass, field
+from decimal import Decimal, ROUND_FLOOR, ROUND_CEILING, InvalidOperation
+from typing import Dict, Any, Optional, List
+import asyncio, logging
+
+_ZERO = Decimal(0)
+
+
+def _dec(x: Any) -> Decimal:
+    """
+    float/str → Decimal. float için repr (en kısa gösterim) kullanılır: 0.3 → Decimal('0.3'),
+    Decimal(0.3)'ün ikili artığı (0.29999...) taşınmaz.
+    """
+    if isinstance(x, Decimal):
+        return x
+    try:
+        return Decimal(repr(x) if isinstance(x, float) else str(x))
+    except (InvalidOperation, ValueError, TypeError):
+        return _ZERO
+
+
+def _decimals(step_str: Any) -> int:
+    """'0.00100000' → 3, '1' → 0, '1e-5' → 5 (tick/step ondalık basamak sayısı)."""
+    d = _dec(step_str).normalize()
+    return max(0, -d.as_tuple().exponent) if d > 0 else 0
+
+
+def fmt_decimal(x: Any) -> str:
+    """API'ye gidecek sayı için üstelsiz, sondaki sıfırları atılmış kesin string ('1E+1' değil '10')."""
+    d = _dec(x)
+    s = format(d, "f")
+    if "." in s:
+        s = s.rstrip("0").rstrip(".")
+    return s or "0"
+
+
+@dataclass(frozen=True)
+class SymbolRules:
+    """Sembol başına önceden hesaplanmış filtre kaydı (exchangeInfo'dan bir kez kurulur)."""
+    symbol: str
+    tick: float = 0.0
+    step: float = 0.0
+    min_qty: float = 0.0
+    max_qty: float = 0.0
+    min_notional: float = 0.0
+    price_precision: Optional[int] = None
+    qty_precision: Optional[int] = None
+    tick_decimals: int = 0
+    step_decimals: int = 0
+    tick_dec: Decimal = _ZERO
+    step_dec: Decimal = _ZERO
+    min_notional_dec: Decimal = _ZERO
+    filters: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    raw: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def steps(self) -> Dict[str, float]:
+        return {
+            "tick": self.tick,
+            "qty_step": self.step,
+            "min_qty": self.min_qty,
+            "max_qty": self.max_qty,
+            "min_notional": self.min_notional,
+        }
+
+    # ---- tamsayı tick/step aritmetiği ----
+    def price_ticks(self, price: Any, rounding=ROUND_FLOOR) -> int:
+        """Fiyatı tam sayı tick adedine çevirir (varsayılan aşağı yuvarlama)."""
+        return int((_dec(price) / self.tick_dec).to_integral_value(rounding=rounding))
+
+    def qty_steps(self, qty: Any, rounding=ROUND_FLOOR) -> int:
+        return int((_dec(qty) / self.step_dec).to_integral_value(rounding=rounding))
+
+    def ticks_to_str(self, ticks: int) -> str:
+        return fmt_decimal(Decimal(int(ticks)) * self.tick_dec)
+
+    def steps_to_str(self, steps: int) -> str:
+        return fmt_decimal(Decimal(int(steps)) * self.step_dec)
+
+    @classmethod
+    def from_symbol(cls, s: Dict[str, Any]) -> "SymbolRules":
+        flt = {f["filterType"]: f for f in s.get("filters", []) if "filterType" in f}
+        pf = flt.get("PRICE_FILTER", {})
+        lot = flt.get("LOT_SIZE", {})
+        mn = flt.get("MIN_NOTIONAL", {})
+        return cls(
+            symbol=s["symbol"],
+            tick=float(pf.get("tickSize", 0) or 0),
+            step=float(lot.get("stepSize", 0) or 0),
+            min_qty=float(lot.get("minQty", 0) or 0),
+            max_qty=float(lot.get("maxQty", 0) or 0),
+            min_notional=float(mn.get("notional", mn.get("minNotional", 0)) or 0),
+            price_precision=s.get("pricePrecision"),
+            qty_precision=s.get("quantityPrecision"),
+            tick_decimals=_decimals(pf.get("tickSize", 0)),
+            step_decimals=_decimals(lot.get("stepSize", 0)),
+            tick_dec=_dec(pf.get("tickSize", 0) or 0).normalize(),
+            step_dec=_dec(lot.get("stepSize", 0) or 0).normalize(),
+            min_notional_dec=_dec(mn.get("notional", mn.get("minNotional", 0)) or 0),
+            filters=flt,
+            raw=s,
+        )
+
+
+_EMPTY_STEPS = {"tick": 0.0, "qty_step": 0.0, "min_qty": 0.0, "max_qty": 0.0, "min_notional": 0.0}
+
 
 class ExchangeNormalizer:
     def __init__(self, binance_client, logger=None):
         self.client = binance_client
         self.logger = logger or logging.getLogger("normalizer")
         self._exchange = None
+        self._rules: Dict[str, SymbolRules] = {}
         self._filters: Dict[str, Dict[str, Any]] = {}
         self._ex_info: Dict[str, Any] = {}
 
     def _load(self):
         if self._exchange is None:
-            self._exchange = self.client.exchange_info()
-            for s in self._exchange.get("symbols", []):
-                sym = s["symbol"]
-                flt = {}
-                for f in s.get("filters", []):
-                    flt[f["filterType"]] = f
-                self._filters[sym] = {
-                    "pricePrecision": s.get("pricePrecision"),
-                    "quantityPrecision": s.get("quantityPrecision"),
-                    "minNotional": float(flt.get("MIN_NOTIONAL", {}).get("notional", 0)) if "MIN_NOTIONAL" in flt else 0.0,
-                    "tickSize": float(flt.get("PRICE_FILTER", {}).get("tickSize", 0)) if "PRICE_FILTER" in flt else 0.0,
-                    "stepSize": float(flt.get("LOT_SIZE", {}).get("stepSize", 0)) if "LOT_SIZE" in flt else 0.0,
-                    "minQty": float(flt.get("LOT_SIZE", {}).get("minQty", 0)) if "LOT_SIZE" in flt else 0.0,
-                    "maxQty": float(flt.get("LOT_SIZE", {}).get("maxQty", 0)) if "LOT_SIZE" in flt else 0.0
-                }
+            res = self.client.exchange_info()
+            if asyncio.iscoroutine(res):
+                # senkron yoldan async uç çağrılamaz; warmup()/load_exchange_info() beklenir
+                res.close()
+                return
+            self._build_filters(res)
+
+    def _build_filters(self, exchange: Dict[str, Any]):
+        """Kayıtları yeni sözlüklerde kurar, sonra tek atamayla değiştirir (okurlar yarım tablo görmez)."""
+        rules: Dict[str, SymbolRules] = {}
+        filters: Dict[str, Dict[str, Any]] = {}
+        for s in exchange.get("symbols", []):
+            try:
+                r = SymbolRules.from_symbol(s)
+            except Exception:
+                continue
+            rules[r.symbol] = r
+            filters[r.symbol] = {
+                "pricePrecision": r.price_precision,
+                "quantityPrecision": r.qty_precision,
+                "minNotional": r.min_notional,
+                "tickSize": r.tick,
+                "stepSize": r.step,
+                "minQty": r.min_qty,
+                "maxQty": r.max_qty,
+            }
+        self._rules = rules
+        self._filters = filters
+        self._exchange = exchange
+
+    def load_exchange_info(self, ex_info: Dict[str, Any]):
+        """ExchangeMetaCache'ten gelen exchangeInfo'yu ağ çağrısı yapmadan yükler (yenilemede de çağrılır)."""
+        if not ex_info or not ex_info.get("symbols"):
+            return
+        self._build_filters(ex_info)
+        self._ex_info = ex_info
 
     async def warmup(self):
+        if self._ex_info.get("symbols"):
+            return  # önbellekten yüklendi
         try:
-            self._ex_info = await self.client.exchange_info()
+            self.load_exchange_info(await self.client.exchange_info())
         except Exception as e:
             self.logger.warning(f"exchange_info warmup failed: {e}")
             self._ex_info = {}
 
+    def rules(self, symbol: str) -> Optional[SymbolRules]:
+        r = self._rules.get(symbol)
+        if r is None and self._exchange is None:
+            self._load()
+            r = self._rules.get(symbol)
+        return r
+
     def _symbol_obj(self, symbol: str) -> Optional[Dict[str, Any]]:
-        if self._ex_info and "symbols" in self._ex_info:
-            for s in self._ex_info["symbols"]:
-                if s.get("symbol") == symbol:
-                    return s
+        r = self.rules(symbol)
+        if r is not None:
+            return r.raw
         get_cache = getattr(self.client, "get_cached_exchange_info", None)
         if callable(get_cache):
             ex = get_cache()
@@ -50,6 +184,9 @@ class ExchangeNormalizer:
         return None
 
     def _flt(self, symbol: str, ftype: str) -> Optional[Dict[str, Any]]:
+        r = self.rules(symbol)
+        if r is not None:
+            return r.filters.get(ftype)
         s = self._symbol_obj(symbol)
         if not s:
             return None
@@ -59,21 +196,15 @@ class ExchangeNormalizer:
         return None
 
     def steps(self, symbol: str) -> Dict[str, float]:
-        self._load()
-        f = self._filters.get(symbol, {})
-        return {
-            "tick": f.get("tickSize", 0.0),
-            "qty_step": f.get("stepSize", 0.0),
-            "min_qty": f.get("minQty", 0.0),
-            "max_qty": f.get("maxQty", 0.0),
-            "min_notional": f.get("minNotional", 0.0),
-        }
+        r = self.rules(symbol)
+        return r.steps if r is not None else dict(_EMPTY_STEPS)
 
     @staticmethod
     def _round_step(x: float, step: float) -> float:
         if step is None or step <= 0:
             return float(x)
-        return math.floor(x / step) * step
+        d = _dec(step)
+        return float((_dec(x) / d).to_integral_value(rounding=ROUND_FLOOR) * d)
 
     @staticmethod
     def _round_precision(value: float, precision: Optional[int]) -> float:
@@ -82,65 +213,120 @@ class ExchangeNormalizer:
         fmt = "{:0." + str(precision) + "f}"
         return float(fmt.format(value))
 
+    # ---------- kayıt tabanlı çekirdek (sözlük araması + tamsayı tick/step aritmetiği) ----------
+    @staticmethod
+    def _price_r(r: Optional[SymbolRules], price: float, rounding=ROUND_FLOOR) -> float:
+        if r is None or r.tick_dec <= 0:
+            return float(price)
+        return float(Decimal(r.price_ticks(price, rounding)) * r.tick_dec)
+
+    @staticmethod
+    def _qty_steps_r(r: SymbolRules, qty: float) -> int:
+        """Adım sayısı; minQty altı 0 (eski float davranışıyla aynı)."""
+        n = r.qty_steps(qty)
+        return n if Decimal(n) * r.step_dec >= _dec(r.min_qty) else 0
+
+    @classmethod
+    def _qty_r(cls, r: Optional[SymbolRules], qty: float) -> float:
+        if r is None or r.step_dec <= 0:
+            return float(qty) if (r is None or float(qty) >= r.min_qty) else 0.0
+        return float(Decimal(cls._qty_steps_r(r, qty)) * r.step_dec)
+
+    @classmethod
+    def _min_notional_r(cls, r: Optional[SymbolRules], price: float, qty: float) -> float:
+        if r is None or r.min_notional_dec <= 0 or price <= 0:
+            return qty
+        if r.step_dec <= 0:
+            return cls._qty_r(r, max(float(r.min_notional_dec / _dec(price)), qty))
+        need = (r.min_notional_dec / (_dec(price) * r.step_dec)).to_integral_value(rounding=ROUND_CEILING)
+        have = r.qty_steps(qty)
+        return cls._qty_r(r, float(Decimal(max(int(need), have)) * r.step_dec))
+
+    # ---------- API için kesin string gösterim ----------
+    def price_str(self, symbol: str, price: float) -> str:
+        """Tick'e (aşağı) oturtulmuş fiyatın kesin string'i; kayıt yoksa repr tabanlı string."""
+        r = self.rules(symbol)
+        if r is None or r.tick_dec <= 0:
+            return fmt_decimal(price)
+        return r.ticks_to_str(r.price_ticks(price))
+
+    def qty_str(self, symbol: str, qty: float) -> str:
+        r = self.rules(symbol)
+        if r is None or r.step_dec <= 0:
+            return fmt_decimal(qty)
+        return r.steps_to_str(r.qty_steps(qty))
+
+    def shift_ticks(self, symbol: str, price: float, n: int) -> float:
+        """Fiyatı tam n tick kaydırır (float toplama artığı olmadan)."""
+        r = self.rules(symbol)
+        if r is None or r.tick_dec <= 0:
+            return float(price)
+        return float(Decimal(r.price_ticks(price) + int(n)) * r.tick_dec)
+
     def normalize_price(self, symbol: str, price: float) -> float:
-        st = self.steps(symbol)
-        p = self._round_step(price, st["tick"])
-        return float(f"{p:.10f}")
+        return self._price_r(self.rules(symbol), price)
 
     def normalize_qty(self, symbol: str, qty: float) -> float:
-        st = self.steps(symbol)
-        q = self._round_step(qty, st["qty_step"])
-        q = float(f"{q:.10f}")
-        return q if q >= st["min_qty"] else 0.0
+        return self._qty_r(self.rules(symbol), qty)
 
     def notional(self, price: float, qty: float) -> float:
         return float(price) * float(qty)
 
     def ensure_min_notional(self, symbol: str, price: float, qty: float) -> float:
-        st = self.steps(symbol)
-        mn = st["min_notional"]
-        if mn <= 0 or price <= 0:
-            return qty
-        need = mn / price
-        qstep = st["qty_step"]
-        needed_rounded = math.ceil(need / qstep) * qstep if qstep > 0 else need
-        q = max(needed_rounded, qty)
-        return self.normalize_qty(symbol, q)
-
-    def normalize_order(self, symbol: str, side: str, qty: float, price: float | None, order_type: str, reduce_only: bool) -> Dict[str, float]:
-        self._load()
-        p = float(price) if price is not None else None
-        if p is not None:
-            p = self.normalize_price(symbol, p)
-        q = self.normalize_qty(symbol, qty)
+        return self._min_notional_r(self.rules(symbol), price, qty)
 
+    def _normalize_order_r(self, r: Optional[SymbolRules], qty: float, price: float | None, reduce_only: bool) -> Dict[str, float]:
+        p = self._price_r(r, float(price)) if price is not None else None
+        q = self._qty_r(r, qty)
         if not reduce_only and p is not None and p > 0:
-            q = self.ensure_min_notional(symbol, p, q)
+            q = self._min_notional_r(r, p, q)
+        return {"price": p, "qty": q}
+
+    def normalize_order(self, symbol: str, side: str, qty: float, price: float | None, order_type: str, reduce_only: bool) -> Dict[str, float]:
+        return self._normalize_order_r(self.rules(symbol), qty, price, reduce_only)
 
-        return {"price": p if price is not None else None, "qty": q}
+    def normalize_orders(self, orders: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Toplu normalizasyon: [{"symbol","side","qty","price","type","reduce_only"}, ...]
+        Her eleman için {"symbol","price","qty"} döner; kayıt araması sembol başına bir kez yapılır.
+        """
+        rules = self._rules
+        if not rules and self._exchange is None:
+            self._load()
+            rules = self._rules
+        memo: Dict[str, Optional[SymbolRules]] = {}
+        out: List[Dict[str, Any]] = []
+        for o in orders or []:
+            sym = o.get("symbol")
+            if sym not in memo:
+                memo[sym] = rules.get(sym)
+            n = self._normalize_order_r(memo[sym], float(o.get("qty") or 0.0), o.get("price"),
+                                        bool(o.get("reduce_only") or o.get("reduceOnly")))
+            n["symbol"] = sym
+            out.append(n)
+        return out
 
     def normalize(self, symbol: str, qty: float, price: float | None) -> Dict[str, Any]:
-        self._load()
-        f = self._filters.get(symbol)
-        if not f:
+        r = self.rules(symbol)
+        if r is None:
             return {"qty": qty, "price": price}
 
-        qty_n = self._round_step(qty, f["stepSize"])
-        if f.get("quantityPrecision") is not None:
-            qty_n = self._round_precision(qty_n, f["quantityPrecision"])
+        qty_n = self._qty_r(r, qty) if r.step_dec > 0 else float(qty)
+        if r.qty_precision is not None:
+            qty_n = self._round_precision(qty_n, r.qty_precision)
 
         price_n = None
         if price is not None:
-            price_n = self._round_step(price, f["tickSize"])
-            if f.get("pricePrecision") is not None:
-                price_n = self._round_precision(price_n, f["pricePrecision"])
+            price_n = self._price_r(r, price)
+            if r.price_precision is not None:
+                price_n = self._round_precision(price_n, r.price_precision)
 
         notional_ok = True
-        if price_n is not None and f["minNotional"] > 0:
-            notional_ok = (qty_n * price_n) >= f["minNotional"]
+        if price_n is not None and r.min_notional > 0:
+            notional_ok = (qty_n * price_n) >= r.min_notional
             if not notional_ok:
                 self.logger.warning(
-                    f"[Normalize] {symbol} minNotional koşulu sağlanmadı: qty*price={qty_n*price_n:.4f} < {f['minNotional']}"
+                    f"[Normalize] {symbol} minNotional koşulu sağlanmadı: qty*price={qty_n*price_n:.4f} < {r.min_notional}"
                 )
 
         return {"qty": qty_n, "price": price_n, "minNotional_ok": notional_ok}
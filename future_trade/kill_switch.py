@@ -1,5 +1,6 @@
 # /opt/tradebot/future_trade/kill_switch.py
 from __future__ import annotations
+import asyncio
 import logging
 from typing import Callable, Optional
 
@@ -35,6 +36,37 @@ class KillSwitch:
 
         self.trading_enabled = True
         self._peak_equity = None  # gün içi zirve equity (DD için)
+        self._tracker = None      # EquityTracker (opsiyonel; tick bazlı değerlendirme)
+        self._trigger_task = None
+        self._coordinator = None  # ShardLink (çok süreçli kurulumda global halt)
+        self._global_equity = None  # shard modu: koordinatörün topladığı hesap equity'si
+
+    def bind_equity_tracker(self, tracker):
+        """
+        Equity'yi DB tahmini yerine EquityTracker'dan al ve her equity değişiminde
+        (tick/ACCOUNT_UPDATE) eşikleri anında değerlendir.
+        """
+        self._tracker = tracker
+        tracker.add_listener(self.on_equity)
+
+    def bind_coordinator(self, link):
+        """
+        Shard modunda: bu worker tetiklenince koordinatöre global halt gönderilir,
+        gün başı reset'te resume. Diğer worker'ların halt'ı apply_remote_halt ile gelir.
+        Eşikler yerel tracker yerine on_global_equity ile gelen hesap equity'siyle değerlendirilir.
+        """
+        self._coordinator = link
+
+    def apply_remote_halt(self, reason: str) -> None:
+        """
+        Başka bir shard'ın kill-switch'i: yalnız yeni girişler kilitlenir. Kapatmayı tetikleyen
+        worker yapar (emergency_flatten borsa snapshot'ıyla tüm hesabı düzler).
+        """
+        if not self.trading_enabled:
+            return
+        self.trading_enabled = False
+        self.logger.error(f"[KILL-SWITCH] Trading disabled by global halt: {reason}")
+        asyncio.ensure_future(self._alert({"event": "kill_switch_global_halt", "reason": reason}))
 
     # Dışarıya “yeni emir açılabilir mi?” sorusu için:
     def is_trading_allowed(self) -> bool:
@@ -53,15 +85,49 @@ class KillSwitch:
                 pass
 
     def _equity_now(self) -> float:
+        if self._coordinator is not None and self._global_equity is not None:
+            return float(self._global_equity)
+        t = self._tracker
+        if t is not None and t.ready:
+            return float(t.equity)
         # Persistence üzerinden basit tahmin
         return float(self.db.estimate_account_equity(self.price_provider, start_equity_fallback=self.start_equity))
 
+    def on_equity(self, eq: float) -> None:
+        """EquityTracker dinleyicisi: O(1) eşik kontrolü; ihlalde tetik görevi planlanır."""
+        if self._coordinator is not None:
+            return  # shard modu: yerel tracker yalnız bu shard'ın uPnL'ini tutar (bkz. on_global_equity)
+        self._check_equity(eq)
+
+    def on_global_equity(self, eq: float) -> None:
+        """Shard modu: koordinatörün topladığı hesap equity'si (cüzdan + tüm shard'ların uPnL'i)."""
+        self._global_equity = float(eq)
+        self._check_equity(self._global_equity)
+
+    def _check_equity(self, eq: float) -> None:
+        if not self.trading_enabled or (self._trigger_task and not self._trigger_task.done()):
+            return
+        snap = self._evaluate(float(eq))
+        if snap["triggered"]:
+            try:
+                self._trigger_task = asyncio.get_running_loop().create_task(
+                    self._trigger_liquidation(snap["reason"])
+                )
+            except RuntimeError:
+                pass
+
     async def check_and_maybe_trigger(self) -> dict:
         """
         Eşikler aşıldıysa Kill-Switch tetikler. Aksi halde sadece ölçümleri döndürür.
         Dönüş: {"equity": float, "pnl_pct": float, "dd_pct": float, "triggered": bool, "reason": str|None}
         """
-        eq = self._equity_now()
+        snap = self._evaluate(self._equity_now())
+        if snap["triggered"] and self.trading_enabled and not (self._trigger_task and not self._trigger_task.done()):
+            await self._trigger_liquidation(snap["reason"])
+        return snap
+
+    def _evaluate(self, eq: float) -> dict:
+        """Ölçümleri güncelle ve eşikleri kontrol et (yan etkisiz: tetiklemez)."""
         reason = None
         triggered = False
 
@@ -85,9 +151,6 @@ class KillSwitch:
             reason = f"drawdown_limit reached ({dd_pct:.2f}%)"
             triggered = True
 
-        if triggered and self.trading_enabled:
-            await self._trigger_liquidation(reason)
-
         return {"equity": eq, "pnl_pct": pnl_pct, "dd_pct": dd_pct, "triggered": triggered, "reason": reason}
 
     async def _trigger_liquidation(self, reason: str):
@@ -95,9 +158,27 @@ class KillSwitch:
         Tüm açık pozisyonları kapat ve alarmları gönder; yeni emirleri kilitle.
         """
         self.logger.error(f"[KILL-SWITCH] Triggering due to: {reason}")
-        await self._alert({"event": "kill_switch_trigger", "reason": reason})
+        # Yeni emirleri HEMEN kilitle (kapatma sürerken giriş açılmasın)
+        self.trading_enabled = False
+        if self._coordinator is not None:
+            asyncio.ensure_future(self._coordinator.halt(reason))
+        alert_task = asyncio.ensure_future(self._alert({"event": "kill_switch_trigger", "reason": reason}))
 
-        # Açık pozisyonları kapat
+        flatten = getattr(self.rec, "emergency_flatten", None)
+        if callable(flatten):
+            try:
+                res = await flatten(reason="kill_switch")
+            except Exception as e:
+                self.logger.error(f"[KILL-SWITCH] emergency_flatten error: {e}")
+                res = {"closed": 0, "error": str(e)}
+            await alert_task
+            await self._alert({"event": "kill_switch_positions_closed", "count": res.get("closed", 0),
+                               "remaining": res.get("remaining"), "time_to_flat_ms": res.get("time_to_flat_ms")})
+            self.logger.error("[KILL-SWITCH] Trading disabled")
+            return
+
+        await alert_task
+        # Açık pozisyonları kapat (eski yol)
         try:
             positions = self.db.list_open_positions() or []
         except Exception as e:
@@ -121,9 +202,6 @@ class KillSwitch:
                 self.logger.error(f"[KILL-SWITCH] close error for {p}: {e}")
 
         await self._alert({"event": "kill_switch_positions_closed", "count": closed})
-
-        # Yeni emirleri kilitle
-        self.trading_enabled = False
         self.logger.error("[KILL-SWITCH] Trading disabled")
 
     def reset_for_new_day(self, new_start_equity: float = None):
@@ -135,4 +213,8 @@ class KillSwitch:
         else:
             self.start_equity = self._equity_now()
         self._peak_equity = None
+        if self._tracker is not None:
+            self._tracker.reset_peak()
         self.trading_enabled = True
+        if self._coordinator is not None:
+            asyncio.ensure_future(self._coordinator.resume())
@@ -1,7 +1,7 @@
 # /opt/tradebot/future_trade/klines_cache.py
 from __future__ import annotations
 import asyncio, logging
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional
 
 def _atr_from_ohlc(h: List[float], l: List[float], c: List[float], period: int) -> Optional[float]:
     n = len(c)
@@ -31,6 +31,11 @@ class KlinesCache:
         self.logger = logger or logging.getLogger("klines_cache")
         # hafıza: {sym: {"o":[], "h":[], "l":[], "c":[], "t":[]}}
         self._buf: Dict[str, Dict[str, List[float]]] = {}
+        self._listeners: List[Callable] = []
+
+    def add_listener(self, cb: Callable) -> None:
+        """Her yenileme turundan sonra cb(self) çağrılır (paylaşılan OHLCV tüketicileri için)."""
+        self._listeners.append(cb)
 
     async def run(self, stop_event: asyncio.Event = None, poll_sec: int = 30):
         while not (stop_event and stop_event.is_set()):
@@ -49,8 +54,17 @@ class KlinesCache:
                         self.logger.debug(f"klines fetch failed for {sym}: {e}")
             except Exception as e:
                 self.logger.error(f"klines loop error: {e}")
+            for cb in self._listeners:
+                try:
+                    cb(self)
+                except Exception as e:
+                    self.logger.debug(f"klines listener error: {e}")
             await asyncio.sleep(max(10, poll_sec))
 
+    def series(self, symbol: str) -> Optional[Dict[str, List[float]]]:
+        """Sembolün önbellekteki OHLC serileri ({"o","h","l","c","t"}) ya da None."""
+        return self._buf.get(symbol)
+
     def get_atr(self, symbol: str, period: int) -> Optional[float]:
         buf = self._buf.get(symbol)
         if not buf:
@@ -0,0 +1,210 @@
+# /opt/tradebot/future_trade/liquidation_guard.py
+# -*- coding: utf-8 -*-
+"""
+Yerel likidasyon mesafesi bekçisi.
+
+position_risk_guard_loop her turda whitelist'teki HER sembol için /fapi/v2/positionRisk
+çağırıyordu (pozisyon olmasa bile). Bu bekçi:
+  - açık pozisyonları yerel DB'den (positions_cache) okur,
+  - likidasyon fiyatını bracket (mmr + cum) ve kaldıraçtan yerelde hesaplar
+    (ISOLATED tek yön formülü; CROSS için muhafazakâr yaklaşım),
+  - MarketStream tick dinleyicisiyle her fiyatta mesafeyi O(1) kontrol eder,
+  - interval_sec'te bir hesap-geneli TEK positionRisk çağrısıyla doğrular; borsanın
+    liquidationPrice değeri geldiğinde o esas alınır.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Optional
+
+from future_trade.event_bus import idle_wait
+
+
+def estimate_liquidation_price(side: str, qty: float, entry: float, leverage: float,
+                               brackets: list, wallet: Optional[float] = None) -> Optional[float]:
+    """
+    Binance tek-yön (BOTH) likidasyon formülü:
+        LP = (WB + cum − s·Q·EP) / (Q·MMR − s·Q)      s=+1 LONG, −1 SHORT, Q=|qty|
+    WB verilmezse ISOLATED cüzdanı ≈ Q·EP/kaldıraç alınır.
+    """
+    q = abs(float(qty or 0.0))
+    ep = float(entry or 0.0)
+    if q <= 0 or ep <= 0:
+        return None
+    s = 1.0 if (side or "").upper() in ("LONG", "BUY") else -1.0
+    notional = q * ep
+    mmr, cum = 0.004, 0.0
+    for b in brackets or []:
+        if float(b.get("floor", 0.0)) <= notional <= float(b.get("cap", float("inf"))):
+            mmr, cum = float(b.get("mmr", mmr)), float(b.get("cum", 0.0) or 0.0)
+            break
+    else:
+        if brackets:
+            mmr, cum = float(brackets[-1].get("mmr", mmr)), float(brackets[-1].get("cum", 0.0) or 0.0)
+    wb = float(wallet) if wallet is not None else notional / max(1.0, float(leverage or 1.0))
+    den = q * mmr - s * q
+    if den == 0:
+        return None
+    lp = (wb + cum - s * q * ep) / den
+    return lp if lp > 0 else None
+
+
+class LiquidationGuard:
+    def __init__(self, cfg: Dict[str, Any], notifier, persistence, client=None, risk=None, logger=None):
+        pr = cfg or {}
+        self.warn = float(pr.get("distance_warn_pct", 3.0)) / 100.0
+        self.crit = float(pr.get("distance_crit_pct", 1.5)) / 100.0
+        self.verify_sec = max(20.0, float(pr.get("interval_sec", 60)))
+        self.resync_sec = max(1.0, float(pr.get("resync_sec", 15)))
+        self.realert_sec = float(pr.get("realert_sec", 300))
+
+        self.notifier = notifier
+        self.persistence = persistence
+        self.client = client
+        self.risk = risk
+        self.logger = logger or logging.getLogger("pos_risk_guard")
+
+        # {symbol: {"side","qty","entry","lev","liq","src","level","alert_ts"}}
+        self._state: Dict[str, Dict[str, Any]] = {}
+        self._sub = None
+        self._last_verify = 0.0
+        self._pending: set = set()
+
+    # ---------- pozisyon/likidasyon ----------
+    def _leverage(self, symbol: str) -> float:
+        fn = getattr(self.risk, "_symbol_leverage", None)
+        try:
+            return float(fn(symbol)) if callable(fn) else 1.0
+        except Exception:
+            return 1.0
+
+    def _brackets(self, symbol: str) -> list:
+        fn = getattr(self.risk, "cached_brackets", None)
+        try:
+            return fn(symbol) if callable(fn) else []
+        except Exception:
+            return []
+
+    def sync_positions(self) -> None:
+        try:
+            rows = self.persistence.list_open_positions() or []
+        except Exception as e:
+            self.logger.debug(f"[PRG] list positions failed: {e}")
+            return
+        seen = set()
+        for p in rows:
+            sym = p.get("symbol")
+            side = (p.get("side") or "").upper()
+            qty = abs(float(p.get("qty") or 0.0))
+            entry = float(p.get("entry_price") or 0.0)
+            if not sym or qty <= 0 or entry <= 0:
+                continue
+            seen.add(sym)
+            st = self._state.get(sym)
+            if st and st["side"] == side and st["qty"] == qty and st["entry"] == entry:
+                continue  # değişmedi → borsa doğrulamalı liq korunur
+            lev = self._leverage(sym)
+            liq = estimate_liquidation_price(side, qty, entry, lev, self._brackets(sym))
+            self._state[sym] = {"side": side, "qty": qty, "entry": entry, "lev": lev, "liq": liq,
+                                "src": "local", "level": None, "alert_ts": 0.0}
+        for sym in list(self._state):
+            if sym not in seen:
+                self._state.pop(sym, None)
+
+    async def verify(self) -> int:
+        """Hesap-geneli tek positionRisk ile liq değerlerini doğrular; güncellenen sembol sayısı."""
+        fn = getattr(self.client, "position_risk", None) or getattr(self.client, "get_position_risk", None)
+        if not callable(fn):
+            return 0
+        try:
+            data = await fn()
+        except Exception as e:
+            self.logger.debug(f"[PRG] positionRisk verify failed: {e}")
+            return 0
+        n = 0
+        for r in data or []:
+            try:
+                sym = r.get("symbol")
+                st = self._state.get(sym)
+                if st is None or float(r.get("positionAmt") or 0.0) == 0.0:
+                    continue
+                liq = float(r.get("liquidationPrice") or 0.0)
+                if liq <= 0:
+                    continue
+                local = st.get("liq")
+                if local and abs(local - liq) / liq > 0.01:
+                    self.logger.debug(f"[PRG] {sym} local liq={local:.8g} vs exchange={liq:.8g}")
+                st["liq"], st["src"] = liq, "exchange"
+                n += 1
+                mark = float(r.get("markPrice") or 0.0)
+                if mark > 0:
+                    self.on_tick(sym, mark)
+            except Exception as ie:
+                self.logger.debug(f"[PRG] parse risk err: {ie}")
+        return n
+
+    # ---------- tick ----------
+    def on_tick(self, symbol: str, price: float, ts: Optional[float] = None) -> None:
+        st = self._state.get(symbol)
+        if st is None or not st.get("liq") or not price or price <= 0:
+            return
+        dist = abs(price - st["liq"]) / price
+        level = "CRITICAL" if dist <= self.crit else ("WARN" if dist <= self.warn else None)
+        if level is None:
+            st["level"] = None
+            return
+        now = float(ts or time.time())
+        escalated = level == "CRITICAL" and st.get("level") != "CRITICAL"
+        if not escalated and st.get("level") == level and now - st["alert_ts"] < self.realert_sec:
+            return
+        if symbol in self._pending:
+            return
+        st["level"], st["alert_ts"] = level, now
+        payload = {
+            "event": "position_risk",
+            "symbol": symbol,
+            "qty": st["qty"] if st["side"] in ("LONG", "BUY") else -st["qty"],
+            "mark": price,
+            "liq": st["liq"],
+            "dist_pct": dist,
+            "source": st["src"],
+            "level": level,
+        }
+        if level == "CRITICAL":
+            self.logger.warning(f"[PRG] CRIT {symbol} dist={dist:.2%}")
+        else:
+            self.logger.info(f"[PRG] WARN {symbol} dist={dist:.2%}")
+        try:
+            self._pending.add(symbol)
+            task = asyncio.get_running_loop().create_task(self._notify(symbol, payload))
+            task.add_done_callback(lambda _t, s=symbol: self._pending.discard(s))
+        except RuntimeError:
+            self._pending.discard(symbol)
+
+    async def _notify(self, symbol: str, payload: Dict[str, Any]) -> None:
+        try:
+            await self.notifier.notify_position_risk(payload)  # DB aynası notifier içinde
+        except Exception as e:
+            self.logger.debug(f"[PRG] notify failed {symbol}: {e}")
+
+    # ---------- yaşam döngüsü ----------
+    def bind_bus(self, bus) -> None:
+        """position_change gelince pozisyonlar (ve yerel liq) hemen yeniden okunur."""
+        self._sub = bus.subscribe("liquidation_guard", types=("position_change",), maxsize=64)
+
+    async def run(self, stop_event: asyncio.Event = None):
+        while not (stop_event and stop_event.is_set()):
+            try:
+                self.sync_positions()
+                now = time.time()
+                if self._state and now - self._last_verify >= self.verify_sec:
+                    self._last_verify = now
+                    await self.verify()
+            except Exception as e:
+                self.logger.error(f"pos risk guard err: {e}")
+            await idle_wait(self._sub, self.resync_sec)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        return {k: dict(v) for k, v in self._state.items()}
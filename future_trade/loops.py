@@ -5,6 +5,7 @@ import logging
 from datetime import datetime, timedelta, timezone
 from typing import Any, Dict
 
+from future_trade.event_bus import idle_wait
 from future_trade.strategy.base import Signal
 
 
@@ -15,13 +16,20 @@ def _build_ctx(
 ) -> Dict[str, Any]:
     """
     Stratejilere verilecek ortak bağlam.
-    - İleride state, cache, bars vb. genişletebilirsin.
+    - bars: {tf: son kapanmış bar} (stream'in çoklu TF toplayıcısından; üst TF teyidi için)
+    - get_bars(tf, n=None): bu sembolün kapanmış bar geçmişi
+    - İleride state, cache vb. genişletebilirsin.
     """
+    bars_snapshot = getattr(stream, "bars_snapshot", None)
+    get_bars = getattr(stream, "get_bars", None)
     return {
         "symbol": symbol,
         "close": close,
         "timestamp": timestamp,
         "get_last_price": getattr(stream, "get_last_price", None),
+        "indices": stream.indices_snapshot() if hasattr(stream, "indices_snapshot") else {},
+        "bars": bars_snapshot(symbol) if callable(bars_snapshot) else {},
+        "get_bars": (lambda tf, n=None: get_bars(symbol, tf, n)) if callable(get_bars) else None,
         "stream": stream,
         "strategy": strategy,
         "portfolio": portfolio,
@@ -34,46 +42,63 @@ def _build_ctx(
         "kill_switch": kill_switch,
     }
 
-def _call_strategy_on_bar_dynamic(strategy, event: dict, ctx: dict):
-    import logging
+def _resolve_strategy_call(strategy):
+    """
+    strategy.on_bar imzasını BİR KEZ çözer; (event, ctx) -> sonuç çağıran bir fonksiyon döndürür.
+    İlk çağrıda positional denenir, TypeError olursa kwargs'a düşülür ve bu seçim de önbelleğe alınır.
+    """
     log = logging.getLogger("strat_loop")
 
     func = getattr(strategy, "on_bar", None)
     if not callable(func):
         return None
 
-    argmap = {
-        "event": event,
-        "bar_event": event,
-        "symbol": event.get("symbol"),
-        "close": event.get("close"),
-        "price": event.get("close"),
-        "timestamp": event.get("time"),
-        "ts": event.get("time"),
-        "tf": event.get("tf"),
-        "ctx": ctx,
-    }
-    # print("BAR:", argmap) # sembole ait tüm verileri termiande gösterir 
-    sig = inspect.signature(func)
-    params = [
-        p for p in sig.parameters.values()
-        if p.kind in (inspect.Parameter.POSITIONAL_ONLY,
-                      inspect.Parameter.POSITIONAL_OR_KEYWORD,
-                      inspect.Parameter.KEYWORD_ONLY)
-    ]
-    names = [p.name for p in params]
-
-    # Positional arg list
-    posargs = [argmap[name] for name in names if name in argmap]
-    log.debug(f"[STRAT-CALL] posargs: {posargs}")
-
     try:
-        return func(*posargs)  # ← önce positional dene
-    except TypeError as e:
-        log.debug(f"[STRAT-CALL] positional failed: {e}")
-        kwargs = {name: argmap[name] for name in names if name in argmap}
-        log.debug(f"[STRAT-CALL] fallback kwargs: {kwargs}")
-        return func(**kwargs)
+        sig = inspect.signature(func)
+        names = [
+            p.name for p in sig.parameters.values()
+            if p.kind in (inspect.Parameter.POSITIONAL_ONLY,
+                          inspect.Parameter.POSITIONAL_OR_KEYWORD,
+                          inspect.Parameter.KEYWORD_ONLY)
+        ]
+    except (TypeError, ValueError):
+        names = ["event", "ctx"]
+    log.debug(f"[STRAT-CALL] resolved on_bar params: {names}")
+
+    mode = {"kw": False}
+
+    def _argmap(event: dict, ctx: dict) -> dict:
+        return {
+            "event": event,
+            "bar_event": event,
+            "symbol": event.get("symbol"),
+            "close": event.get("close"),
+            "price": event.get("close"),
+            "timestamp": event.get("time"),
+            "ts": event.get("time"),
+            "tf": event.get("tf"),
+            "ctx": ctx,
+        }
+
+    def call(event: dict, ctx: dict):
+        argmap = _argmap(event, ctx)
+        if mode["kw"]:
+            return func(**{name: argmap[name] for name in names if name in argmap})
+        try:
+            return func(*[argmap[name] for name in names if name in argmap])  # ← önce positional dene
+        except TypeError as e:
+            log.debug(f"[STRAT-CALL] positional failed: {e}; switching to kwargs")
+            mode["kw"] = True
+            return func(**{name: argmap[name] for name in names if name in argmap})
+
+    return call
+
+
+def _call_strategy_on_bar_dynamic(strategy, event: dict, ctx: dict):
+    """Geriye dönük uyumluluk: tek seferlik çağrı (her seferinde imza çözer)."""
+    call = _resolve_strategy_call(strategy)
+    return call(event, ctx) if call else None
+
 
 async def strat_loop(
     stream,
@@ -88,112 +113,187 @@ async def strat_loop(
     kill_switch=None,
     order_manager=None  # ← yeni parametre eklendi
 ):
+    """
+    Dağıtıcı: bar_closed event'lerini sembol bazında worker'lara böler.
+    - Aynı sembolün event'leri sırayla işlenir (sembol başına kuyruk + tek worker).
+    - Farklı semboller eşzamanlı değerlendirilir.
+    - Sinyal üretimi ile emir yürütme ayrıdır: intent'ler yürütme görevine devredilir
+      (sembol kilidi sırayı korur, semafor eşzamanlı emir sayısını sınırlar); Telegram
+      bildirimi arka planda gönderilir, sıradaki event'i bekletmez.
+    """
     log = logging.getLogger("strat_loop")
-    tf_entry = (cfg.get("strategy", {}) or {}).get("timeframe_entry", "1h")
+    strat_cfg = cfg.get("strategy", {}) or {}
+    tf_entry = strat_cfg.get("timeframe_entry", "1h")
+    worker_qsize = max(1, int(strat_cfg.get("worker_queue", 8)))
+    exec_sem = asyncio.Semaphore(max(1, int(strat_cfg.get("exec_concurrency", 8))))
+
+    call_strategy = _resolve_strategy_call(strategy)
+    if call_strategy is None:
+        log.error("[STRAT] strategy has no callable on_bar; strat_loop idle")
+
+    queues: Dict[str, asyncio.Queue] = {}
+    workers: Dict[str, asyncio.Task] = {}
+    exec_locks: Dict[str, asyncio.Lock] = {}
+    background: set = set()
+
+    def _spawn(coro, name: str):
+        t = asyncio.create_task(coro, name=name)
+        background.add(t)
+        t.add_done_callback(background.discard)
+        return t
+
+    def _trading_allowed() -> bool:
+        return not (kill_switch and hasattr(kill_switch, "is_trading_allowed")
+                    and not kill_switch.is_trading_allowed())
+
+    async def _notify(method: str, payload: Dict[str, Any]):
+        try:
+            await getattr(notifier, method)(payload)
+        except Exception:
+            pass
+
+    async def _execute(symbol: str, trade_intent: Dict[str, Any], side: str):
+        lock = exec_locks.setdefault(symbol, asyncio.Lock())
+        async with lock:
+            async with exec_sem:
+                if not _trading_allowed():
+                    log.info(f"[KS-BLOCK] trading disabled; drop intent {trade_intent}")
+                    return
+                try:
+                    res = order_manager.open_entry_from_intent(trade_intent)
+                    if inspect.isawaitable(res):
+                        res = await res
+                except Exception as e:
+                    log.error(f"[ENTRY-ERR] {e}")
+                    _spawn(_notify("alert", {
+                        "event": "entry_error",
+                        "error": str(e),
+                        "intent": trade_intent
+                    }), f"notify_err_{symbol}")
+                    return
+        log.info(f"[ENTRY-OK] {res}")
+        _spawn(_notify("info_trades", {
+            "event": "entry",
+            "symbol": trade_intent.get("symbol"),
+            "side": side,
+            "qty": trade_intent.get("qty")
+        }), f"notify_entry_{symbol}")
+
+    def _evaluate(ev: Dict[str, Any]):
+        symbol = ev.get("symbol")
+        close = float(ev.get("close", 0) or 0)
+        ts = int(ev.get("time", 0) or 0)
+        ctx = _build_ctx(
+            stream=stream, strategy=strategy, portfolio=portfolio, supervisor=supervisor,
+            risk=risk, router=router, persistence=persistence, notifier=notifier,
+            cfg=cfg, kill_switch=kill_switch, symbol=symbol, close=close, timestamp=ts
+        )
+        log.debug(f"[CTX] built for {symbol} @ {ts}: {list(ctx.keys())}")
+
+        if not _trading_allowed():
+            log.info(f"[KS-BLOCK] trading disabled; skip signals @ {symbol}")
+            return
+
+        event_dict = {
+            "type": "bar_closed",
+            "symbol": symbol,
+            "tf": tf_entry,
+            "close": close,
+            "time": ts,
+            "ema20": ev.get("ema20")
+        }
+        for k in ("open", "high", "low", "volume", "open_time"):
+            if k in ev:
+                event_dict[k] = ev[k]
+        log.debug(f"[STRAT-CALL] event_dict: {event_dict}")
 
-    async for ev in stream.events():
         try:
-            if ev.get("type") != "bar_closed":
-                continue
-            if ev.get("tf") != tf_entry:
-                log.debug(f"[FILTER] skipped tf={ev.get('tf')} ≠ expected={tf_entry}")
-                continue
-
-            symbol = ev.get("symbol")
-            close = float(ev.get("close", 0) or 0)
-            ts = int(ev.get("time", 0) or 0)
-            ctx = _build_ctx(
-                stream=stream, strategy=strategy, portfolio=portfolio, supervisor=supervisor,
-                risk=risk, router=router, persistence=persistence, notifier=notifier,
-                cfg=cfg, kill_switch=kill_switch, symbol=symbol, close=close, timestamp=ts
-            )
-            log.debug(f"[CTX] built for {symbol} @ {ts}: {list(ctx.keys())}")
-
-            if kill_switch and hasattr(kill_switch, "is_trading_allowed") and not kill_switch.is_trading_allowed():
-                log.info(f"[KS-BLOCK] trading disabled; skip signals @ {symbol}")
-                continue
-
-            event_dict = {
-                "type": "bar_closed",
-                "symbol": symbol,
-                "tf": tf_entry,
-                "close": close,
-                "time": ts,
-                "ema20": ev.get("ema20")
-            }
-            log.debug(f"[STRAT-CALL] event_dict: {event_dict}")
+            trade_intent = call_strategy(event_dict, ctx) if call_strategy else None
+        except Exception as e:
+            log.error(f"[STRAT] on_bar error: {e}")
+            return
 
+        if isinstance(trade_intent, Signal):
+            log.info(f"[SIGNAL] {symbol} → {trade_intent.side} strength={trade_intent.strength} entry={trade_intent.entry}")
+
+        # ✅ Intent işleme – yürütme ayrı görevde
+        if isinstance(trade_intent, dict) and trade_intent.get("action") == "entry":
+            side = (trade_intent.get("side") or "").upper()
+            if side in ("BUY", "SELL"):
+                if order_manager:
+                    _spawn(_execute(symbol, trade_intent, side), f"entry_{symbol}")
+                else:
+                    log.info(f"[INTENT] {trade_intent} (no order_manager bound)")
+
+    async def _worker(symbol: str, q: asyncio.Queue):
+        while True:
+            ev = await q.get()
             try:
-                trade_intent = _call_strategy_on_bar_dynamic(strategy, event_dict, ctx)
+                _evaluate(ev)
             except Exception as e:
-                log.error(f"[STRAT] on_bar error: {e}")
-                continue
-
-            if isinstance(trade_intent, Signal):
-                log.info(f"[SIGNAL] {symbol} → {trade_intent.side} strength={trade_intent.strength} entry={trade_intent.entry}")
-
-            # ✅ Intent işleme – artık gerçek emir gönderimi var
-            if isinstance(trade_intent, dict) and trade_intent.get("action") == "entry":
-                side = (trade_intent.get("side") or "").upper()
-                if side in ("BUY", "SELL"):
-                    if kill_switch and hasattr(kill_switch, "is_trading_allowed") and not kill_switch.is_trading_allowed():
-                        log.info(f"[KS-BLOCK] trading disabled; drop intent {trade_intent}")
-                        continue
-                    if order_manager:
-                        try:
-                            res = order_manager.open_entry_from_intent(trade_intent)
-                            try:
-                                await notifier.info_trades({
-                                    "event": "entry",
-                                    "symbol": trade_intent.get("symbol"),
-                                    "side": side,
-                                    "qty": trade_intent.get("qty")
-                                })
-                            except Exception:
-                                pass
-                            log.info(f"[ENTRY-OK] {res}")
-                        except Exception as e:
-                            log.error(f"[ENTRY-ERR] {e}")
-                            try:
-                                await notifier.alert({
-                                    "event": "entry_error",
-                                    "error": str(e),
-                                    "intent": trade_intent
-                                })
-                            except Exception:
-                                pass
-                    else:
-                        log.info(f"[INTENT] {trade_intent} (no order_manager bound)")
+                log.error(f"strat_loop worker error @ {symbol}: {e}")
+            finally:
+                q.task_done()
+            await asyncio.sleep(0)  # diğer sembol worker'larına sıra ver
 
-        except Exception as e:
-            log.error(f"strat_loop error: {e}")
-            await asyncio.sleep(0.5)
+    try:
+        async for ev in stream.events():
+            try:
+                if ev.get("type") != "bar_closed":
+                    continue
+                if ev.get("tf") != tf_entry:
+                    # diğer TF'ler değerlendirilmez; ctx["bars"] / get_bars ile stratejiye açıktır
+                    continue
+                symbol = ev.get("symbol")
+                q = queues.get(symbol)
+                if q is None:
+                    q = queues[symbol] = asyncio.Queue(maxsize=worker_qsize)
+                    workers[symbol] = asyncio.create_task(_worker(symbol, q), name=f"strat_{symbol}")
+                if q.full():
+                    # sembol geride kaldı: en eski bar yerine en yenisi değerlendirilsin
+                    try:
+                        q.get_nowait()
+                        q.task_done()
+                        log.warning(f"[STRAT] {symbol} worker lagging; dropped oldest bar event")
+                    except asyncio.QueueEmpty:
+                        pass
+                q.put_nowait(ev)
+            except Exception as e:
+                log.error(f"strat_loop error: {e}")
+                await asyncio.sleep(0.5)
+    finally:
+        for t in list(workers.values()) + list(background):
+            t.cancel()
 
 
-async def trailing_loop(router, stream, notifier, cfg, stop_event=None):
+async def trailing_loop(router, stream, notifier, cfg, stop_event=None, bus=None):
     log = logging.getLogger("trailing_loop")
     interval = int((cfg.get("trailing", {}) or {}).get("update_interval_sec", 30))
+    sub = bus.subscribe("trailing_loop", types=("position_change",), maxsize=64) if bus is not None else None
     while not (stop_event and stop_event.is_set()):
         try:
-            router.update_trailing_for_open_positions()
+            await router.update_trailing_for_open_positions()
         except Exception as e:
             try:
                 await notifier.alert({"event": "trailing_error", "error": str(e)})
             except Exception:
                 pass
             log.error(f"trailing_loop error: {e}")
-        await asyncio.sleep(max(5, interval))
+        await idle_wait(sub, max(5, interval))
 
 
-async def kill_switch_loop(kill_switch, notifier, interval_sec: int = 10, stop_event=None):
+async def kill_switch_loop(kill_switch, notifier, interval_sec: int = 10, stop_event=None, bus=None):
     log = logging.getLogger("kill_switch_loop")
+    # account_update/position_change gelince hemen değerlendir; yoksa interval_sec'te bir
+    sub = (bus.subscribe("kill_switch", types=("account_update", "position_change"), maxsize=64)
+           if bus is not None else None)
     while not (stop_event and stop_event.is_set()):
         try:
             snap = await kill_switch.check_and_maybe_trigger()
             log.info(f"[KS] eq={snap['equity']:.2f} pnl%={snap['pnl_pct']:.2f} dd%={snap['dd_pct']:.2f} triggered={snap['triggered']}")
         except Exception as e:
             log.error(f"kill_switch_loop error: {e}")
-        await asyncio.sleep(max(5, int(interval_sec)))
+        await idle_wait(sub, max(5, int(interval_sec)))
 
 async def daily_reset_loop(kill_switch, notifier, stop_event=None, tz_offset_hours: int = 0):
     """
@@ -276,10 +376,13 @@ async def position_risk_guard_loop(
     interval_sec: int = 60,
     warn_pct: float = 3.0,
     crit_pct: float = 1.5,
+    bus=None,
 ):
     """
     Her interval'da semboller için /fapi/v2/positionRisk kontrol eder.
     Likidasyon mesafesi (|mark-liq|/mark) eşiğin altına inerse Telegram + DB log.
+    bus verilirse position_change gelince yalnız değişen semboller hemen kontrol edilir;
+    olay yoksa interval'da bir tüm liste.
     """
     log = logging.getLogger("pos_risk_guard")
     warn = warn_pct / 100.0
@@ -320,16 +423,22 @@ async def position_risk_guard_loop(
             except Exception as ie:
                 log.debug(f"parse risk err {sym}: {ie}")
 
+    sub = bus.subscribe("position_risk_guard", types=("position_change",), maxsize=64) if bus is not None else None
+    wanted = set(symbols or [])
+    batch = list(symbols or [])
     while not (stop_event and stop_event.is_set()):
         try:
-            if not symbols:
-                # boş ise sessizce geç
-                await asyncio.sleep(max(20, interval_sec))
-                continue
-            await asyncio.gather(*[_check_symbol(s) for s in symbols])
+            if batch:
+                await asyncio.gather(*[_check_symbol(s) for s in batch])
         except Exception as e:
             log.error(f"pos risk loop err: {e}")
-        await asyncio.sleep(max(20, interval_sec))
+        events = await idle_wait(sub, max(20, interval_sec))
+        if events:
+            # yalnız pozisyonu açık/değişen semboller (kapanan pozisyonun likidasyon riski yok)
+            batch = sorted({e.get("symbol") for e in events
+                            if e.get("symbol") in wanted and float(e.get("qty") or 0.0) != 0.0})
+        else:
+            batch = list(symbols or [])
 
 # Gün içi günlük Pnl özeti
 
@@ -345,6 +454,7 @@ async def performance_guard_loop(
     min_trades: int = 5,
     cooldown_sec: int = 900,
     tz_offset_hours: int = 3,
+    bus=None,
 ):
     """
     Gün içinde belirli aralıklarla günlük PnL özetini (o ana kadar) hesaplar,
@@ -352,9 +462,24 @@ async def performance_guard_loop(
       - profit_factor < floor
       - current loss streak >= threshold
     Uyarı tipi başına cooldown uygulanır.
+    bus verilirse pozisyon kapanışında (position_change qty=0) hemen değerlendirilir;
+    özet yalnız işlem kapanınca değiştiği için arada interval'da bir tur yeterlidir.
     """
     log = logging.getLogger("perf_guard")
     last_alert_ts = {"PF_BELOW_FLOOR": 0, "LOSS_STREAK": 0}
+    sub = bus.subscribe("performance_guard", types=("position_change",), maxsize=64) if bus is not None else None
+    period = max(30, int(interval_sec))
+
+    async def _wait_close():
+        """Bir kapanış (qty=0) ya da period dolana kadar bekle; açılış olayları turu tetiklemez."""
+        deadline = asyncio.get_running_loop().time() + period
+        while not (stop_event and stop_event.is_set()):
+            left = deadline - asyncio.get_running_loop().time()
+            if left <= 0:
+                return
+            events = await idle_wait(sub, left)
+            if not events or any(float(e.get("qty") or 0.0) == 0.0 for e in events):
+                return
 
     def _now_ts():
         import time
@@ -428,4 +553,4 @@ async def performance_guard_loop(
         except Exception as e:
             log.error(f"performance guard loop error: {e}")
 
-        await asyncio.sleep(max(30, int(interval_sec)))
\ No newline at end of file
+        await _wait_close()
\ No newline at end of file
@@ -4,10 +4,16 @@
 MarketStream (paper/dummy) — Binance Futures için basit piyasa akışı simülatörü.
 
 NE SAĞLAR?
-- Whitelist semboller için periyodik "bar_closed" event'leri üretir (async queue).
+- Sembol başına tek fiyat beslemesinden (on_price tick'leri ya da on_kline 1m mumları)
+  BarAggregator ile 1m/5m/15m/1h/4h/1d barlarını yerelde kurar; her TF için epoch'a hizalı
+  "bar_closed" event'i yayınlar. market_stream.bar_source="paper" iken giriş TF'i eski
+  sentetik PAPER event'inden gelir; bar_source verilmezse mode=="paper" için varsayılan
+  "paper" (mevcut paper kurulumları aynı çalışır), diğer modlarda "aggregate".
 - Son fiyat (last_price) takibini yapar.
 - İsteğe bağlı olarak global endeks (TOTAL3, USDT.D, BTC.D) snapshot'larını
-  /opt/tradebot/veritabani/global_data.db içindeki global_live_data tablosundan çeker.
+  öncelikle kolektörün mmap yayınından (cfg["index_feed"]) kilitsiz okur; yayın yoksa/bayatsa
+  /opt/tradebot/veritabani/global_data.db içindeki global_ohlc_1h/4h rollup tablolarından
+  (yoksa global_live_data ham satırlarından) çeker.
 
 KULLANIM ÖZETİ:
     stream = MarketStream(
@@ -36,7 +42,18 @@ import random
 import sqlite3
 import logging
 from collections import deque
-from typing import Any, AsyncGenerator, Dict, List, Optional
+
+from future_trade.strategy.indicators import EmaState
+from future_trade.event_bus import EventBus
+from future_trade.bar_aggregator import BarAggregator, DEFAULT_TIMEFRAMES
+from typing import Any, AsyncGenerator, Callable, Dict, List, Optional
+
+try:
+    # Kolektörün mmap endeks yayını (aynı host'ta ayrı süreç)
+    from globalislemler.core.index_feed import IndexFeedReader, DEFAULT_FEED_PATH
+except Exception:  # modül yoksa DB'den okumaya devam
+    IndexFeedReader = None
+    DEFAULT_FEED_PATH = None
 
 # Global endeks sembol eşlemesi (TV sembolleri)
 INDEX_MAP = {
@@ -45,6 +62,9 @@ INDEX_MAP = {
     "BTC.D":  "CRYPTOCAP:BTC.D",
 }
 
+# Kolektörün OHLC rollup tablolarındaki (global_ohlc_<tf>) kova uzunlukları
+_TF_SECONDS = {"15m": 900, "1h": 3600, "4h": 14400, "1d": 86400}
+
 
 class MarketStream:
     """
@@ -59,7 +79,8 @@ class MarketStream:
         tf_entry: str = "1h",
         tf_confirm: Optional[str] = None,
         global_db: str = "/opt/tradebot/veritabani/global_data.db",
-        persistence: Optional[bool] = False  # ✅ yeni parametre
+        persistence: Optional[bool] = False,  # ✅ yeni parametre
+        bus: Optional[EventBus] = None,
     ):
         if not isinstance(cfg, dict):
             raise TypeError("cfg bir dict olmalı")
@@ -88,7 +109,17 @@ class MarketStream:
         self.log = lambda msg: self.logger.info(f"[MarketStream] {msg}")
 
         # İç durum
-        self._q: asyncio.Queue[Dict[str, Any]] = asyncio.Queue()
+        # Olay veriyolu: bar_closed/tick buraya yayınlanır; events() strateji aboneliğini tüketir.
+        # Abonelik kurucuda açılır ki strat_loop başlamadan yayınlanan ilk barlar kaybolmasın.
+        bus_cfg = cfg.get("event_bus", {}) or {}
+        self.bus = bus or EventBus(logger=logging.getLogger("event_bus"))
+        # yalnız giriş/onay TF barları: 1m barları kuyruğu doldurup giriş TF barını itmesin
+        # (diğer TF'ler ctx["bars"] / get_bars ile okunur)
+        strat_tfs = {str(self.tf_entry).lower(), str(self.tf_confirm).lower()}
+        self._strategy_sub = self.bus.subscribe(
+            "strategy", types=("bar_closed",), maxsize=int(bus_cfg.get("strategy_maxsize", 4096)),
+            accept=lambda ev: str(ev.get("tf") or "").lower() in strat_tfs,
+        )
         self._indices_cache = {
             "TOTAL3": {"tf1h": {"close": 0.0, "ema20": None}, "tf4h": {"close": 0.0, "ema20": None}},
             "USDT.D": {"tf1h": {"close": 0.0, "ema20": None}, "tf4h": {"close": 0.0, "ema20": None}},
@@ -98,6 +129,37 @@ class MarketStream:
         self._last_prices = {s: 100.0 for s in self.whitelist}
         self._base = {s: 100.0 for s in self.whitelist}
 
+        # Artımlı indikatör state'leri (geçmiş uzunluğundan bağımsız O(1) güncelleme)
+        self._sym_ema = {s: EmaState(self.ema_period) for s in self.whitelist}
+        self._idx_state: Dict[tuple, Dict[str, Any]] = {}   # (endeks, tf) → {"ema","bucket","close"}
+
+        # Çoklu TF bar toplayıcı: tek besleme → tüm TF'ler; kapanan barlar veriyoluna yayınlanır
+        ms_cfg = cfg.get("market_stream", {}) or {}
+        # varsayılan: paper modunda eski sentetik giriş barı (davranış değişmez), canlıda epoch'a hizalı toplayıcı
+        self.bar_source = (ms_cfg.get("bar_source") or ("paper" if self.paper else "aggregate")).lower()
+        self.flush_sec = float(ms_cfg.get("flush_sec", 1.0))
+        self.flush_grace_sec = float(ms_cfg.get("flush_grace_sec", 1.0))
+        tfs = list(ms_cfg.get("timeframes") or DEFAULT_TIMEFRAMES) + [self.tf_entry, self.tf_confirm]
+        self.bars = BarAggregator(
+            timeframes=tfs,
+            history=int(ms_cfg.get("bar_history", 200)),
+            ema_period=self.ema_period,
+            on_bar=self._publish_bar,
+            logger=logging.getLogger("bar_aggregator"),
+        )
+
+        # Fiyat tick dinleyicileri: cb(symbol, price, ts) — trailing motoru vb.
+        self._tick_listeners: List[Callable[[str, float, float], Any]] = []
+
+        # Endeks mmap yayını (kolektör → bot); yoksa/bayatsa DB fallback
+        feed_cfg = cfg.get("index_feed", {}) or {}
+        self._feed = None
+        if IndexFeedReader is not None and feed_cfg.get("enabled", True):
+            self._feed = IndexFeedReader(
+                path=feed_cfg.get("path") or DEFAULT_FEED_PATH,
+                max_age_sec=float(feed_cfg.get("max_age_sec", 180)),
+            )
+
     # -------------------- Yardımcı hesaplamalar --------------------
 
     @staticmethod
@@ -125,9 +187,68 @@ class MarketStream:
         buckets = sorted(seen.keys())
         return [seen[b] for b in buckets]
 
+    def _advance_index_tf(self, cur, key: str, db_sym: str, tf: str) -> Optional[tuple]:
+        """
+        global_ohlc_<tf> rollup'ından yalnızca son işlenen kovadan sonraki satırları okur ve
+        endeks/tf başına tutulan EMA state'ini sadece KAPANAN kovalarla ilerletir.
+        Son satır (açık kova) EMA'ya işlenmez; snapshot için peek() ile denenir.
+        Dönüş: (close, ema20) | None (tablo yok/boş)
+        """
+        st = self._idx_state.get((key, tf))
+        if st is None:
+            st = {"ema": EmaState(20), "bucket": None, "close": None}
+            self._idx_state[(key, tf)] = st
+
+        bucket_sec = _TF_SECONDS[tf]
+        if st["bucket"] is None:
+            since = (int(time.time()) // bucket_sec - 59) * bucket_sec   # ilk yükleme: son 60 kova
+        else:
+            since = int(st["bucket"]) + 1                                 # sadece yeni kovalar
+        try:
+            cur.execute(
+                f"""
+                SELECT ts_bucket_utc, close
+                FROM global_ohlc_{tf}
+                WHERE symbol = ? AND ts_bucket_utc >= ?
+                ORDER BY ts_bucket_utc
+                """,
+                (db_sym, since),
+            )
+            rows = cur.fetchall()
+        except Exception:
+            return None
+
+        if rows:
+            for b, c in rows[:-1]:
+                st["ema"].update(float(c))
+                st["bucket"] = int(b)
+            st["close"] = float(rows[-1][1])
+
+        if st["close"] is None:
+            return None
+        return st["close"], st["ema"].peek(st["close"])
+
+    def _read_raw_rows(self, cur, db_sym: str, limit: int = 2000) -> List[tuple]:
+        """Rollup yoksa geri dönüş: global_live_data ham satırları (yeni → eski)."""
+        try:
+            cur.execute(
+                """
+                SELECT ts_utc, live_price
+                FROM global_live_data
+                WHERE symbol = ?
+                ORDER BY ts_utc DESC
+                LIMIT ?
+                """,
+                (db_sym, limit),
+            )
+            return cur.fetchall()
+        except Exception:
+            return []
+
     def _refresh_indices(self) -> None:
         """
-        global_live_data tablosundan TOTAL3/USDT.D/BTC.D için 1H ve 4H close + EMA20 hesaplar.
+        TOTAL3/USDT.D/BTC.D için 1H ve 4H close + EMA20 hesaplar.
+        Öncelik global_ohlc_1h/4h rollup'larıdır; yoksa global_live_data ham satırları kovalanır.
         DB yoksa/detaylar eksikse dummy snapshot set eder.
         """
         path = self.global_db
@@ -135,39 +256,30 @@ class MarketStream:
         try:
             conn = sqlite3.connect(path, timeout=2)
             cur = conn.cursor()
-            limit = 2000
             out: Dict[str, Dict[str, Any]] = {}
 
             for k, db_sym in INDEX_MAP.items():
-                try:
-                    cur.execute(
-                        """
-                        SELECT CAST(strftime('%s', timestamp) AS INTEGER) AS ts, live_price
-                        FROM global_live_data
-                        WHERE symbol = ?
-                        ORDER BY ts DESC
-                        LIMIT ?
-                        """,
-                        (db_sym, limit),
-                    )
-                    rows = cur.fetchall()
-                except Exception:
-                    rows = []
-
-                if not rows:
+                r1 = self._advance_index_tf(cur, k, db_sym, "1h")
+                r4 = self._advance_index_tf(cur, k, db_sym, "4h")
+
+                if r1 is None or r4 is None:
+                    # Rollup yok → ham satırlardan tam hesap (eski yol)
+                    rows = self._read_raw_rows(cur, db_sym)
+                    if rows:
+                        closes_1h = self._bucketize_last_close(rows, 3600)
+                        closes_4h = self._bucketize_last_close(rows, 14400)
+                        r1 = r1 or (closes_1h[-1], self._ema(closes_1h[-60:], 20))
+                        r4 = r4 or (closes_4h[-1], self._ema(closes_4h[-60:], 20))
+
+                if r1 is None and r4 is None:
                     out[k] = {
                         "tf1h": {"close": 0.0, "ema20": None},
                         "tf4h": {"close": 0.0, "ema20": None}
                     }
                     continue
 
-                closes_1h = self._bucketize_last_close(rows, 3600)
-                closes_4h = self._bucketize_last_close(rows, 14400)
-
-                last_1h = closes_1h[-1] if closes_1h else 0.0
-                last_4h = closes_4h[-1] if closes_4h else 0.0
-                ema20_1h = self._ema(closes_1h[-60:], 20) if len(closes_1h) >= 20 else None
-                ema20_4h = self._ema(closes_4h[-60:], 20) if len(closes_4h) >= 20 else None
+                last_1h, ema20_1h = r1 or (0.0, None)
+                last_4h, ema20_4h = r4 or (0.0, None)
 
                 out[k] = {
                     "tf1h": {"close": last_1h, "ema20": ema20_1h},
@@ -204,66 +316,132 @@ class MarketStream:
 
     async def run(self) -> None:
         """
-        PAPER üretici: her poll_sec saniyede bir whitelist semboller için bar_closed event'i kuyruğa atar.
-        Ayrıca global endeks snapshot'ını tazeler.
+        PAPER üretici: her poll_sec saniyede bir whitelist semboller için mock fiyat üretir (on_price →
+        bar toplayıcı) ve global endeks snapshot'ını tazeler. flush_sec aralığıyla süresi dolan kovalar
+        kapatılır; böylece barlar sonraki fiyatı beklemeden TF sınırında yayınlanır.
+        bar_source="paper" iken eski davranış: her poll'da giriş TF'i için sentetik bar_closed.
         """
         poll_sec = int(self.cfg.get("paper_poll_seconds", 60))
-        ema_period = int(self.cfg.get("strategy", {}).get("params", {}).get("ema_period", 20))
+        next_poll = 0.0
 
         while True:
             try:
-                now = int(time.time())
-
-                for sym in self.whitelist:
-                    # 1) Mock adım → kapanış serisine ekle
-                    close = self._mock_step(sym, now)
-                    self._series[sym].append(close)
-                    self._last_prices[sym] = close
-
-                    # EMA hesapla (şimdilik kullanılmıyor ama ileride gerekebilir)
-                    _ = self._ema(list(self._series[sym]), ema_period)
-
-                    # 2) Basit salınım ekle → fiyatı yumuşak şekilde dalgalandır
-                    b = self._base[sym]
-                    b += random.uniform(-0.6, 0.6) + 0.3 * math.sin(now / 90.0)
-                    self._base[sym] = b
-
-                    # 3) Gerçek kapanış ile baz salınımı harmanla (test için daha gerçekçi)
-                    blended = 0.8 * close + 0.2 * b
-
-                    # 4) Event oluştur ve sıraya at
-                    event = {
-                        "type": "bar_closed",
-                        "symbol": sym,
-                        "tf": self.tf_entry,
-                        "close": float(blended),
-                        "time": now
-                    }
-                    await self._q.put(event)
-
-                # 5) Endeks snapshot güncelle
-                self._refresh_indices()
-
+                if time.time() >= next_poll:
+                    next_poll = time.time() + poll_sec
+                    self._paper_step()
+                self.bars.flush(time.time() - self.flush_grace_sec)
             except Exception as e:
                 self.logger.error(f"stream error: {e}")
 
-            await asyncio.sleep(poll_sec)
+            await asyncio.sleep(max(0.05, min(poll_sec, self.flush_sec)))
+
+    def _paper_step(self) -> None:
+        now = int(time.time())
+
+        for sym in self.whitelist:
+            # 1) Mock adım → kapanış serisine ekle (on_price bar toplayıcıyı da besler)
+            close = self._mock_step(sym, now)
+            self._series[sym].append(close)
+            self.on_price(sym, close, now)
+            if self.bar_source != "paper":
+                continue
+
+            # 2) Basit salınım ekle → fiyatı yumuşak şekilde dalgalandır
+            b = self._base[sym]
+            b += random.uniform(-0.6, 0.6) + 0.3 * math.sin(now / 90.0)
+            self._base[sym] = b
+
+            # 3) Gerçek kapanış ile baz salınımı harmanla (test için daha gerçekçi)
+            blended = 0.8 * close + 0.2 * b
+
+            # 4) Sembol EMA'sını artımlı ilerlet (yayınlanan close serisi üzerinden)
+            ema_val = self._sym_ema[sym].update(blended)
+
+            # 5) Event oluştur ve sıraya at
+            event = {
+                "type": "bar_closed",
+                "symbol": sym,
+                "tf": self.tf_entry,
+                "close": float(blended),
+                "ema20": ema_val,
+                "time": now
+            }
+            self.bus.publish(event)
+
+        # 6) Endeks snapshot güncelle (mmap yayını tazeyse DB'ye hiç gidilmez)
+        if self._read_feed() is None:
+            self._refresh_indices()
+
+    def _publish_bar(self, ev: Dict[str, Any]) -> None:
+        """Toplayıcıdan kapanan bar → veriyolu (paper kaynağında giriş TF'i sentetik event'ten gelir)."""
+        if self.bar_source == "paper" and ev.get("tf") == self.tf_entry:
+            return
+        self.bus.publish(ev)
+
+    def add_tick_listener(self, cb: Callable[[str, float, float], Any]) -> None:
+        """Her fiyat güncellemesinde senkron çağrılır; dinleyici hızlı olmalı (RAM işi)."""
+        self._tick_listeners.append(cb)
+
+    def on_price(self, symbol: str, price: float, ts: Optional[float] = None) -> None:
+        """Son fiyatı günceller ve tick dinleyicilerini tetikler (dış WS beslemesi de bunu çağırabilir)."""
+        self._last_prices[symbol] = float(price)
+        t = float(ts or time.time())
+        self.bars.on_trade(symbol, price, t)
+        if self.bus.has_subscribers("tick"):
+            self.bus.publish({"type": "tick", "symbol": symbol, "price": float(price), "time": t})
+        if not self._tick_listeners:
+            return
+        for cb in self._tick_listeners:
+            try:
+                cb(symbol, float(price), t)
+            except Exception as e:
+                self.logger.debug(f"tick listener failed for {symbol}: {e}")
+
+    def on_kline(self, symbol: str, open_time: float, o: float, h: float, l: float, c: float,
+                 v: float = 0.0) -> None:
+        """
+        Dış 1m kline beslemesi (KAPANMIŞ mum, open_time saniye). Üst TF'ler bu mumdan katlanır ve
+        sınır dakikasında hemen kapanır. Tick dinleyicileri tetiklenmez (onlar on_price ile beslenir).
+        """
+        self._last_prices[symbol] = float(c)
+        self.bars.on_kline(symbol, open_time, o, h, l, c, v)
+
+    def get_bars(self, symbol: str, tf: str, n: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Kapanmış barlar (eski → yeni); n verilirse son n bar."""
+        return self.bars.history_of(symbol, tf, n)
 
+    def bars_snapshot(self, symbol: str) -> Dict[str, Optional[Dict[str, Any]]]:
+        """{tf: son kapanmış bar} — strateji bağlamındaki ctx["bars"]."""
+        return self.bars.snapshot(symbol)
 
     async def events(self) -> AsyncGenerator[Dict[str, Any], None]:
         """
-        Üretilen event'leri (FIFO) async olarak teslim eder.
+        Strateji aboneliğindeki bar_closed event'lerini (sınırlı kuyruk, FIFO) async olarak teslim eder.
         """
-        while True:
-            ev = await self._q.get()
+        async for ev in self._strategy_sub:
             yield ev
 
     # -------------------- Yardımcı/okuyucu metotlar --------------------
 
+    def _read_feed(self) -> Optional[Dict[str, Any]]:
+        """mmap yayınından güncel endeks dict'i (yoksa/bayatsa None)."""
+        if self._feed is None:
+            return None
+        try:
+            snap = self._feed.read()
+        except Exception as e:
+            self.logger.debug(f"index feed read failed: {e}")
+            return None
+        return snap["indices"] if snap else None
+
     def indices_snapshot(self) -> Dict[str, Any]:
         """
         Global endekslerin son snapshot'ını yan etkisiz (kopya) döndürür.
+        Kolektörün mmap yayını tazeyse oradan (kilitsiz), değilse son DB snapshot'ından.
         """
+        live = self._read_feed()
+        if live is not None:
+            return dict(live)
         return dict(self._indices_cache)
 
     def get_last_price(self, symbol: str) -> Optional[float]:
@@ -4,6 +4,8 @@ from __future__ import annotations
 import asyncio, logging
 from typing import Dict, Any, List
 
+from future_trade.event_bus import idle_wait
+
 
 class OCOWatcher:
     """
@@ -19,6 +21,8 @@ class OCOWatcher:
         self.persistence = persistence
         self.logger = logger or logging.getLogger("oco_watcher")
         self.interval = max(3, int(interval_sec))
+        self._sub = None
+        self._idle_sec = float(self.interval)
 
     async def _list_open_orders(self, symbol: str) -> List[Dict[str, Any]]:
         client = getattr(self.router, "client", None)
@@ -97,6 +101,11 @@ class OCOWatcher:
                     pass
             self.logger.info(f"[OCO] TP filled/removed → SL cancelled for {symbol}")
 
+    def bind_bus(self, bus, idle_sec: float = 120.0):
+        """order_update/position_change olaylarında hemen uyan; olay yoksa idle_sec'te bir güvenlik turu."""
+        self._sub = bus.subscribe("oco_watcher", types=('order_update', 'position_change'), maxsize=256)
+        self._idle_sec = max(float(self.interval), float(idle_sec))
+
     async def run(self, stop_event: asyncio.Event = None):
         while not (stop_event and stop_event.is_set()):
             try:
@@ -110,4 +119,4 @@ class OCOWatcher:
                     await self._process_symbol(p)
             except Exception as e:
                 self.logger.error(f"OCO loop error: {e}")
-            await asyncio.sleep(self.interval)
+            await idle_wait(self._sub, self._idle_sec if self._sub is not None else self.interval)
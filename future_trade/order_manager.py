@@ -1,6 +1,7 @@
 # /opt/tradebot/future_trade/order_manager.py
 from __future__ import annotations
 from typing import Dict, Any, Optional
+import inspect
 import logging
 
 from .order_router import OrderRouter
@@ -23,9 +24,26 @@ class OrderManager:
         self.logger = logger or logging.getLogger("order_manager")
         self.kill_switch = kill_switch
         self.limits = (limits_cfg or {})
+        self.coordinator = None    # ShardLink (çok süreçli kurulumda global limit rezervasyonu)
+        self.cooldown = None       # CooldownService (giriş emri başarılı → cooldown hemen başlar)
+
+    def bind_coordinator(self, link):
+        """Shard modu: yerel kapılardan sonra global rezervasyon; emir olmazsa rezervasyon geri verilir."""
+        self.coordinator = link
+
+    def bind_cooldown(self, svc):
+        """Girişler UDS dolumunu beklemeden cooldown/frekans sayacına yazılır (servis UDS tekrarını eler)."""
+        self.cooldown = svc
 
     # ---- yardımcılar ----
+    def _index(self):
+        return getattr(self.persistence, "position_index", None)
+
     def _count_open(self):
+        idx = self._index()
+        if idx is not None:
+            snap = idx.snapshot()
+            return idx.total, {s: 1 for s in snap["symbols"]}, idx.side_count("LONG"), idx.side_count("SHORT")
         total = 0; by_sym = {}; long_n = 0; short_n = 0
         if hasattr(self.persistence, "list_open_positions"):
             for p in self.persistence.list_open_positions():
@@ -61,24 +79,76 @@ class OrderManager:
             raise RuntimeError("Kill-Switch: trading disabled")
 
         # 2) Limit kontrolleri
-        total, by_sym, long_n, short_n = self._count_open()
         max_open_positions = int(self._read_limit("max_open_positions", "max_open_trades_global", default=0) or 0)
         max_per_symbol    = int(self._read_limit("max_positions_per_symbol", "max_trades_per_symbol", default=0) or 0)
         max_longs         = int(self._read_limit("max_longs", "max_long_trades", default=0) or 0)
         max_shorts        = int(self._read_limit("max_shorts", "max_short_trades", default=0) or 0)
-
-        if max_open_positions and total >= max_open_positions:
-            raise RuntimeError("Limit: max_open_positions reached")
+        max_per_group     = int(self._read_limit("max_positions_per_group", default=0) or 0)
 
         symbol = intent["symbol"]
         side = (intent.get("side") or "").upper()
-        if max_per_symbol and by_sym.get(symbol, 0) >= max_per_symbol:
-            raise RuntimeError(f"Limit: max_positions_per_symbol reached for {symbol}")
-        if side == "BUY" and max_longs and long_n >= max_longs:
-            raise RuntimeError("Limit: max_longs reached")
-        if side == "SELL" and max_shorts and short_n >= max_shorts:
-            raise RuntimeError("Limit: max_shorts reached")
 
+        idx = self._index()
+        reserved = False
+        if idx is not None:
+            # O(1) ortak kapı (PositionSupervisor ile aynı kural); kontrol + slot ayırma await'ten önce,
+            # tek senkron adımda → eşzamanlı intent'ler aynı boş slotu paylaşamaz
+            ok, why = idx.reserve(symbol, side, max_total=max_open_positions, max_per_symbol=max_per_symbol,
+                                  max_longs=max_longs, max_shorts=max_shorts, max_per_group=max_per_group)
+            if not ok:
+                raise RuntimeError(f"Limit: {why} ({symbol})")
+            reserved = True
+        else:
+            total, by_sym, long_n, short_n = self._count_open()
+            if max_open_positions and total >= max_open_positions:
+                raise RuntimeError("Limit: max_open_positions reached")
+            if max_per_symbol and by_sym.get(symbol, 0) >= max_per_symbol:
+                raise RuntimeError(f"Limit: max_positions_per_symbol reached for {symbol}")
+            if side == "BUY" and max_longs and long_n >= max_longs:
+                raise RuntimeError("Limit: max_longs reached")
+            if side == "SELL" and max_shorts and short_n >= max_shorts:
+                raise RuntimeError("Limit: max_shorts reached")
+
+        try:
+            res = await self._open_entry_global(intent, symbol, side)
+        except Exception:
+            if reserved:
+                idx.release(symbol)
+            raise
+        if reserved:
+            if res is None:
+                idx.release(symbol)
+            else:
+                idx.confirm(symbol)
+        if res is not None and self.cooldown is not None:
+            try:
+                oid = res.get("orderId") if isinstance(res, dict) else None
+                coid = res.get("clientOrderId") if isinstance(res, dict) else None
+                self.cooldown.record_local_entry(symbol, order_id=oid, client_id=coid)
+            except Exception as e:
+                self.logger.debug(f"[ENTRY] cooldown record failed for {symbol}: {e}")
+        return res
+
+    async def _open_entry_global(self, intent: Dict[str, Any], symbol: str, side: str) -> Optional[Dict[str, Any]]:
+        """Shard modunda global limitleri koordinatörden rezerve eder; tek süreçte doğrudan _open_entry."""
+        if self.coordinator is None:
+            return await self._open_entry(intent, symbol, side)
+
+        # 2.1) Global limitler (shard koordinatörü)
+        ok, why = await self.coordinator.reserve(symbol, side)
+        if not ok:
+            raise RuntimeError(f"Limit: {why} ({symbol})")
+        try:
+            res = await self._open_entry(intent, symbol, side)
+        except Exception:
+            await self.coordinator.release(symbol)
+            raise
+        if res is None:
+            await self.coordinator.release(symbol)
+        return res
+
+    async def _open_entry(self, intent: Dict[str, Any], symbol: str, side: str) -> Optional[Dict[str, Any]]:
+        """Kapılardan geçmiş intent için miktar, margin guard, emir ve cache yazımı."""
         # 3) Emir parametreleri
         order_type = intent.get("order_type") or ("MARKET" if "price" not in intent else "LIMIT")
         price = intent.get("price")
@@ -152,8 +222,11 @@ class OrderManager:
                 self.logger.warning(f"[MG] guard failed (soft-allow): {e}")
                 # guard çökerse emri engellemeyelim; loglamak yeterli
 
-        # 7) Emir gönderimi
-        res = self.router.place_order(
+        # 7) Emir gönderimi (event loop içindeyiz → async yol; sync place_order yalnız loop dışı içindir)
+        place = getattr(self.router, "place_order_async", None)
+        if place is None:
+            place = self.router.place_order
+        res = place(
             symbol=symbol,
             side=side,
             qty=qty,
@@ -162,6 +235,8 @@ class OrderManager:
             reduce_only=False,
             tag="entry"
         )
+        if inspect.isawaitable(res):
+            res = await res
 
         # 8) ENTRY sonrası pozisyonu cache'e yaz
         pos_side = "LONG" if side == "BUY" else "SHORT"
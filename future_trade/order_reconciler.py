@@ -4,8 +4,11 @@ from __future__ import annotations
 
 import asyncio
 import logging
+import time
 from typing import Optional, Dict, Any, List
 
+from future_trade.exchange_utils import fmt_decimal
+
 # Eski: from .order_router import OrderRouter, Mode
 # Yeni: Mode yok; yalnızca OrderRouter kullanıyoruz
 from .order_router import OrderRouter
@@ -19,10 +22,20 @@ class OrderReconciler:
       - ileride: fill/partial fill/stop tetikleriyle eşleştirme (genişletilebilir)
     """
 
+    BATCH_PLACE_MAX = 5
+
     def __init__(self, router: OrderRouter, logger: Optional[logging.Logger] = None, persistence=None):
         self.router = router
         self.logger = logger or logging.getLogger("reconciler")
         self.persistence = persistence
+        self._bus = None
+        fl = (getattr(router, "cfg", {}) or {}).get("emergency_flatten", {}) or {}
+        self.flatten_attempts = max(1, int(fl.get("max_attempts", 3)))
+        self.flatten_verify_sec = float(fl.get("verify_timeout_sec", 2.0))
+
+    def bind_bus(self, bus):
+        """Acil kapatmada dolumları UDS position_change olaylarından doğrulamak için."""
+        self._bus = bus
 
     # ------- yardımcılar -------
     def _is_paper(self) -> bool:
@@ -69,6 +82,166 @@ class OrderReconciler:
                 results["errors"].append({"position": p, "error": str(e)})
         return results
 
+    # ------- acil kapatma (Kill-Switch) -------
+    async def _acall(self, name: str, *args, **kwargs):
+        fn = getattr(getattr(self.router, "client", None), name, None)
+        if not callable(fn):
+            raise AttributeError(f"client.{name} not available")
+        res = fn(*args, **kwargs)
+        return await res if asyncio.iscoroutine(res) else res
+
+    def _qty_str(self, symbol: str, qty: float) -> str:
+        norm = getattr(self.router, "normalizer", None)
+        fn = getattr(norm, "qty_str", None)
+        if callable(fn):
+            try:
+                return fn(symbol, qty)
+            except Exception:
+                pass
+        return fmt_decimal(qty)
+
+    async def _flatten_snapshot(self) -> tuple[Dict[str, Dict[str, Any]], str]:
+        """
+        Açık pozisyonlar: önce borsa (positionRisk, hesap geneli tek çağrı), olmazsa yerel DB.
+        Dönüş: ({symbol: {"side_close","qty"(str)}}, "exchange"|"db")
+        """
+        try:
+            rows = await self._acall("position_risk")
+            if rows:
+                out = {}
+                for r in rows:
+                    amt = str(r.get("positionAmt") or "0")
+                    if float(amt) != 0.0:
+                        out[r["symbol"]] = {"side_close": "SELL" if float(amt) > 0 else "BUY",
+                                            "qty": amt.lstrip("-")}
+                return out, "exchange"
+        except Exception as e:
+            self.logger.debug(f"[FLATTEN] positionRisk failed, using DB: {e}")
+        out = {}
+        for p in self._list_open_positions():
+            sym = p.get("symbol")
+            side_pos = (p.get("side") or "").upper()
+            qty = abs(float(p.get("qty", 0) or 0))
+            if sym and qty > 0 and side_pos in ("LONG", "SHORT"):
+                out[sym] = {"side_close": "SELL" if side_pos == "LONG" else "BUY",
+                            "qty": self._qty_str(sym, qty)}
+        return out, "db"
+
+    async def _cancel_all(self, symbols: set) -> int:
+        async def one(sym):
+            try:
+                await self._acall("cancel_all_open_orders", sym)
+                return 1
+            except Exception as e:
+                self.logger.warning(f"[FLATTEN] cancel-all failed {sym}: {e}")
+                return 0
+        return sum(await asyncio.gather(*(one(s) for s in sorted(symbols))))
+
+    async def _submit_closes(self, pending: Dict[str, Dict[str, Any]]) -> set:
+        """reduceOnly MARKET kapanışları 5'li batch'lerle EŞZAMANLI gönderir; kabul edilen semboller döner."""
+        orders = [{"symbol": sym, "side": p["side_close"], "type": "MARKET", "quantity": p["qty"],
+                   "reduceOnly": "true", "newClientOrderId": f"ks-{sym[:12]}-{int(time.time() * 1000) % 10**9}"}
+                  for sym, p in pending.items()]
+        chunks = [orders[i:i + self.BATCH_PLACE_MAX] for i in range(0, len(orders), self.BATCH_PLACE_MAX)]
+
+        async def one(chunk):
+            accepted = set()
+            try:
+                res = await self._acall("place_batch_orders", chunk)
+                for o, r in zip(chunk, res or []):
+                    if isinstance(r, dict) and r.get("code") not in (None, 200):
+                        self.logger.warning(f"[FLATTEN] close rejected {o['symbol']}: {r.get('msg')}")
+                    else:
+                        accepted.add(o["symbol"])
+                return accepted
+            except AttributeError:
+                pass
+            except Exception as e:
+                self.logger.warning(f"[FLATTEN] batch close failed, sending singles: {e}")
+            singles = await asyncio.gather(*(self._acall("place_order", **o) for o in chunk), return_exceptions=True)
+            for o, r in zip(chunk, singles):
+                if isinstance(r, Exception):
+                    self.logger.warning(f"[FLATTEN] close failed {o['symbol']}: {r}")
+                else:
+                    accepted.add(o["symbol"])
+            return accepted
+
+        out = set()
+        for acc in await asyncio.gather(*(one(c) for c in chunks)):
+            out |= acc
+        return out
+
+    async def _await_flat(self, sub, symbols: set, timeout: float) -> set:
+        """UDS position_change (qty=0) olaylarını timeout'a dek bekler; düzleşen semboller döner."""
+        flat = set()
+        if sub is None or not symbols:
+            return flat
+        deadline = time.monotonic() + timeout
+        while flat != symbols:
+            left = deadline - time.monotonic()
+            if left <= 0:
+                break
+            for ev in await sub.wait(timeout=left):
+                if ev.get("symbol") in symbols and float(ev.get("qty") or 0.0) == 0.0:
+                    flat.add(ev["symbol"])
+        return flat
+
+    async def emergency_flatten(self, reason: str = "kill_switch") -> Dict[str, Any]:
+        """
+        Acil düzleştirme:
+          1) pozisyon snapshot'ı (hesap geneli tek positionRisk) + açık emir snapshot'ı,
+          2) sembol başına allOpenOrders iptali ve reduceOnly MARKET kapanışlar EŞZAMANLI,
+          3) dolumlar UDS position_change ile doğrulanır; kalanlar yeniden snapshot'la tekrar denenir.
+        Dönüş: {"closed","remaining","attempts","cancelled_symbols","source","time_to_flat_ms"}
+        """
+        t0 = time.monotonic()
+        sub = self._bus.subscribe("flatten", types=("position_change",), maxsize=1024) if self._bus else None
+        closed: set = set()
+        attempts = 0
+        cancelled = 0
+        try:
+            pending, source = await self._flatten_snapshot()
+            try:
+                orders = await self._acall("list_open_orders")
+                order_syms = {o.get("symbol") for o in orders or [] if o.get("symbol")}
+            except Exception:
+                order_syms = set()
+
+            cancel_task = asyncio.create_task(self._cancel_all(order_syms | set(pending)))
+            while pending and attempts < self.flatten_attempts:
+                attempts += 1
+                accepted = await self._submit_closes(pending)
+                if source == "db":
+                    # borsa snapshot'ı yok (paper vb.) → kabul edilen kapanış düzleşmiş sayılır
+                    done = accepted
+                else:
+                    done = await self._await_flat(sub, accepted, self.flatten_verify_sec)
+                    if done != set(pending):
+                        fresh, _ = await self._flatten_snapshot()
+                        done |= {s for s in pending if s not in fresh}
+                        # kalanlar güncel miktarla (kısmi dolum) yeniden denenir
+                        pending = {s: fresh[s] for s in pending if s in fresh}
+                closed |= done
+                pending = {s: p for s, p in pending.items() if s not in done}
+            cancelled = await cancel_task
+        finally:
+            if sub is not None:
+                sub.close()
+
+        for sym in closed:
+            if hasattr(self.persistence, "cache_close_position"):
+                try:
+                    self.persistence.cache_close_position(sym)
+                except Exception:
+                    pass
+
+        ttf = (time.monotonic() - t0) * 1000.0
+        result = {"closed": len(closed), "remaining": sorted(pending), "attempts": attempts,
+                  "cancelled_symbols": cancelled, "source": source, "time_to_flat_ms": round(ttf, 1)}
+        log = self.logger.error if pending else self.logger.warning
+        log(f"[FLATTEN] {reason}: {result}")
+        return result
+
     # ------- ana döngü -------
     async def run(self) -> None:
         """
@@ -2,9 +2,11 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 
-import time, logging, uuid, asyncio
+import time, logging, uuid, asyncio, inspect
 from typing import Optional, Dict, Any, List
 
+from future_trade.exchange_utils import fmt_decimal
+
 
 class OrderRouter:
     """
@@ -77,6 +79,16 @@ class OrderRouter:
         base = (tag or "ORD").upper()[:8]
         return f"{base}-{int(time.time()*1000)%10_000_000:07d}-{uuid.uuid4().hex[:6].upper()}"
 
+    def _qty_s(self, symbol: str, qty: float) -> str:
+        """API için kesin quantity string'i (step'e tamsayı aritmetiğiyle oturtulmuş)."""
+        fn = getattr(self.normalizer, "qty_str", None)
+        return fn(symbol, qty) if callable(fn) else fmt_decimal(qty)
+
+    def _px_s(self, symbol: str, price: float) -> str:
+        """API için kesin price/stopPrice string'i (tick'e tamsayı aritmetiğiyle oturtulmuş)."""
+        fn = getattr(self.normalizer, "price_str", None)
+        return fn(symbol, price) if callable(fn) else fmt_decimal(price)
+
     def _last_price(self, symbol: str) -> Optional[float]:
         fn = self._trail_ctx.get("get_last_price") if hasattr(self, "_trail_ctx") else None
         if callable(fn):
@@ -91,12 +103,12 @@ class OrderRouter:
     def _parse_err(exc: Exception) -> Dict[str, Any]:
         """
         Binance hata iletilerinde geçen olası kodları ayıklar.
-        Sık görülür: -1013(precision), -4003(minNotional), -2010(immediately trigger),
+        Sık görülür: -1111(precision), -1013(lot/tick), -4003(minNotional), -2010(immediately trigger),
                      -2022(reduceOnly reject), -4164(reduceOnly), -2011(cancel nosuch), -2021(reject)
         """
         s = str(exc)
         code = None
-        for tok in ("-1013", "-4003", "-2010", "-2022", "-4164", "-2011", "-2021"):
+        for tok in ("-1111", "-1013", "-4003", "-2010", "-2022", "-4164", "-2011", "-2021"):
             if tok in s:
                 try:
                     code = int(tok)
@@ -121,7 +133,7 @@ class OrderRouter:
         """
         Sadece güvenli senaryolarda ayar yapar, aksi halde no_retry=True döner.
 
-        - -1013 precision/lot/tick: normalizer ile tekrar düzelt
+        - -1111/-1013 precision/lot/tick: normalizer ile tekrar düzelt
         - -4003 MIN_NOTIONAL: (reduceOnly=False ise) qty'yi minNotional için yükselt
         - -2010 would immediately trigger: STOP* emirlerde stopPrice'ı 1 tick uzağa kaydır
         - -2022 / -4164 reduceOnly reddi: pozisyon miktarına göre kırp
@@ -132,9 +144,9 @@ class OrderRouter:
         no_retry = False
 
         # 1) precision/step/tick
-        if code == -1013 or "precision" in msg or "lot size" in msg or "tick size" in msg:
+        if code in (-1111, -1013) or "precision" in msg or "lot size" in msg or "tick size" in msg:
             if self.normalizer:
-                self.logger.info(f"[RETRY] normalize by -1013 for {symbol}")
+                self.logger.info(f"[RETRY] normalize by {code} for {symbol}")
                 norm = self.normalizer.normalize_order(symbol, side, qty, price, order_type, reduce_only)
                 n_price = norm["price"] if price is not None else None
                 n_qty = norm["qty"]
@@ -159,8 +171,12 @@ class OrderRouter:
                 if self.normalizer and n_price is not None:
                     tick = self.normalizer.steps(symbol)["tick"]
                     if tick > 0:
-                        delta = tick
-                        n_price = (n_price + delta) if side.upper() == "BUY" else max(0.0, n_price - delta)
+                        shift = getattr(self.normalizer, "shift_ticks", None)
+                        n = 1 if side.upper() == "BUY" else -1
+                        if callable(shift):
+                            n_price = max(0.0, shift(symbol, n_price, n))
+                        else:
+                            n_price = max(0.0, n_price + n * tick)
                         self.logger.info(f"[RETRY] move stopPrice by +1 tick for {symbol}")
                     else:
                         no_retry = True
@@ -192,27 +208,25 @@ class OrderRouter:
     # -------------------------------------------------------------------------
     # Ana: Emir Aç (tek retry politikası ile)
     # -------------------------------------------------------------------------
-    def place_order(
+    def _build_order(
         self,
         symbol: str,
         side: str,
         qty: float,
-        price: float = None,
-        order_type: str = "MARKET",
-        reduce_only: bool = False,
-        tag: str = "entry",
-        time_in_force: str = None,
-        stop_price: float = None,
-    ) -> Dict[str, Any]:
+        price: float,
+        order_type: str,
+        reduce_only: bool,
+        tag: str,
+        time_in_force: str,
+        stop_price: float,
+        callback_rate: float,
+        activation_price: float,
+        client_order_id: str,
+    ) -> tuple:
         """
-        Son kapı:
-          - normalizasyon (tick/step/minNotional)
-          - payload hazırlama
-          - Binance çağrısı
-          - hata halinde güvenli düzeltme + tek retry
+        Normalizasyon + payload (place_order / place_order_async ortak).
+        Dönüş: (payload, qty_n, price_n)
         """
-        side = side.upper()
-        order_type = (order_type or "MARKET").upper()
         tif = time_in_force or (self.cfg.get("order", {}) or {}).get("time_in_force", "GTC")
 
         # 1) Ön normalizasyon
@@ -235,12 +249,12 @@ class OrderRouter:
             raise ValueError("Normalized quantity is zero or invalid")
 
         # 2) Payload
-        client_oid = self._coid(tag)
+        client_oid = client_order_id or self._coid(tag)   # çağıran kimliği önceden bilmek isteyebilir
         payload = {
             "symbol": symbol,
             "side": side,
             "type": order_type,
-            "quantity": float(f"{qty_n:.10f}"),
+            "quantity": self._qty_s(symbol, qty_n),
             "reduceOnly": bool(reduce_only),
             "timeInForce": tif,
             "newClientOrderId": client_oid,
@@ -248,7 +262,7 @@ class OrderRouter:
         if price is not None:
             if price_n is None:
                 raise ValueError("Non-market order requires normalized price")
-            payload["price"] = float(f"{price_n:.10f}")
+            payload["price"] = self._px_s(symbol, price_n)
 
         if order_type in ("STOP", "STOP_MARKET", "STOP_LIMIT", "TAKE_PROFIT", "TAKE_PROFIT_MARKET", "TAKE_PROFIT_LIMIT"):
             sp = stop_price if stop_price is not None else price_n
@@ -256,13 +270,99 @@ class OrderRouter:
                 sp = last_px  # MARKET + stop_price gelmediyse son fiyat
             if sp is None:
                 raise ValueError("stop order requires stopPrice")
-            payload["stopPrice"] = float(f"{sp:.10f}")
+            payload["stopPrice"] = self._px_s(symbol, sp)
             working_type = (self.cfg.get("order", {}) or {}).get("sl_working_type", "MARK_PRICE")
             payload["workingType"] = working_type
 
+        if order_type == "TRAILING_STOP_MARKET":
+            # Binance: callbackRate 0.1–5 (%0.1 adım); activationPrice yoksa hemen aktif
+            if callback_rate is None:
+                raise ValueError("TRAILING_STOP_MARKET requires callbackRate")
+            cb = round(min(5.0, max(0.1, float(callback_rate))), 1)
+            payload["callbackRate"] = fmt_decimal(cb)
+            if activation_price is not None and activation_price > 0:
+                payload["activationPrice"] = self._px_s(symbol, activation_price)
+            payload["workingType"] = (self.cfg.get("order", {}) or {}).get("sl_working_type", "MARK_PRICE")
+
         if order_type in ("LIMIT", "STOP_LIMIT", "TAKE_PROFIT_LIMIT"):
             payload["timeInForce"] = tif
 
+        return payload, qty_n, price_n
+
+    def _retry_payload(
+        self,
+        payload: Dict[str, Any],
+        exc: Exception,
+        symbol: str,
+        side: str,
+        qty_n: float,
+        price_n: Optional[float],
+        price: Optional[float],
+        order_type: str,
+        reduce_only: bool,
+        tag: str,
+    ) -> Optional[Dict[str, Any]]:
+        """İlk hata sonrası güvenli düzeltilmiş payload; düzeltme yoksa None (çağıran yeniden raise eder)."""
+        err = self._parse_err(exc)
+        self.logger.warning(
+            f"[ORDER-ERR-1] {symbol} {side} {order_type} qty={qty_n} price={price_n} reduceOnly={reduce_only} : {err}"
+        )
+
+        adj = self._adjust_on_error(symbol, side, qty_n, price_n, order_type, reduce_only, err)
+        if adj.get("no_retry", False):
+            return None
+
+        price2 = adj["price"]
+        qty2 = adj["qty"]
+        if qty2 is None or qty2 <= 0:
+            return None
+
+        payload2 = dict(payload)
+        payload2["quantity"] = self._qty_s(symbol, qty2)
+        if price is not None:
+            if price2 is None:
+                return None
+            payload2["price"] = self._px_s(symbol, price2)
+        # stopPrice ayarlaması gerekebilir
+        if "stopPrice" in payload2 and order_type in (
+            "STOP", "STOP_MARKET", "STOP_LIMIT", "TAKE_PROFIT", "TAKE_PROFIT_MARKET", "TAKE_PROFIT_LIMIT"
+        ):
+            if price is not None and price2 is not None:
+                payload2["stopPrice"] = self._px_s(symbol, price2)
+
+        payload2["newClientOrderId"] = self._coid(f"{tag}-R")
+        self.logger.info(f"[ORDER-RETRY] {symbol} {side} {order_type} qty={qty2} price={price2}")
+        return payload2
+
+    def place_order(
+        self,
+        symbol: str,
+        side: str,
+        qty: float,
+        price: float = None,
+        order_type: str = "MARKET",
+        reduce_only: bool = False,
+        tag: str = "entry",
+        time_in_force: str = None,
+        stop_price: float = None,
+        callback_rate: float = None,
+        activation_price: float = None,
+        client_order_id: str = None,
+    ) -> Dict[str, Any]:
+        """
+        Son kapı (senkron; çalışan event loop DIŞINDAN çağrılmalı — loop içinde place_order_async):
+          - normalizasyon (tick/step/minNotional)
+          - payload hazırlama
+          - Binance çağrısı
+          - hata halinde güvenli düzeltme + tek retry
+        """
+        side = side.upper()
+        order_type = (order_type or "MARKET").upper()
+        payload, qty_n, price_n = self._build_order(
+            symbol, side, qty, price, order_type, reduce_only, tag, time_in_force,
+            stop_price, callback_rate, activation_price, client_order_id,
+        )
+
         # 3) Çağrı (tek retry’lı)
         def _maybe_await(res):
             # client.new_order async olabilir; sync wrapper
@@ -283,46 +383,156 @@ class OrderRouter:
             res = _call(payload)
             return res
         except Exception as e:
-            err = self._parse_err(e)
-            self.logger.warning(
-                f"[ORDER-ERR-1] {symbol} {side} {order_type} qty={qty_n} price={price_n} reduceOnly={reduce_only} : {err}"
-            )
-
-            adj = self._adjust_on_error(symbol, side, qty_n, price_n, order_type, reduce_only, err)
-            if adj.get("no_retry", False):
+            payload2 = self._retry_payload(payload, e, symbol, side, qty_n, price_n, price,
+                                           order_type, reduce_only, tag)
+            if payload2 is None:
                 raise
-
-            price2 = adj["price"]
-            qty2 = adj["qty"]
-            if qty2 is None or qty2 <= 0:
-                raise
-
-            payload2 = dict(payload)
-            payload2["quantity"] = float(f"{qty2:.10f}")
-            if price is not None:
-                if price2 is None:
-                    raise
-                payload2["price"] = float(f"{price2:.10f}")
-            # stopPrice ayarlaması gerekebilir
-            if "stopPrice" in payload2 and order_type in (
-                "STOP", "STOP_MARKET", "STOP_LIMIT", "TAKE_PROFIT", "TAKE_PROFIT_MARKET", "TAKE_PROFIT_LIMIT"
-            ):
-                if price is not None and price2 is not None:
-                    payload2["stopPrice"] = float(f"{price2:.10f}")
-
-            payload2["newClientOrderId"] = self._coid(f"{tag}-R")
-
             try:
-                self.logger.info(f"[ORDER-RETRY] {symbol} {side} {order_type} qty={qty2} price={price2}")
                 res2 = _call(payload2)
                 return res2
             except Exception as e2:
                 err2 = self._parse_err(e2)
                 self.logger.error(
-                    f"[ORDER-ERR-2] {symbol} {side} {order_type} qty={qty2} price={price2} : {err2}"
+                    f"[ORDER-ERR-2] {symbol} {side} {order_type} qty={payload2['quantity']} : {err2}"
                 )
                 raise
 
+    @staticmethod
+    async def _acall(fn, **kwargs):
+        ret = fn(**kwargs)
+        if inspect.isawaitable(ret):
+            ret = await ret
+        return ret
+
+    async def place_order_async(
+        self,
+        symbol: str,
+        side: str,
+        qty: float,
+        price: float = None,
+        order_type: str = "MARKET",
+        reduce_only: bool = False,
+        tag: str = "entry",
+        time_in_force: str = None,
+        stop_price: float = None,
+        callback_rate: float = None,
+        activation_price: float = None,
+        client_order_id: str = None,
+    ) -> Dict[str, Any]:
+        """place_order'ın event loop içi karşılığı: client.place_order await edilir (aynı retry politikası)."""
+        side = side.upper()
+        order_type = (order_type or "MARKET").upper()
+        payload, qty_n, price_n = self._build_order(
+            symbol, side, qty, price, order_type, reduce_only, tag, time_in_force,
+            stop_price, callback_rate, activation_price, client_order_id,
+        )
+        send = getattr(self.client, "place_order", None) or self.client.new_order
+        try:
+            return await self._acall(send, **payload)
+        except Exception as e:
+            payload2 = self._retry_payload(payload, e, symbol, side, qty_n, price_n, price,
+                                           order_type, reduce_only, tag)
+            if payload2 is None:
+                raise
+            try:
+                return await self._acall(send, **payload2)
+            except Exception as e2:
+                self.logger.error(
+                    f"[ORDER-ERR-2] {symbol} {side} {order_type} qty={payload2['quantity']} : {self._parse_err(e2)}"
+                )
+                raise
+
+    # -------------------------------------------------------------------------
+    # Koruyucu emir güncelleme: amend (PUT) → yoksa önce-yeni-sonra-iptal
+    # -------------------------------------------------------------------------
+    AMENDABLE_TYPES = ("LIMIT",)   # Binance PUT /fapi/v1/order yalnız LIMIT destekler
+
+    async def replace_order(
+        self,
+        symbol: str,
+        side: str,
+        qty: float,
+        order_type: str,
+        price: float = None,
+        stop_price: float = None,
+        old_order_id=None,
+        old_client_order_id: str = None,
+        reduce_only: bool = True,
+        tag: str = "RPL",
+    ) -> Dict[str, Any]:
+        """
+        Değiştirilemeyen tipler (STOP_MARKET, TAKE_PROFIT_MARKET ...) için: ÖNCE yeni emir, SONRA eski iptal.
+        Arada korumasız pencere yoktur; iptal başarısız olursa yalnız uyarı (sweeper yetimi temizler).
+        """
+        res = await self.place_order_async(
+            symbol=symbol, side=side, qty=qty, price=price, order_type=order_type,
+            reduce_only=reduce_only, tag=tag, stop_price=stop_price,
+        )
+        if old_order_id or old_client_order_id:
+            try:
+                await self.cancel_order_async(symbol=symbol, order_id=old_order_id, client_order_id=old_client_order_id)
+            except Exception as e:
+                self.logger.warning(f"[REPLACE] cancel old failed for {symbol} ({old_order_id}/{old_client_order_id}): {e}")
+        if isinstance(res, dict):
+            res.setdefault("_update_mode", "replace")
+        return res
+
+    async def amend_or_replace(
+        self,
+        symbol: str,
+        side: str,
+        qty: float,
+        order_type: str,
+        price: float = None,
+        stop_price: float = None,
+        order_id=None,
+        client_order_id: str = None,
+        reduce_only: bool = True,
+        tag: str = "AMD",
+    ) -> Dict[str, Any]:
+        """
+        Mevcut koruyucu emri tek istekle güncelle:
+          - LIMIT ve kimlik biliniyorsa: PUT /fapi/v1/order (orderId/clientOrderId korunur)
+          - aksi halde / amend reddedilirse: replace_order (önce yeni, sonra iptal)
+          - eski kimlik yoksa: düz yeni emir
+        Dönüşte "_update_mode": "amend" | "replace" | "new".
+        """
+        order_type = (order_type or "").upper()
+        side = side.upper()
+        modify = getattr(self.client, "modify_order", None)
+        if (order_type in self.AMENDABLE_TYPES and price is not None and (order_id or client_order_id)
+                and callable(modify)):
+            try:
+                qty_n, price_n = qty, price
+                if self.normalizer:
+                    norm = self.normalizer.normalize_order(symbol, side, qty, price, order_type, reduce_only)
+                    qty_n, price_n = norm["qty"], norm["price"]
+                kwargs = {"symbol": symbol, "side": side,
+                          "quantity": self._qty_s(symbol, qty_n), "price": self._px_s(symbol, price_n)}
+                if order_id:
+                    kwargs["orderId"] = int(order_id)
+                if client_order_id:
+                    kwargs["origClientOrderId"] = str(client_order_id)
+                res = await self._acall(modify, **kwargs)
+                if isinstance(res, dict):
+                    res.setdefault("orderId", order_id)
+                    res.setdefault("clientOrderId", client_order_id)
+                    res["_update_mode"] = "amend"
+                self.logger.info(f"[AMEND] {symbol} {side} {order_type} qty={qty_n} price={price_n}")
+                return res
+            except Exception as e:
+                self.logger.warning(f"[AMEND] {symbol} amend rejected, falling back to replace: {self._parse_err(e)}")
+
+        if not (order_id or client_order_id):
+            res = await self.place_order_async(symbol=symbol, side=side, qty=qty, price=price, order_type=order_type,
+                                               reduce_only=reduce_only, tag=tag, stop_price=stop_price)
+            if isinstance(res, dict):
+                res.setdefault("_update_mode", "new")
+            return res
+        return await self.replace_order(symbol, side, qty, order_type, price=price, stop_price=stop_price,
+                                        old_order_id=order_id, old_client_order_id=client_order_id,
+                                        reduce_only=reduce_only, tag=tag)
+
     # -------------------------------------------------------------------------
     # Kapanış: reduceOnly MARKET
     # -------------------------------------------------------------------------
@@ -352,7 +562,7 @@ class OrderRouter:
             "symbol": symbol,
             "side": side,
             "type": "MARKET",
-            "quantity": float(f"{qty_n:.10f}"),
+            "quantity": self._qty_s(symbol, qty_n),
             "reduceOnly": True,
             "newClientOrderId": self._coid(tag),
         }
@@ -400,10 +610,23 @@ class OrderRouter:
             self.logger.error(f"[CANCEL-ERR] {symbol} {kwargs} : {err}")
             raise
 
+    async def cancel_order_async(self, symbol: str, order_id: int = None, client_order_id: str = None) -> Dict[str, Any]:
+        """cancel_order'ın event loop içi karşılığı (client.cancel_order await edilir)."""
+        kwargs = {"symbol": symbol}
+        if order_id is not None:
+            kwargs["orderId"] = int(order_id)
+        if client_order_id:
+            kwargs["origClientOrderId"] = str(client_order_id)
+        try:
+            return await self._acall(self.client.cancel_order, **kwargs)
+        except Exception as e:
+            self.logger.error(f"[CANCEL-ERR] {symbol} {kwargs} : {self._parse_err(e)}")
+            raise
+
     # -------------------------------------------------------------------------
     # Trailing SL güncelleme (ATR varsa ATR, yoksa step_pct)
     # -------------------------------------------------------------------------
-    def update_trailing_for_open_positions(self) -> None:
+    async def update_trailing_for_open_positions(self) -> None:
         """
         Açık pozisyonlar için yeni stop seviyesini hesaplar ve upsert fonksiyonunu çağırır.
         - LONG: stop = last - atr_mult*ATR   (fallback: last*(1 - step_pct/100))
@@ -465,6 +688,8 @@ class OrderRouter:
 
                 # Stop upsert çağrısı (reduceOnly STOP_MARKET)
                 stop_side = "SELL" if side_pos == "LONG" else "BUY"
-                upsert(sym, stop_side, float(new_stop))
+                ret = upsert(sym, stop_side, float(new_stop))
+                if inspect.isawaitable(ret):
+                    await ret
             except Exception as e:
                 self.logger.debug(f"[TRAIL] update error for {p}: {e}")
@@ -7,6 +7,7 @@ SQLite kalıcılık (futures_data.db)
 """
 from __future__ import annotations
 
+import asyncio
 import json
 import logging
 import sqlite3
@@ -109,6 +110,92 @@ SCHEMA = [
 ]
 
 
+class SymbolStateStore:
+    """
+    symbol_state tablosunun bellek içi kopyası.
+    - Açılışta tüm satırlar TEK sorguyla yüklenir (load).
+    - Okumalar sözlük erişimidir; yazmalar belleğe işlenip "kirli" işaretlenir.
+    - flush() kirli satırları tek bağlantı + executemany ile yazar; run() bunu flush_sec'te bir yapar.
+    """
+
+    FIELDS = ("state", "cooldown_until_ts", "last_signal_ts", "last_exit_ts", "trail_stop", "peak", "trough")
+
+    def __init__(self, persistence: "Persistence", flush_sec: float = 2.0, logger: Optional[logging.Logger] = None):
+        self.db = persistence
+        self.flush_sec = max(0.2, float(flush_sec))
+        self.logger = logger or logging.getLogger("db.state")
+        self._rows: Dict[str, Dict[str, Any]] = {}
+        self._dirty: set = set()
+
+    def load(self) -> int:
+        with self.db._conn() as c:
+            cur = c.execute(f"SELECT symbol, {', '.join(self.FIELDS)} FROM symbol_state")
+            self._rows = {r["symbol"]: {f: r[f] for f in self.FIELDS} for r in cur.fetchall()}
+        self._dirty.clear()
+        return len(self._rows)
+
+    def get(self, symbol: str) -> Dict[str, Any]:
+        """Canlı satır (kopya değil); yoksa boş dict."""
+        return self._rows.get(symbol) or {}
+
+    def value(self, symbol: str, field: str, default: Any = None) -> Any:
+        row = self._rows.get(symbol)
+        v = row.get(field) if row else None
+        return default if v is None else v
+
+    def update(self, symbol: str, **fields: Any) -> None:
+        row = self._rows.get(symbol)
+        if row is None:
+            row = self._rows[symbol] = {f: None for f in self.FIELDS}
+        for k, v in fields.items():
+            if k in self.FIELDS:
+                row[k] = v
+        self._dirty.add(symbol)
+
+    def clear_expired_cooldowns(self, now_epoch: int) -> int:
+        n = 0
+        for sym, row in self._rows.items():
+            cd = row.get("cooldown_until_ts") or 0
+            if 0 < cd < now_epoch:
+                row["cooldown_until_ts"] = 0
+                self._dirty.add(sym)
+                n += 1
+        return n
+
+    def flush(self) -> int:
+        if not self._dirty:
+            return 0
+        syms, self._dirty = self._dirty, set()
+        now = now_ts()
+        rows = [(sym, *(self._rows[sym].get(f) for f in self.FIELDS), now) for sym in syms if sym in self._rows]
+        cols = ", ".join(self.FIELDS)
+        sets = ", ".join(f"{f}=excluded.{f}" for f in self.FIELDS)
+        try:
+            with self.db._conn() as c:
+                c.executemany(
+                    f"""
+                    INSERT INTO symbol_state(symbol, {cols}, updated_at)
+                    VALUES({", ".join("?" * (len(self.FIELDS) + 2))})
+                    ON CONFLICT(symbol) DO UPDATE SET {sets}, updated_at=excluded.updated_at
+                    """,
+                    rows,
+                )
+                c.commit()
+        except Exception as e:
+            self._dirty |= syms  # bir sonraki turda tekrar dene
+            self.logger.warning(f"symbol_state flush failed: {e}")
+            return 0
+        return len(rows)
+
+    async def run(self, stop_event=None):
+        try:
+            while not (stop_event and stop_event.is_set()):
+                await asyncio.sleep(self.flush_sec)
+                self.flush()
+        finally:
+            self.flush()
+
+
 class Persistence:
     def __init__(self, path: str, router: Optional["OrderRouter"], logger: logging.Logger):
         self.path = path
@@ -116,6 +203,34 @@ class Persistence:
         self.logger = logger or logging.getLogger("db")
         # RAM cache (opsiyonel kullanım için hazır dursun)
         self._open_positions_cache: List[Dict[str, Any]] = []
+        self.state_store: Optional[SymbolStateStore] = None
+        self.position_index = None  # PositionIndex (opsiyonel; positions_cache yazımlarıyla güncellenir)
+        self.equity_tracker = None  # EquityTracker (yalnız paper: ACCOUNT_UPDATE yerine cache yazımları)
+
+    def attach_position_index(self, index) -> int:
+        """İndeksi positions_cache'ten kur ve bundan sonraki açılış/kapanışlarda güncel tut."""
+        self.position_index = index
+        return index.load(self.list_open_positions())
+
+    def attach_equity_tracker(self, tracker) -> None:
+        """Paper modu: positions_cache açılış/güncelleme/kapanışları tracker.on_cache_position'a iletilir."""
+        self.equity_tracker = tracker
+
+    def _notify_equity(self, symbol: str, side: str, qty: float, entry: float) -> None:
+        t = self.equity_tracker
+        if t is None:
+            return
+        try:
+            t.on_cache_position(symbol, side, qty, entry)
+        except Exception as e:
+            self.logger.debug(f"[PERSISTENCE] equity hook error {symbol}: {e}")
+
+    def enable_state_store(self, flush_sec: float = 2.0) -> SymbolStateStore:
+        """symbol_state'i belleğe al; bundan sonra state okuma/yazmaları store üzerinden gider."""
+        st = SymbolStateStore(self, flush_sec=flush_sec, logger=logging.getLogger("db.state"))
+        st.load()
+        self.state_store = st
+        return st
 
     # --------------------------- Connection helper ---------------------------
     def _conn(self) -> sqlite3.Connection:
@@ -162,6 +277,18 @@ class Persistence:
             except Exception as e:
                 self.logger.debug(f"cooldown migration skipped: {e}")
 
+            # 2.1) symbol_state: eski şemalarda eksik olabilecek durum kolonları
+            try:
+                cur.execute("PRAGMA table_info(symbol_state)")
+                cols = {row[1] for row in cur.fetchall()}
+                for col, typ in (("cooldown_until_ts", "INTEGER DEFAULT 0"), ("last_signal_ts", "INTEGER DEFAULT 0"),
+                                 ("last_exit_ts", "INTEGER DEFAULT 0"), ("trail_stop", "REAL"),
+                                 ("peak", "REAL"), ("trough", "REAL")):
+                    if col not in cols:
+                        cur.execute(f"ALTER TABLE symbol_state ADD COLUMN {col} {typ}")
+            except Exception as e:
+                self.logger.debug(f"symbol_state add columns skipped: {e}")
+
             # 3) updated_at kolonlarını normalize et
             try:
                 cur.execute("""
@@ -196,6 +323,18 @@ class Persistence:
                     cur.execute("ALTER TABLE positions_cache ADD COLUMN sl_order_id TEXT")
                 if "tp_order_id" not in cols:
                     cur.execute("ALTER TABLE positions_cache ADD COLUMN tp_order_id TEXT")
+                # borsa-yerel TRAILING_STOP_MARKET (trailing.mode=native)
+                if "trail_order_id" not in cols:
+                    cur.execute("ALTER TABLE positions_cache ADD COLUMN trail_order_id TEXT")
+                if "trail_cb" not in cols:
+                    cur.execute("ALTER TABLE positions_cache ADD COLUMN trail_cb REAL")
+                if "trail_client_id" not in cols:
+                    cur.execute("ALTER TABLE positions_cache ADD COLUMN trail_client_id TEXT")
+                # amend/replace boyunca emir kimliği (clientOrderId) takibi
+                if "sl_client_id" not in cols:
+                    cur.execute("ALTER TABLE positions_cache ADD COLUMN sl_client_id TEXT")
+                if "tp_client_id" not in cols:
+                    cur.execute("ALTER TABLE positions_cache ADD COLUMN tp_client_id TEXT")
             except Exception as e:
                 self.logger.debug(f"positions_cache add columns skipped: {e}")
 
@@ -241,6 +380,9 @@ class Persistence:
         """
         Artık yalnızca cooldown_until_ts kolonunu kullanıyoruz (KANONİK).
         """
+        if self.state_store is not None:
+            self.state_store.update(symbol, cooldown_until_ts=int(until_ts))
+            return
         with self._conn() as c:
             c.execute(
                 """
@@ -259,6 +401,8 @@ class Persistence:
         Kalan süre hesaplarında kullanılacak epoch (yoksa 0).
         Eski kolon (cooldown_until) varsa GERİYE UYUMLU olarak onu da dener.
         """
+        if self.state_store is not None:
+            return int(self.state_store.value(symbol, "cooldown_until_ts", 0))
         with self._conn() as c:
             cur = c.execute("SELECT cooldown_until_ts FROM symbol_state WHERE symbol=?", (symbol,))
             row = cur.fetchone()
@@ -285,6 +429,9 @@ class Persistence:
         return self.get_cooldown_ts(symbol)
 
     def set_last_signal_ts(self, symbol: str, ts: int) -> None:
+        if self.state_store is not None:
+            self.state_store.update(symbol, last_signal_ts=int(ts))
+            return
         with self._conn() as c:
             c.execute(
                 """
@@ -298,7 +445,27 @@ class Persistence:
             )
             c.commit()
 
+    def set_last_exit_ts(self, symbol: str, ts: int) -> None:
+        if self.state_store is not None:
+            self.state_store.update(symbol, last_exit_ts=int(ts))
+            return
+        with self._conn() as c:
+            c.execute(
+                """
+                INSERT INTO symbol_state(symbol, last_exit_ts, updated_at)
+                VALUES(?, ?, strftime('%s','now'))
+                ON CONFLICT(symbol) DO UPDATE SET
+                    last_exit_ts=excluded.last_exit_ts,
+                    updated_at=excluded.updated_at
+                """,
+                (symbol, int(ts)),
+            )
+            c.commit()
+
     def set_trail_stop(self, symbol: str, value: Optional[float]) -> None:
+        if self.state_store is not None:
+            self.state_store.update(symbol, trail_stop=None if value is None else float(value))
+            return
         with self._conn() as c:
             c.execute(
                 """
@@ -313,12 +480,18 @@ class Persistence:
             c.commit()
 
     def get_trail_stop(self, symbol: str) -> Optional[float]:
+        if self.state_store is not None:
+            v = self.state_store.value(symbol, "trail_stop")
+            return float(v) if v is not None else None
         with self._conn() as c:
             cur = c.execute("SELECT trail_stop FROM symbol_state WHERE symbol=?", (symbol,))
             row = cur.fetchone()
             return float(row[0]) if row and row[0] is not None else None
 
     def get_symbol_state(self, symbol: str) -> Dict[str, Any]:
+        if self.state_store is not None:
+            row = self.state_store.get(symbol)
+            return dict(row, symbol=symbol) if row else {}
         with self._conn() as c:
             cur = c.execute("SELECT * FROM symbol_state WHERE symbol=?", (symbol,))
             row = cur.fetchone()
@@ -403,6 +576,9 @@ class Persistence:
                 (symbol, side, float(qty), float(entry_price), self._utc()),
             )
             c.commit()
+        if self.position_index is not None:
+            self.position_index.set(symbol, side, float(qty))
+        self._notify_equity(symbol, side, float(qty), float(entry_price))
 
     def cache_update_position(
         self,
@@ -442,6 +618,10 @@ class Persistence:
                 (new_qty, new_entry, new_sl, new_tp, self._utc(), symbol),
             )
             c.commit()
+        if self.position_index is not None and qty is not None:
+            self.position_index.set(symbol, side0, float(new_qty or 0.0))
+        if qty is not None or entry_price is not None:
+            self._notify_equity(symbol, side0, float(new_qty or 0.0), float(new_entry or 0.0))
 
     def cache_update_sl(self, symbol: str, sl: float | None) -> None:
         with self._conn() as c:
@@ -466,19 +646,24 @@ class Persistence:
         with self._conn() as c:
             c.execute("DELETE FROM positions_cache WHERE symbol=?", (symbol,))
             c.commit()
+        if self.position_index is not None:
+            self.position_index.remove(symbol)
+        self._notify_equity(symbol, "", 0.0, 0.0)
         # RAM cache’te de varsa temizle
         self._open_positions_cache = [p for p in self._open_positions_cache if p.get("symbol") != symbol]
 
     def list_open_positions(self) -> List[Dict[str, Any]]:
         """
         Açık pozisyonları DB cache’ten döndürür.
-        Format: [{symbol, side, qty, entry_price, sl, tp, updated_at, sl_order_id, tp_order_id}, ...]
+        Format: [{symbol, side, qty, entry_price, sl, tp, updated_at, sl_order_id, tp_order_id,
+                  trail_order_id, trail_cb, trail_client_id, sl_client_id, tp_client_id}, ...]
         """
         out: List[Dict[str, Any]] = []
         with self._conn() as c:
             cur = c.execute(
                 """
-                SELECT symbol, side, qty, entry_price, sl, tp, updated_at, sl_order_id, tp_order_id
+                SELECT symbol, side, qty, entry_price, sl, tp, updated_at, sl_order_id, tp_order_id,
+                       trail_order_id, trail_cb, trail_client_id, sl_client_id, tp_client_id
                 FROM positions_cache
                 WHERE qty IS NOT NULL AND ABS(qty) > 0
                 """
@@ -495,6 +680,11 @@ class Persistence:
                         "updated_at": int(r["updated_at"] or 0),
                         "sl_order_id": r["sl_order_id"],
                         "tp_order_id": r["tp_order_id"],
+                        "trail_order_id": r["trail_order_id"],
+                        "trail_cb": float(r["trail_cb"]) if r["trail_cb"] is not None else None,
+                        "trail_client_id": r["trail_client_id"],
+                        "sl_client_id": r["sl_client_id"],
+                        "tp_client_id": r["tp_client_id"],
                     }
                 )
         return out
@@ -511,6 +701,33 @@ class Persistence:
                     (order_id, self._utc(), symbol))
             c.commit()
 
+    def cache_update_order_identity(self, symbol: str, kind: str, order_id: str | None, client_id: str | None) -> None:
+        """
+        kind: "sl" | "tp". Amend'de kimlik aynı kalır; replace'te yeni emrin orderId/clientOrderId'si yazılır.
+        """
+        kind = (kind or "").lower()
+        if kind not in ("sl", "tp"):
+            return
+        with self._conn() as c:
+            c.execute(
+                f"UPDATE positions_cache SET {kind}_order_id=?, {kind}_client_id=?, updated_at=? WHERE symbol=?",
+                (order_id, client_id, self._utc(), symbol),
+            )
+            c.commit()
+
+    def cache_update_trail(self, symbol: str, order_id: str | None, callback_rate: float | None,
+                           client_id: str | None = None) -> None:
+        """
+        Native trailing emrinin kimliği (orderId ve/veya gönderilen clientOrderId) ve callbackRate'i
+        (rejim karşılaştırması için). orderId yanıtta yoksa clientOrderId iptal için yeterlidir.
+        """
+        with self._conn() as c:
+            c.execute("UPDATE positions_cache SET trail_order_id=?, trail_client_id=?, trail_cb=?, updated_at=? "
+                      "WHERE symbol=?",
+                    (order_id, client_id, float(callback_rate) if callback_rate is not None else None,
+                     self._utc(), symbol))
+            c.commit()
+
     # ---- (opsiyonel) yalnız RAM içi mini güncelleme: adı net olsun
     def cache_update_position_mem(self, symbol: str, qty: float | None = None, entry_price: float | None = None, **extras) -> None:
         for p in self._open_positions_cache:
@@ -632,6 +849,8 @@ class Persistence:
     def clear_expired_cooldowns(self, now_epoch: Optional[int] = None) -> int:
         if now_epoch is None:
             now_epoch = now_ts()
+        if self.state_store is not None:
+            return self.state_store.clear_expired_cooldowns(int(now_epoch))
         with self._conn() as c:
             cur = c.cursor()
             cur.execute(
@@ -746,6 +965,22 @@ class Persistence:
         except Exception as e:
             self.logger.debug(f"notifications_log insert skipped: {e}")
             
+    def log_notifications_bulk(self, rows: list[tuple]) -> None:
+        """
+        rows: [(ts, channel, topic, level, payload_str), ...] → tek bağlantı, tek commit.
+        """
+        if not rows:
+            return
+        try:
+            with self._conn() as c:
+                c.executemany(
+                    "INSERT INTO notifications_log (ts, channel, topic, level, payload) VALUES (?, ?, ?, ?, ?)",
+                    rows,
+                )
+                c.commit()
+        except Exception as e:
+            self.logger.debug(f"notifications_log bulk insert skipped: {e}")
+
     # --- Günlük zaman penceresi (UTC offset ile) ---
     def _day_bounds(self, date_str: str, tz_offset_hours: int = 0) -> tuple[int, int]:
         """
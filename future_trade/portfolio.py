@@ -10,9 +10,16 @@ class OpenPosition:
 class Portfolio:
     def __init__(self, persistence):
         self.persistence = persistence
+        self._equity_tracker = None
+
+    def bind_equity_tracker(self, tracker):
+        self._equity_tracker = tracker
 
     def equity(self) -> float:
-        return 10000.0  # TODO: Binance bakiyesi ile bağla
+        t = self._equity_tracker
+        if t is not None and t.ready:
+            return float(t.equity)
+        return 10000.0  # tracker yoksa eski sabit
 
     def snapshot(self):
         return {"equity": self.equity()}
@@ -0,0 +1,145 @@
+# /opt/tradebot/future_trade/position_index.py
+# -*- coding: utf-8 -*-
+"""
+Açık pozisyon sayaç indeksi (giriş kapıları için).
+
+PositionSupervisor ve OrderManager her kontrolde SQLite'tan pozisyon listeleyip sayıyordu.
+Bu indeks positions_cache yazımlarıyla (Persistence hook'ları) güncel tutulur ve
+toplam / sembol / yön / korelasyon grubu sayılarını O(1) verir. İki katman da aynı
+check_entry() kuralını kullanır → kararlar tutarlı.
+
+Eşzamanlı girişler: reserve() kontrol + slot ayırmayı tek senkron adımda yapar (arada await
+yok); emir sonucu gelene dek slot "pending" sayılır. Başarısız/boş sonuçta release(),
+dolumda confirm() çağrılır.
+
+cfg:
+  correlation_groups: {"majors": ["BTCUSDT", "ETHUSDT"], "l1": ["SOLUSDT", "AVAXUSDT"]}
+  max_positions_per_group: 1
+"""
+from __future__ import annotations
+
+import logging
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+
+def _norm_side(side: str, qty: float = 0.0) -> str:
+    s = (side or "").upper()
+    if s in ("LONG", "BUY"):
+        return "LONG"
+    if s in ("SHORT", "SELL"):
+        return "SHORT"
+    return "LONG" if float(qty or 0.0) > 0 else "SHORT"
+
+
+class PositionIndex:
+    def __init__(self, groups: Optional[Dict[str, Iterable[str]]] = None, logger=None):
+        self.logger = logger or logging.getLogger("position_index")
+        self._group_of: Dict[str, str] = {}
+        for g, syms in (groups or {}).items():
+            for s in syms or []:
+                self._group_of[str(s).upper()] = str(g)
+        self._pos: Dict[str, str] = {}                # {symbol: "LONG"|"SHORT"} (tek yön)
+        self.total = 0
+        self._by_side = {"LONG": 0, "SHORT": 0}
+        self._by_group: Dict[str, int] = {}
+        self._pending: Dict[str, str] = {}            # {symbol: side} emir sonucu beklenen rezervasyonlar
+
+    # ---------- yazma ----------
+    def _inc(self, symbol: str, side: str, d: int) -> None:
+        self.total += d
+        self._by_side[side] = self._by_side.get(side, 0) + d
+        g = self._group_of.get(symbol)
+        if g is not None:
+            self._by_group[g] = self._by_group.get(g, 0) + d
+
+    def set(self, symbol: str, side: str, qty: float) -> None:
+        """Pozisyon aç/güncelle; qty=0 kapatır."""
+        if not symbol:
+            return
+        if not qty or abs(float(qty)) <= 0:
+            self.remove(symbol)
+            return
+        side = _norm_side(side, qty)
+        old = self._pos.get(symbol)
+        if old == side:
+            return
+        if old is not None:
+            self._inc(symbol, old, -1)
+        self._pos[symbol] = side
+        self._inc(symbol, side, +1)
+
+    def remove(self, symbol: str) -> None:
+        self._pending.pop(symbol, None)
+        old = self._pos.pop(symbol, None)
+        if old is not None:
+            self._inc(symbol, old, -1)
+
+    def load(self, rows: Iterable[Dict[str, Any]]) -> int:
+        """Tam yeniden kurulum (açılış/uzlaştırma)."""
+        self._pos.clear()
+        self.total = 0
+        self._by_side = {"LONG": 0, "SHORT": 0}
+        self._by_group = {}
+        for p in rows or []:
+            self.set(p.get("symbol"), p.get("side"), float(p.get("qty") or 0.0))
+        for sym, side in self._pending.items():
+            if sym not in self._pos:
+                self.set(sym, side, 1.0)          # uçuştaki girişler yeniden kurulumda kaybolmaz
+        return self.total
+
+    # ---------- rezervasyon (eşzamanlı giriş) ----------
+    def reserve(self, symbol: str, side: str, **limits) -> Tuple[bool, str]:
+        """check_entry + slot ayırma; await içermez → iki eşzamanlı giriş aynı boş slotu göremez."""
+        ok, why = self.check_entry(symbol, side, **limits)
+        if not ok:
+            return ok, why
+        side = _norm_side(side)
+        self.set(symbol, side, 1.0)
+        self._pending[symbol] = side
+        return True, "ok"
+
+    def release(self, symbol: str) -> None:
+        """Emir başarısız/boş döndü: yalnız hâlâ pending ise slot geri verilir."""
+        if self._pending.pop(symbol, None) is not None:
+            self.remove(symbol)
+
+    def confirm(self, symbol: str) -> None:
+        """Emir gönderildi: slot artık gerçek pozisyon (positions_cache yazımı aynı kaydı günceller)."""
+        self._pending.pop(symbol, None)
+
+    # ---------- okuma (O(1)) ----------
+    def symbol_count(self, symbol: str) -> int:
+        return 1 if symbol in self._pos else 0
+
+    def side_count(self, side: str) -> int:
+        return self._by_side.get(_norm_side(side), 0)
+
+    def group_of(self, symbol: str) -> Optional[str]:
+        return self._group_of.get(symbol)
+
+    def group_count(self, group: Optional[str]) -> int:
+        return self._by_group.get(group, 0) if group else 0
+
+    def side_of(self, symbol: str) -> Optional[str]:
+        return self._pos.get(symbol)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"total": self.total, "by_side": dict(self._by_side), "by_group": dict(self._by_group),
+                "symbols": dict(self._pos), "pending": sorted(self._pending)}
+
+    def check_entry(self, symbol: str, side: str, *, max_total: int = 0, max_per_symbol: int = 0,
+                    max_longs: int = 0, max_shorts: int = 0, max_per_group: int = 0) -> Tuple[bool, str]:
+        """Ortak giriş kapısı; 0 = limitsiz. Dönüş: (izin, sebep)."""
+        side = _norm_side(side)
+        if max_per_symbol and self.symbol_count(symbol) >= max_per_symbol:
+            return False, "max_symbol_limit_reached"
+        if max_total and self.total >= max_total:
+            return False, "max_global_limit_reached"
+        if side == "LONG" and max_longs and self._by_side["LONG"] >= max_longs:
+            return False, "max_long_limit_reached"
+        if side == "SHORT" and max_shorts and self._by_side["SHORT"] >= max_shorts:
+            return False, "max_short_limit_reached"
+        g = self._group_of.get(symbol)
+        if max_per_group and g is not None and self._by_group.get(g, 0) >= max_per_group:
+            return False, f"max_group_limit_reached:{g}"
+        return True, "ok"
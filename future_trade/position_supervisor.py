@@ -11,7 +11,12 @@ class PositionSupervisor:
         self.cfg = cfg
         self.portfolio = portfolio
         self.notifier = notifier
-        
+        self.persistence = persistence
+        self._cooldown_svc = None  # CooldownService (opsiyonel; dinamik süre)
+
+    def bind_cooldown_service(self, svc):
+        self._cooldown_svc = svc
+
     def evaluate_entry(self, symbol, signal) -> Tuple[bool, str]:
         # 1) FLAT ise asla girme
         if signal.side == "FLAT":
@@ -22,7 +27,23 @@ class PositionSupervisor:
         if symbol not in wl:
             return False, "not_in_whitelist"
 
-        # 3) Sembol başı limit
+        # 2.1) Cooldown (state store varsa sözlük erişimi)
+        if self.get_cooldown(symbol) > 0:
+            return False, "cooldown_active"
+
+        # 3) Limitler: indeks varsa O(1) ortak kapı (OrderManager ile aynı kural)
+        idx = getattr(self.persistence, "position_index", None)
+        if idx is not None:
+            return idx.check_entry(
+                symbol, signal.side,
+                max_total=int(self.cfg.get("max_open_trades_global", 4)),
+                max_per_symbol=int(self.cfg.get("max_trades_per_symbol", 1)),
+                max_longs=int(self.cfg.get("max_long_trades", 3)),
+                max_shorts=int(self.cfg.get("max_short_trades", 3)),
+                max_per_group=int(self.cfg.get("max_positions_per_group", 0) or 0),
+            )
+
+        # 3.1) Sembol başı limit
         max_per_symbol = int(self.cfg.get("max_trades_per_symbol", 1))
         positions = self.portfolio.open_positions()
         symbol_open = sum(1 for p in positions if p.symbol == symbol)
@@ -47,43 +68,34 @@ class PositionSupervisor:
     def set_cooldown(self, symbol: str, until_ts: int) -> None:
         """Sinyal sonrası sembolü until_ts (epoch) zamanına kadar kilitle."""
         now = int(time.time())
-        with self._conn() as c:
-            cur = c.cursor()
-            cur.execute("""
-                INSERT INTO symbol_state(symbol, state, cooldown_until, last_signal_ts, updated_at)
-                VALUES (?, 'cooldown', ?, ?, ?)
-                ON CONFLICT(symbol) DO UPDATE SET
-                    state='cooldown',
-                    cooldown_until=excluded.cooldown_until,
-                    last_signal_ts=excluded.last_signal_ts,
-                    updated_at=excluded.updated_at
-            """, (symbol, int(until_ts), now, now))
-            c.commit()
+        st = getattr(self.persistence, "state_store", None)
+        if st is not None:
+            st.update(symbol, state="cooldown", cooldown_until_ts=int(until_ts), last_signal_ts=now)
+            return
+        self.persistence.set_cooldown(symbol, int(until_ts))
+        self.persistence.set_last_signal_ts(symbol, now)
+
+    def start_cooldown(self, symbol: str, ts: Optional[int] = None) -> int:
+        """Girişten sonra cooldown başlat; süre CooldownService'ten (yoksa cooldown.base_sec)."""
+        now = int(ts or time.time())
+        if self._cooldown_svc is not None:
+            sec = int(self._cooldown_svc.cooldown_for(symbol, now))
+        else:
+            sec = int((self.cfg.get("cooldown", {}) or {}).get("base_sec", 1800))
+        self.set_cooldown(symbol, now + sec)
+        return sec
 
     def get_cooldown(self, symbol: str, now_ts: Optional[int] = None) -> int:
         """Kalan cooldown saniyesi (yoksa 0)."""
         if now_ts is None:
             now_ts = int(time.time())
-        with self._conn() as c:
-            cur = c.cursor()
-            cur.execute("SELECT cooldown_until FROM symbol_state WHERE symbol=?", (symbol,))
-            row = cur.fetchone()
-            if not row or row[0] is None:
-                return 0
-            remain = int(row[0]) - now_ts
-            return max(0, remain)
+        try:
+            return int(self.persistence.get_cooldown_remaining(symbol, now_ts))
+        except Exception:
+            return 0
 
     def mark_exit_ts(self, symbol: str, ts: Optional[int] = None) -> None:
         """Pozisyon kapandıktan sonra son çıkış zamanını işaretle (rapor/analiz için)."""
         if ts is None:
             ts = int(time.time())
-        with self._conn() as c:
-            cur = c.cursor()
-            cur.execute("""
-                INSERT INTO symbol_state(symbol, last_signal_ts, updated_at)
-                VALUES (?, ?, ?)
-                ON CONFLICT(symbol) DO UPDATE SET
-                    last_signal_ts=excluded.last_signal_ts,
-                    updated_at=excluded.updated_at
-            """, (symbol, ts, ts))
-            c.commit()
\ No newline at end of file
+        self.persistence.set_last_exit_ts(symbol, int(ts))
@@ -5,6 +5,8 @@ from __future__ import annotations
 import asyncio, logging
 from typing import Dict, Any, List, Optional
 
+from future_trade.event_bus import idle_wait
+
 
 class ProtectiveSweeper:
     """
@@ -12,18 +14,37 @@ class ProtectiveSweeper:
     - list_open_positions(): açık pozisyonları verir
     - client.list_open_orders(symbol=...) ile açık emirleri çeker
     - reduceOnly ve STOP*/TAKE_PROFIT* olanları iptal eder
+
+    Tek geçiş (sweep_once): bir açık-emir snapshot'ı + bir pozisyon snapshot'ı alınır,
+    yetim koruyucular bellekte küme farkıyla bulunur ve sembol başına 10'luk
+    batchOrders istekleriyle iptal edilir. protective_sweeper.position_source:
+    "db" (varsayılan; yerel positions_cache) | "exchange" (positionRisk, +1 REST).
     """
 
+    BATCH_MAX = 10
+
     def __init__(self, router, persistence, logger=None, interval_sec: int = 20):
         self.router = router
         self.persistence = persistence
         self.logger = logger or logging.getLogger("protective_sweeper")
         self.interval = max(5, int(interval_sec))
+        self._sub = None
+        self._idle_sec = float(self.interval)
+        sw_cfg = (getattr(router, "cfg", {}) or {}).get("protective_sweeper", {}) or {}
+        self.position_source = (sw_cfg.get("position_source") or "db").lower()
+        self.scope: Optional[set] = None   # shard modunda yalnız bu worker'ın sembolleri
 
-    def _symbols_with_positions(self) -> List[str]:
-        list_fn = getattr(self.router, "_trail_ctx", {}).get("list_open_positions")
+    def bind_scope(self, symbols) -> None:
+        """Shard modu: diğer worker'ların pozisyonları bu DB'de yok → onların koruyucularına dokunma."""
+        self.scope = set(symbols or [])
+
+    def _symbols_with_positions(self) -> Optional[List[str]]:
+        """Yerel açık pozisyonlu semboller; kaynak yok/okunamazsa None (tur atlanır, stop'lar silinmez)."""
+        list_fn = getattr(self.persistence, "list_open_positions", None)
         if not callable(list_fn):
-            return []
+            list_fn = getattr(self.router, "_trail_ctx", {}).get("list_open_positions")
+        if not callable(list_fn):
+            return None
         try:
             syms = set()
             for p in (list_fn() or []):
@@ -32,8 +53,24 @@ class ProtectiveSweeper:
                     syms.add(p.get("symbol"))
             return sorted(syms)
         except Exception as e:
-            self.logger.debug(f"list_open_positions failed: {e}")
-            return []
+            self.logger.warning(f"[SWEEP] list_open_positions failed, skipping sweep: {e}")
+            return None
+
+    async def _position_snapshot(self) -> Optional[set]:
+        """Açık pozisyonlu semboller (tek okuma). Kaynak okunamazsa None → tur atlanır."""
+        client = getattr(self.router, "client", None)
+        fn = getattr(client, "position_risk", None)
+        if self.position_source != "exchange" or not callable(fn):
+            syms = self._symbols_with_positions()
+            return None if syms is None else set(syms)
+        try:
+            res = fn()
+            if asyncio.iscoroutine(res):
+                res = await res
+            return {p.get("symbol") for p in (res or []) if float(p.get("positionAmt") or 0.0) != 0.0}
+        except Exception as e:
+            self.logger.warning(f"[SWEEP] positionRisk failed, skipping sweep: {e}")
+            return None
 
     async def _list_open_orders(self, symbol: Optional[str] = None) -> List[Dict[str, Any]]:
         client = getattr(self.router, "client", None)
@@ -57,49 +94,88 @@ class ProtectiveSweeper:
         except Exception:
             return False
 
-    async def _sweep_symbol(self, symbol: str) -> int:
+    async def _cancel_batch(self, symbol: str, orders: List[Dict[str, Any]]) -> int:
+        """Bir sembolün yetim emirlerini 10'luk gruplarla iptal eder; batch yoksa tek tek."""
+        client = getattr(self.router, "client", None)
+        batch_fn = getattr(client, "cancel_batch_orders", None)
+        cancelled = 0
+        with_id = [o for o in orders if o.get("orderId") is not None]
+        by_coid = [o for o in orders if o.get("orderId") is None and o.get("clientOrderId")]
+        chunks = [("id", with_id[i:i + self.BATCH_MAX]) for i in range(0, len(with_id), self.BATCH_MAX)]
+        chunks += [("coid", by_coid[i:i + self.BATCH_MAX]) for i in range(0, len(by_coid), self.BATCH_MAX)]
+        for kind, chunk in chunks:
+            if callable(batch_fn):
+                try:
+                    if kind == "id":
+                        res = batch_fn(symbol, order_ids=[o["orderId"] for o in chunk])
+                    else:
+                        res = batch_fn(symbol, client_order_ids=[o["clientOrderId"] for o in chunk])
+                    if asyncio.iscoroutine(res):
+                        res = await res
+                    for r in (res or []):
+                        if isinstance(r, dict) and r.get("code") not in (None, 200):
+                            self.logger.debug(f"batch cancel item failed for {symbol}: {r}")
+                        else:
+                            cancelled += 1
+                    continue
+                except Exception as e:
+                    self.logger.debug(f"batch cancel failed for {symbol}, falling back: {e}")
+            for o in chunk:
+                try:
+                    res = client.cancel_order(symbol=symbol, orderId=o.get("orderId"),
+                                              origClientOrderId=o.get("clientOrderId"))
+                    if asyncio.iscoroutine(res):
+                        await res
+                    cancelled += 1
+                except Exception as e:
+                    self.logger.debug(f"cancel protective failed for {symbol}: {e}")
+        return cancelled
+
+    async def sweep_once(self) -> int:
         """
-        Pozisyonu olmayan semboldeki koruyucu emirleri iptal eder.
-        Geri dönüş: iptal edilen emir sayısı.
+        Tek geçişli süpürme: 1 açık-emir snapshot'ı + 1 pozisyon snapshot'ı, bellekte fark,
+        batch iptal. Geri dönüş: iptal edilen emir sayısı.
         """
-        # Pozisyon var mı? Varsa süpürme, çık.
-        if symbol in self._symbols_with_positions():
+        all_orders = await self._list_open_orders()
+        orphans: Dict[str, List[Dict[str, Any]]] = {}
+        for o in all_orders or []:
+            if self._is_protective(o) and o.get("symbol") and (self.scope is None or o["symbol"] in self.scope):
+                orphans.setdefault(o["symbol"], []).append(o)
+        if not orphans:
             return 0
 
-        cancelled = 0
-        orders = await self._list_open_orders(symbol=symbol)
-        for o in orders or []:
-            if not self._is_protective(o):
+        held = await self._position_snapshot()
+        if held is None:
+            return 0
+        for sym in held:
+            orphans.pop(sym, None)
+        if not orphans:
+            return 0
+
+        counts = await asyncio.gather(*(self._cancel_batch(sym, lst) for sym, lst in orphans.items()),
+                                      return_exceptions=True)
+        total = 0
+        for sym, n in zip(orphans, counts):
+            if isinstance(n, Exception):
+                self.logger.debug(f"sweep cancel error for {sym}: {n}")
                 continue
-            try:
-                oid = o.get("orderId")
-                coid = o.get("clientOrderId")
-                self.router.cancel_order(symbol=symbol, order_id=oid, client_order_id=coid)
-                cancelled += 1
-            except Exception as e:
-                self.logger.debug(f"cancel protective failed for {symbol}: {e}")
-        if cancelled:
-            self.logger.info(f"[SWEEP] {symbol}: cancelled {cancelled} protective order(s)")
-        return cancelled
+            if n:
+                self.logger.info(f"[SWEEP] {sym}: cancelled {n} protective order(s)")
+            total += n
+        return total
+
+    def bind_bus(self, bus, idle_sec: float = 120.0):
+        """order_update/position_change olaylarında hemen uyan; olay yoksa idle_sec'te bir güvenlik turu."""
+        self._sub = bus.subscribe("protective_sweeper", types=('order_update', 'position_change'), maxsize=256)
+        self._idle_sec = max(float(self.interval), float(idle_sec))
 
     async def run(self, stop_event: asyncio.Event = None):
         """
-        Periyodik tarama: açık emirleri sembol-bazlı süpürür.
+        Periyodik tarama: tek geçişli süpürme (sweep_once).
         """
         while not (stop_event and stop_event.is_set()):
             try:
-                # Hedef semboller: whitelist + açık emirleri olanlar
-                wh = list(self.router.cfg.get("symbols_whitelist", []))
-                # Open orders içinden de topla (geniş kapsama)
-                all_orders = await self._list_open_orders()
-                syms = set(wh)
-                for o in all_orders or []:
-                    s = o.get("symbol")
-                    if s:
-                        syms.add(s)
-
-                for sym in sorted(syms):
-                    await self._sweep_symbol(sym)
+                await self.sweep_once()
             except Exception as e:
                 self.logger.error(f"ProtectiveSweeper loop error: {e}")
-            await asyncio.sleep(self.interval)
+            await idle_wait(self._sub, self._idle_sec if self._sub is not None else self.interval)
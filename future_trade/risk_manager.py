@@ -9,8 +9,10 @@ Risk & boyutlandırma:
   normalizer kancaları desteklenir (bind_normalizer / bind_trailing_cfg / bind_atr_provider).
 """
 
+import asyncio
+import logging
 from dataclasses import dataclass
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 
 
 
@@ -58,6 +60,9 @@ class RiskManager:
         self._init_balance_cache()      # ACCOUNT_UPDATE balance cache
         # bracket cache: {SYMBOL: {"ts": int, "brackets": list}}
         self._br_cache = {} 
+        self.logger = logging.getLogger("risk_manager")
+        self._log = self.logger
+        self.bind_margin_cfg(None)      # varsayılanlar; app gerçek cfg ile yeniden bağlar
 
     # ----- ACCOUNT_UPDATE balance cache -----
     def _init_balance_cache(self):
@@ -309,56 +314,36 @@ class RiskManager:
 #        except Exception:
 #            return 0.004
 
-    async def suggest_affordable_qty(
-        self,
-        symbol: str,
-        side: str,
-        desired_qty: float,
-        price: float,
-        leverage: int,
-        reduce_only: bool = False,
-    ) -> tuple[float, str]:
+    async def _margin_budget(self) -> tuple[float, Optional[str]]:
         """
-        Emir öncesi teminat kontrolü:
-        - availableBalance, reserve_pct, min_free_usdt
-        - initial margin ≈ notional/leverage
-        - maint margin ≈ notional * mmr (bracket-aware)
-        - fees + slippage + buffer
-        Döner: (uygun_qty, reason)
+        Teminat bütçesi: availableBalance (WS cache → REST) - reserve_pct.
+        Dönüş: (budget, red_sebebi|None)
         """
-
-        # 1) ReduceOnly emirler için override kontrolü
-        if reduce_only and self._mg.get("allow_reduce_only_override", True):
-            return float(desired_qty), "reduce_only_override"
-
-        # 2) Binance client erişimi kontrolü
         client = getattr(self, "_client", None)
-        if not client:
-            return float(desired_qty), "no_client"
 
-        # 3) availableBalance hesaplama: önce WS cache, sonra REST fallback
+        # 1) availableBalance hesaplama: önce WS cache, sonra REST fallback
         use_ws = bool(self._mg.get("use_account_ws", True))
         stale_sec = int(self._mg.get("stale_timeout_sec", 60))
         avail = None
 
         try:
-            # 3.1) WS cache varsa ve tazeyse kullan
+            # 1.1) WS cache varsa ve tazeyse kullan
             bc = getattr(self, "_balance_cache", None) or {}
             if use_ws and bc.get("available") is not None and bc.get("ts"):
                 import time as _t
                 age = _t.time() - float(bc["ts"])
                 if age <= stale_sec:
                     avail = float(bc["available"])
-                    self._log and self._log.debug(f"[MG] using WS cache avail={avail:.4f} age={age:.1f}s")
+                    self._log.debug(f"[MG] using WS cache avail={avail:.4f} age={age:.1f}s")
         except Exception:
             pass
 
         if avail is None:
-            # 3.2) REST fallback: get_account ile güncel veriyi al
+            # 1.2) REST fallback: get_account ile güncel veriyi al
             try:
                 acct = await client.get_account()
                 avail = float(acct.get("availableBalance") or acct.get("totalWalletBalance") or 0.0)
-                self._log and self._log.debug(f"[MG] using REST avail={avail:.4f}")
+                self._log.debug(f"[MG] using REST avail={avail:.4f}")
                 try:
                     self.update_balance_cache(avail)  # cache güncelle
                 except Exception:
@@ -366,63 +351,158 @@ class RiskManager:
             except Exception:
                 avail = 0.0
 
-        # 4) Risk parametrelerini al
+        # 2) reserve ve min_free
         reserve = avail * float(self._mg.get("reserve_pct", 0.10))
         min_free = float(self._mg.get("min_free_usdt", 15.0))
+        budget = max(0.0, avail - reserve)
+        if budget < min_free:
+            return budget, f"insufficient_free_balance: free<{min_free}usdt"
+        return budget, None
+
+    @staticmethod
+    def _max_affordable_notional(
+        brackets: list[dict], budget: float, lev: int, mm_buf: float, fee_rate: float
+    ) -> float:
+        """
+        Kapalı form çözüm. Her bracket segmentinde teminat ihtiyacı notional'a doğrusal:
+            need(N) = N * (1/lev + mmr_i*(1+mm_buf) + fee_rate)
+        Segment başına en büyük karşılanabilir N = min(cap_i, budget / c_i), yeter ki >= floor_i.
+        Son bracket'ın cap'i aşılırsa aynı mmr geçerli (_mmr_from_brackets ile uyumlu).
+        O(bracket sayısı).
+        """
+        if budget <= 0:
+            return 0.0
+        segs = brackets or [{"floor": 0.0, "cap": float("inf"), "mmr": 0.004}]
+        last = len(segs) - 1
+        best = 0.0
+        for i, b in enumerate(segs):
+            c = 1.0 / max(1, int(lev)) + float(b["mmr"]) * (1.0 + mm_buf) + fee_rate
+            if c <= 0:
+                continue
+            n = budget / c
+            floor_ = float(b["floor"]) if i > 0 else 0.0
+            cap_ = float("inf") if i == last else float(b["cap"])
+            if n < floor_:
+                continue
+            best = max(best, min(n, cap_))
+        return best
+
+    def _fit_qty(self, brackets: list[dict], budget: float, side: str,
+                 desired_qty: float, price: float, leverage: int) -> tuple[float, str]:
+        """Tek sembol için bütçeye sığan qty (slippage'lı fiyatla)."""
         fee_rate = float(self._mg.get("fee_rate", 0.0005))
         slip = float(self._mg.get("slippage_pct", 0.001))
         mm_buf = float(self._mg.get("mm_buffer_pct", 0.05))
 
-        # 5) Slippage ile fiyatı kötüleştir
+        # Slippage ile fiyatı kötüleştir
         px = float(price) * (1.0 + slip if side.upper() == "BUY" else 1.0 - slip)
-        lev = max(1, int(leverage))
+        if px <= 0:
+            return 0.0, "no_affordable_qty"
 
-        # 6) Binary search için başlangıç değerleri
-        lo, hi = 0.0, float(desired_qty)
-        ok_qty = 0.0
-        reason = "ok"
-        self.logger.debug(f"[MG] fee_rate={fee_rate}, initial_reason={reason}")
+        max_notional = self._max_affordable_notional(brackets, budget, leverage, mm_buf, fee_rate)
+        if self._notional(px, desired_qty) <= max_notional:
+            return float(desired_qty), "within_budget"
 
-        # 7) Bracket'ları bir kez çek (her qty için yeniden hesaplanacak)
-        brackets = await self._get_brackets(symbol)
+        ok_qty = max_notional / px
+        if ok_qty <= 0:
+            return 0.0, "no_affordable_qty"
+        return ok_qty, "shrunk_to_fit"
+
+    async def suggest_affordable_qty(
+        self,
+        symbol: str,
+        side: str,
+        desired_qty: float,
+        price: float,
+        leverage: int,
+        reduce_only: bool = False,
+    ) -> tuple[float, str]:
+        """
+        Emir öncesi teminat kontrolü:
+        - availableBalance, reserve_pct, min_free_usdt
+        - initial margin ≈ notional/leverage
+        - maint margin ≈ notional * mmr (bracket-aware)
+        - fees + slippage + buffer
+        Maksimum qty bracket segmentleri üzerinden kapalı formda bulunur (_max_affordable_notional).
+        Döner: (uygun_qty, reason)
+        """
 
-        # 8) Margin ihtiyacını hesaplayan yardımcı fonksiyon (bracket-aware MMR ile)
-        def need_margin(qty: float) -> float:
-            notional = self._notional(px, qty)
-            mmr = self._mmr_from_brackets(brackets, notional) if brackets else 0.004
-            im = notional / lev
-            mm = notional * mmr * (1.0 + mm_buf)
-            fees = self._est_fees(notional)
-            return im + mm + fees
+        # 1) ReduceOnly emirler için override kontrolü
+        if reduce_only and self._mg.get("allow_reduce_only_override", True):
+            return float(desired_qty), "reduce_only_override"
 
-        # 9) Kullanılabilir bütçeyi hesapla
-        budget = max(0.0, avail - reserve)
-        if budget < min_free:
-            return 0.0, f"insufficient_free_balance: free<{min_free}usdt"
-
-        # 10) Desired qty zaten bütçeye sığıyorsa direkt döndür
-        if need_margin(hi) <= budget:
-            return hi, "within_budget"
-
-        # 11) Binary search ile en yüksek uygun qty’yi bul
-        for _ in range(24):
-            mid = (lo + hi) / 2.0
-            if mid <= 0:
-                break
-            req = need_margin(mid)
-            if req <= budget:
-                ok_qty = mid
-                lo = mid
-            else:
-                hi = mid
+        # 2) Binance client erişimi kontrolü
+        if not getattr(self, "_client", None):
+            return float(desired_qty), "no_client"
 
-        # 12) Sonuç döndür
-        if ok_qty <= 0:
-            return 0.0, "no_affordable_qty"
+        # 3) Bütçe
+        budget, why = await self._margin_budget()
+        if why:
+            return 0.0, why
 
-        return ok_qty, "shrunk_to_fit"
+        # 4) Bracket'lar (TTL cache) ve kapalı form çözüm
+        brackets = await self._get_brackets(symbol)
+        return self._fit_qty(brackets, budget, side, desired_qty, price, leverage)
+
+    async def suggest_affordable_qty_batch(self, requests: List[Dict[str, Any]]) -> Dict[str, tuple[float, str]]:
+        """
+        Birden çok aday sembolü tek seferde boyutlandırır (ör. bar kapanışında tüm whitelist).
+        requests: [{"symbol","side","qty","price","leverage"?,"reduce_only"?}, ...]
+        - Bakiye bir kez okunur, eksik bracket'lar paralel çekilir.
+        - Her aday aynı bütçeye karşı bağımsız değerlendirilir (tekli API ile aynı semantik).
+        Döner: {symbol: (uygun_qty, reason)}
+        """
+        out: Dict[str, tuple[float, str]] = {}
+        todo = []
+        for r in requests or []:
+            sym = r.get("symbol")
+            if not sym:
+                continue
+            if r.get("reduce_only") and self._mg.get("allow_reduce_only_override", True):
+                out[sym] = (float(r.get("qty") or 0.0), "reduce_only_override")
+            elif not getattr(self, "_client", None):
+                out[sym] = (float(r.get("qty") or 0.0), "no_client")
+            else:
+                todo.append(r)
+        if not todo:
+            return out
+
+        budget, why = await self._margin_budget()
+        if why:
+            out.update({r["symbol"]: (0.0, why) for r in todo})
+            return out
+
+        syms = list(dict.fromkeys(r["symbol"] for r in todo))
+        fetched = await asyncio.gather(*(self._get_brackets(s) for s in syms), return_exceptions=True)
+        br = {s: (b if isinstance(b, list) else []) for s, b in zip(syms, fetched)}
+
+        for r in todo:
+            sym = r["symbol"]
+            lev = int(r.get("leverage") or self._symbol_leverage(sym))
+            out[sym] = self._fit_qty(br[sym], budget, str(r.get("side") or "BUY"),
+                                     float(r.get("qty") or 0.0), float(r.get("price") or 0.0), lev)
+        return out
 
     # ---- Leverage Bracket Tabanlı MMR Hesaplama (Binance uyumlu) ----
+    def seed_brackets(self, brackets_by_symbol: Dict[str, list], ts: int | None = None) -> int:
+        """
+        ExchangeMetaCache ön-yüklemesinden gelen normalize bracket'ları ({SYM: [{"floor","cap","mmr","cum"}]})
+        önbelleğe basar; emir yolunda sembol bazlı tembel fetch'e gerek kalmaz. Basılan sembol sayısı döner.
+        """
+        import time as _t
+        now = int(ts or _t.time())
+        n = 0
+        for sym, norm in (brackets_by_symbol or {}).items():
+            if norm:
+                self._br_cache[str(sym).upper()] = {"ts": now, "brackets": list(norm)}
+                n += 1
+        return n
+
+    def cached_brackets(self, symbol: str) -> list[dict]:
+        """Önbellekteki bracket listesi (ağ yok, TTL bakılmaz); yoksa boş liste."""
+        b = self._br_cache.get(str(symbol).upper())
+        return list(b.get("brackets") or []) if b else []
+
     async def _get_brackets(self, symbol: str) -> list[dict]:
         """
         Bracket listesini TTL ile önbellekten getirir. Yapı örneği (her eleman):
@@ -460,7 +540,8 @@ class RiskManager:
                     floor_ = float(r.get("notionalFloor", 0))
                     cap_   = float(r.get("notionalCap", float("inf")))
                     mmr_   = float(r.get("maintMarginRatio", 0.004))
-                    norm.append({"floor": floor_, "cap": cap_, "mmr": max(0.0, mmr_)})
+                    cum_   = float(r.get("cum", 0) or 0)     # maintenance amount (likidasyon fiyatı için)
+                    norm.append({"floor": floor_, "cap": cap_, "mmr": max(0.0, mmr_), "cum": cum_})
                 except Exception:
                     continue
             norm.sort(key=lambda x: x["floor"])
@@ -0,0 +1,374 @@
+# /opt/tradebot/future_trade/shard_coordinator.py
+# -*- coding: utf-8 -*-
+"""
+Çok süreçli (shard) çalışma için merkezi koordinatör.
+
+run_futures.py --workers N: whitelist N parçaya bölünür; her worker kendi parçası için
+stream/strateji/trailing/koruyucuları çalıştırır (ayrı süreç → ayrı çekirdek). Global kararlar
+tek yerde verilir: bu modüldeki ShardCoordinator supervisor sürecinde Unix soketi üzerinden
+satır başına bir JSON istek/yanıt ile hizmet eder.
+
+İşlemler (op):
+  reserve  {shard, symbol, side}  → global limitlere göre giriş rezervasyonu (PositionIndex kuralları)
+  release  {shard, symbol}        → emir başarısız/iptal → rezervasyon geri
+  sync     {shard, positions, upnl, wallet}
+                                  → shard'ın gerçek açık pozisyonlarıyla uzlaştırma (sızıntı temizliği);
+                                    yanıttaki "equity" = son cüzdan + tüm shard'ların son bildirdiği uPnL
+  halt     {shard, reason}        → global kill-switch: tüm worker'larda yeni giriş kilitlenir
+  resume   {shard}                → gün başı reset
+  status   {}                     → halted / açık sayılar / shard nabızları
+
+Worker tarafı: CoordinatorClient (soket) + ShardLink (OrderManager / KillSwitch / bus bağlantısı).
+Limitler tek süreçli kurulumla aynı cfg anahtarlarından okunur:
+  max_open_trades_global, max_trades_per_symbol, max_long_trades, max_short_trades,
+  correlation_groups + max_positions_per_group
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from future_trade.event_bus import idle_wait
+from future_trade.position_index import PositionIndex, _norm_side
+
+DEFAULT_SOCKET_PATH = "/tmp/tradebot_futures_coord.sock"
+
+
+def shard_symbols(whitelist: Iterable[str], index: int, count: int) -> List[str]:
+    """Kararlı bölme: config sırası korunur, i. shard her count'uncu sembolü alır."""
+    wl = list(whitelist or [])
+    if count <= 1:
+        return wl
+    return wl[int(index)::int(count)]
+
+
+def shard_db_path(path: str, index: int) -> str:
+    """/x/futures.db → /x/futures.shard0.db (her worker kendi positions_cache'ine sahip)."""
+    root, ext = os.path.splitext(path)
+    return f"{root}.shard{int(index)}{ext or '.db'}"
+
+
+class ShardCoordinator:
+    def __init__(self, cfg: Dict[str, Any], path: str = DEFAULT_SOCKET_PATH, logger=None):
+        self.cfg = cfg or {}
+        self.path = path
+        self.logger = logger or logging.getLogger("shard_coordinator")
+        sh = self.cfg.get("shard", {}) or {}
+        self.pending_ttl_sec = float(sh.get("pending_ttl_sec", 60))
+
+        self.index = PositionIndex(groups=self.cfg.get("correlation_groups") or {}, logger=self.logger)
+        self._owner: Dict[str, int] = {}          # {symbol: shard}
+        self._pending: Dict[str, float] = {}      # {symbol: rezervasyon ts} (henüz pozisyon görülmedi)
+        self._beats: Dict[int, float] = {}        # {shard: son istek ts}
+        self._conns: set = set()                  # açık worker bağlantıları (kapanışta kapatılır)
+        self._upnl: Dict[int, float] = {}         # {shard: kendi pozisyonlarının uPnL'i}
+        self._wallet: Optional[Tuple[float, float]] = None   # (bildirim ts, cüzdan) — tüm shard'lar aynı hesap
+        self.halted = False
+        self.halt_reason: Optional[str] = None
+        self.halt_seq = 0
+
+    # ---------- kurallar ----------
+    def _limits(self) -> Dict[str, int]:
+        c = self.cfg
+        return {
+            "max_total": int(c.get("max_open_trades_global", 4)),
+            "max_per_symbol": int(c.get("max_trades_per_symbol", 1)),
+            "max_longs": int(c.get("max_long_trades", 3)),
+            "max_shorts": int(c.get("max_short_trades", 3)),
+            "max_per_group": int(c.get("max_positions_per_group", 0) or 0),
+        }
+
+    def reserve(self, shard: int, symbol: str, side: str) -> Dict[str, Any]:
+        if self.halted:
+            return {"ok": False, "reason": "halted", "halted": True, "halt_seq": self.halt_seq}
+        ok, why = self.index.check_entry(symbol, side, **self._limits())
+        if not ok:
+            return {"ok": False, "reason": why, "halted": False}
+        self.index.set(symbol, _norm_side(side), 1.0)
+        self._owner[symbol] = int(shard)
+        self._pending[symbol] = time.time()
+        self.logger.info(f"[COORD] reserve {symbol} {side} by shard {shard} (open={self.index.total})")
+        return {"ok": True, "halted": False}
+
+    def release(self, shard: int, symbol: str) -> Dict[str, Any]:
+        if self._owner.get(symbol) != int(shard):
+            return {"ok": False, "reason": "not_owner"}
+        self.index.remove(symbol)
+        self._owner.pop(symbol, None)
+        self._pending.pop(symbol, None)
+        return {"ok": True}
+
+    def equity(self) -> Optional[float]:
+        """Hesap equity'si: en taze cüzdan + her shard'ın son bildirdiği uPnL (cüzdan yoksa None)."""
+        if self._wallet is None:
+            return None
+        return self._wallet[1] + sum(self._upnl.values())
+
+    def sync(self, shard: int, positions: Iterable[Dict[str, Any]], upnl: Optional[float] = None,
+             wallet: Optional[float] = None) -> Dict[str, Any]:
+        """Shard'ın açık pozisyonları kaynak kabul edilir; süresi dolmamış rezervasyonlar korunur."""
+        shard = int(shard)
+        now = time.time()
+        if upnl is not None:
+            self._upnl[shard] = float(upnl)
+        if wallet is not None and (self._wallet is None or now >= self._wallet[0]):
+            self._wallet = (now, float(wallet))
+        seen = set()
+        for p in positions or []:
+            sym = p.get("symbol")
+            if not sym:
+                continue
+            seen.add(sym)
+            self.index.set(sym, _norm_side(p.get("side"), p.get("qty") or 0.0), 1.0)
+            self._owner[sym] = shard
+            self._pending.pop(sym, None)
+        dropped = 0
+        for sym, owner in list(self._owner.items()):
+            if owner != shard or sym in seen:
+                continue
+            ts = self._pending.get(sym)
+            if ts is not None and now - ts < self.pending_ttl_sec:
+                continue
+            self.index.remove(sym)
+            self._owner.pop(sym, None)
+            self._pending.pop(sym, None)
+            dropped += 1
+        return {"ok": True, "dropped": dropped, "halted": self.halted, "halt_seq": self.halt_seq,
+                "halt_reason": self.halt_reason, "equity": self.equity()}
+
+    def halt(self, shard: int, reason: str) -> Dict[str, Any]:
+        if not self.halted:
+            self.halted = True
+            self.halt_reason = f"shard {shard}: {reason}"
+            self.halt_seq += 1
+            self.logger.error(f"[COORD] GLOBAL HALT ({self.halt_reason})")
+        return {"ok": True, "halted": True, "halt_seq": self.halt_seq}
+
+    def resume(self, shard: int) -> Dict[str, Any]:
+        if self.halted:
+            self.logger.warning(f"[COORD] resume by shard {shard} (was: {self.halt_reason})")
+        self.halted = False
+        self.halt_reason = None
+        return {"ok": True, "halted": False, "halt_seq": self.halt_seq}
+
+    def status(self) -> Dict[str, Any]:
+        now = time.time()
+        return {
+            "ok": True,
+            "halted": self.halted,
+            "halt_reason": self.halt_reason,
+            "halt_seq": self.halt_seq,
+            "open": self.index.snapshot(),
+            "owners": dict(self._owner),
+            "pending": sorted(self._pending),
+            "equity": self.equity(),
+            "upnl": {str(k): v for k, v in self._upnl.items()},
+            "shards": {str(k): round(now - v, 1) for k, v in self._beats.items()},
+        }
+
+    # ---------- protokol ----------
+    def handle(self, req: Dict[str, Any]) -> Dict[str, Any]:
+        op = req.get("op")
+        shard = int(req.get("shard", -1))
+        if shard >= 0:
+            self._beats[shard] = time.time()
+        if op == "reserve":
+            return self.reserve(shard, req["symbol"], req.get("side") or "")
+        if op == "release":
+            return self.release(shard, req["symbol"])
+        if op == "sync":
+            return self.sync(shard, req.get("positions") or [], upnl=req.get("upnl"), wallet=req.get("wallet"))
+        if op == "halt":
+            return self.halt(shard, req.get("reason") or "kill_switch")
+        if op == "resume":
+            return self.resume(shard)
+        if op == "status":
+            return self.status()
+        return {"ok": False, "reason": f"unknown op: {op}"}
+
+    async def _on_conn(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self._conns.add(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    resp = self.handle(json.loads(line))
+                except Exception as e:
+                    resp = {"ok": False, "reason": f"error: {e}"}
+                writer.write(json.dumps(resp).encode() + b"\n")
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._conns.discard(writer)
+            writer.close()
+
+    async def serve(self, stop_event: asyncio.Event) -> None:
+        try:
+            os.unlink(self.path)            # önceki çalışmadan kalan soket
+        except FileNotFoundError:
+            pass
+        server = await asyncio.start_unix_server(self._on_conn, path=self.path)
+        os.chmod(self.path, 0o600)
+        self.logger.info(f"[COORD] listening on {self.path}")
+        try:
+            await stop_event.wait()
+        finally:
+            server.close()
+            for w in list(self._conns):
+                w.close()
+            await server.wait_closed()
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+
+
+class CoordinatorClient:
+    """Tek bağlantı, sıralı istek/yanıt; kopunca bir sonraki istekte yeniden bağlanır."""
+
+    def __init__(self, path: str, shard: int, timeout: float = 3.0, logger=None):
+        self.path = path
+        self.shard = int(shard)
+        self.timeout = float(timeout)
+        self.logger = logger or logging.getLogger("shard_client")
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._lock = asyncio.Lock()
+
+    async def _connect(self) -> None:
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_unix_connection(self.path), timeout=self.timeout
+        )
+
+    def _drop(self) -> None:
+        if self._writer is not None:
+            try:
+                self._writer.close()
+            except Exception:
+                pass
+        self._reader = self._writer = None
+
+    async def request(self, op: str, **kw) -> Dict[str, Any]:
+        msg = json.dumps(dict(kw, op=op, shard=self.shard)).encode() + b"\n"
+        async with self._lock:
+            for attempt in (1, 2):
+                try:
+                    if self._writer is None:
+                        await self._connect()
+                    self._writer.write(msg)
+                    await self._writer.drain()
+                    line = await asyncio.wait_for(self._reader.readline(), timeout=self.timeout)
+                    if not line:
+                        raise ConnectionError("coordinator closed connection")
+                    return json.loads(line)
+                except Exception as e:
+                    self._drop()
+                    if attempt == 2:
+                        raise ConnectionError(f"coordinator unreachable: {e}")
+
+    async def close(self) -> None:
+        async with self._lock:
+            self._drop()
+
+
+class ShardLink:
+    """
+    Worker tarafı bağlantı:
+    - OrderManager.bind_coordinator(link): girişten önce reserve, başarısızlıkta release
+    - KillSwitch.bind_coordinator(link): tetiklenince halt, gün başında resume
+    - run(): position_change'te (ya da interval_sec'te) sync + global halt'ı yerelde uygula
+    - bind_equity_tracker(tracker): sync'te kendi uPnL'i + cüzdan bildirilir; dönen hesap
+      equity'si KillSwitch.on_global_equity'ye verilir
+    """
+
+    def __init__(self, client: CoordinatorClient, persistence, kill_switch=None,
+                 interval_sec: float = 5.0, fail_open: bool = False, logger=None):
+        self.client = client
+        self.persistence = persistence
+        self.kill_switch = kill_switch
+        self.interval_sec = max(1.0, float(interval_sec))
+        self.fail_open = bool(fail_open)
+        self.logger = logger or logging.getLogger("shard_link")
+        self._sub = None
+        self._halt_seq = 0          # yerelde uygulanmış son global halt
+        self._tracker = None        # EquityTracker (bind_scope ile yalnız bu shard'ın sembolleri)
+
+    def bind_equity_tracker(self, tracker) -> None:
+        self._tracker = tracker
+
+    async def reserve(self, symbol: str, side: str) -> Tuple[bool, str]:
+        try:
+            r = await self.client.request("reserve", symbol=symbol, side=side)
+        except Exception as e:
+            self.logger.warning(f"[SHARD] reserve {symbol} failed: {e}")
+            return self.fail_open, "coordinator_unreachable"
+        if r.get("halted"):
+            self._apply_halt(r)
+        return bool(r.get("ok")), r.get("reason") or ""
+
+    async def release(self, symbol: str) -> None:
+        try:
+            await self.client.request("release", symbol=symbol)
+        except Exception as e:
+            self.logger.debug(f"[SHARD] release {symbol} failed (sync will clean up): {e}")
+
+    async def halt(self, reason: str) -> None:
+        try:
+            r = await self.client.request("halt", reason=reason)
+            self._halt_seq = max(self._halt_seq, int(r.get("halt_seq") or 0))
+        except Exception as e:
+            self.logger.error(f"[SHARD] global halt failed: {e}")
+
+    async def resume(self) -> None:
+        try:
+            await self.client.request("resume")
+        except Exception as e:
+            self.logger.warning(f"[SHARD] resume failed: {e}")
+
+    def _apply_halt(self, r: Dict[str, Any]) -> None:
+        seq = int(r.get("halt_seq") or 0)
+        if seq <= self._halt_seq:
+            return                  # bu halt zaten uygulandı (ya da bizden çıktı)
+        self._halt_seq = seq
+        fn = getattr(self.kill_switch, "apply_remote_halt", None)
+        if callable(fn):
+            fn(r.get("halt_reason") or "global halt")
+
+    async def sync_once(self) -> None:
+        try:
+            rows = self.persistence.list_open_positions() or []
+        except Exception as e:
+            self.logger.debug(f"[SHARD] list positions failed: {e}")
+            return
+        positions = [{"symbol": p.get("symbol"), "side": p.get("side"), "qty": p.get("qty")}
+                     for p in rows if p.get("symbol")]
+        eq = {}
+        t = self._tracker
+        if t is not None and t.ready:
+            eq = {"upnl": t.unrealized, "wallet": t.wallet}
+        try:
+            r = await self.client.request("sync", positions=positions, **eq)
+        except Exception as e:
+            self.logger.warning(f"[SHARD] sync failed: {e}")
+            return
+        if r.get("halted"):
+            self._apply_halt(r)
+        fn = getattr(self.kill_switch, "on_global_equity", None)
+        if r.get("equity") is not None and callable(fn):
+            fn(float(r["equity"]))
+
+    def bind_bus(self, bus) -> None:
+        self._sub = bus.subscribe("shard_link", types=("position_change",), maxsize=64)
+
+    async def run(self, stop_event: asyncio.Event = None) -> None:
+        while not (stop_event and stop_event.is_set()):
+            await self.sync_once()
+            await idle_wait(self._sub, self.interval_sec)
+        await self.client.close()
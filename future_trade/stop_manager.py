@@ -2,7 +2,7 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 
-import time, logging, asyncio
+import time, logging, inspect
 from typing import Optional, Dict, Any, List
 
 
@@ -11,8 +11,7 @@ class StopManager:
     Trailing SL yönetimi (replace destekli):
       - Mevcut reduceOnly STOP* emirlerini listeler
       - Yeni stop mesafesi anlamlı hareket ettiyse (min_move_pct) ve "debounce" süresi geçtiyse:
-          * mevcut STOP iptal edilir
-          * yeni STOP_MARKET reduceOnly gönderilir
+          * router.amend_or_replace: önce yeni STOP_MARKET reduceOnly, sonra eski STOP iptal
       - Amaç: borsa tarafında her zaman tek ve güncel bir SL tutmak
     """
 
@@ -35,35 +34,31 @@ class StopManager:
                 return None
         return None
 
-    def _list_open_orders_sync(self, symbol: str) -> List[Dict[str, Any]]:
+    @staticmethod
+    async def _acall(fn, *args, **kwargs):
+        ret = fn(*args, **kwargs)
+        if inspect.isawaitable(ret):
+            ret = await ret
+        return ret
+
+    async def _list_open_orders(self, symbol: str) -> List[Dict[str, Any]]:
         """
-        client.list_open_orders async olabilir; burada sync ortamda güvenli şekilde çağır.
+        client.list_open_orders async olabilir; event loop içinde await edilir.
         """
         client = getattr(self.router, "client", None)
         if client is None:
             return []
         try:
-            coro = client.list_open_orders(symbol=symbol)
-            if asyncio.iscoroutine(coro):
-                loop = asyncio.get_running_loop()
-                return loop.run_until_complete(coro)
-            return coro
-        except RuntimeError:
-            # run_until_complete mevcut loop içinde yasaksa, client sync kabul edilip tekrar denenir
-            try:
-                return client.list_open_orders(symbol=symbol)
-            except Exception as e:
-                self.logger.debug(f"list_open_orders failed: {e}")
-                return []
+            return await self._acall(client.list_open_orders, symbol=symbol) or []
         except Exception as e:
             self.logger.debug(f"list_open_orders error: {e}")
             return []
 
-    def _find_existing_stop(self, symbol: str, side_close: str) -> Optional[Dict[str, Any]]:
+    async def _find_existing_stop(self, symbol: str, side_close: str) -> Optional[Dict[str, Any]]:
         """
         Aynı sembol ve kapanış yönünde reduceOnly STOP* emrini bulur.
         """
-        open_orders = self._list_open_orders_sync(symbol)
+        open_orders = await self._list_open_orders(symbol)
         if not open_orders:
             return None
         side_close = side_close.upper()
@@ -110,14 +105,28 @@ class StopManager:
                 return 0.0
         return 0.0
 
+    @staticmethod
+    def _unchanged(symbol: str, reason: str, old_sp: Optional[float]) -> Dict[str, Any]:
+        """Borsaya gidilmediğini hatadan (None) ayıran durum kaydı."""
+        return {"_update_mode": "unchanged", "symbol": symbol, "reason": reason, "stopPrice": old_sp}
+
+    async def _place(self, **kwargs) -> Dict[str, Any]:
+        fn = getattr(self.router, "place_order_async", None) or self.router.place_order
+        return await self._acall(fn, **kwargs)
+
+    async def _cancel(self, symbol: str, order_id=None, client_order_id=None) -> Any:
+        fn = getattr(self.router, "cancel_order_async", None) or self.router.cancel_order
+        return await self._acall(fn, symbol=symbol, order_id=order_id, client_order_id=client_order_id)
+
     # ---------- ana API ----------
-    def upsert_stop_loss(self, symbol: str, side_close: str, stop_price: float) -> Optional[Dict[str, Any]]:
+    async def upsert_stop_loss(self, symbol: str, side_close: str, stop_price: float) -> Optional[Dict[str, Any]]:
         """
         Yeni SL hedefi verildiğinde:
         1) mevcut reduceOnly STOP* emri bulunur
         2) replace kriterleri (min_move_pct, debounce_sec) sağlanıyorsa: cancel + yeni STOP_MARKET
         3) yoksa yeni STOP_MARKET direkt gönderilir
         4) başarılı upsert sonrası SL seviyesi ve orderId cache'e yazılır
+        Dönüş: emir yanıtı | {"_update_mode": "unchanged", ...} (borsaya gidilmedi) | None (hata/geçersiz girdi)
         """
         # 0) trailing yapılandırması
         tr_cfg = (self.cfg.get("trailing") or {})
@@ -135,7 +144,7 @@ class StopManager:
             return None
 
         # 2) Mevcut SL emri var mı?
-        existed = self._find_existing_stop(symbol, side_close)
+        existed = await self._find_existing_stop(symbol, side_close)
         if existed:
             try:
                 old_sp = float(existed.get("stopPrice") or existed.get("price") or 0.0)
@@ -148,57 +157,108 @@ class StopManager:
         qty = self._position_qty_for_close(symbol, side_close)
         if qty <= 0:
             self.logger.debug(f"[SL] no position to protect for {symbol}")
-            return None
+            return self._unchanged(symbol, "no_position", old_sp)
 
         # 4) Replace mi, yeni mi?
         do_replace = False
         if existed and old_sp > 0:
             do_replace = self._should_replace(symbol, float(stop_price), old_sp, min_move_pct, debounce_sec)
+            if not do_replace:
+                # mevcut SL yeterince yakın / debounce: borsaya gitme (kopya emir açma)
+                return self._unchanged(symbol, "debounce_or_min_move", old_sp)
 
-        # 5) Replace gerekiyorsa eski SL emrini iptal et
+        # 5-6) Replace gerekiyorsa eski SL iptal + yeni STOP_MARKET
         if existed and do_replace:
-            try:
-                oid = existed.get("orderId")
-                coid = existed.get("clientOrderId")
-                if oid or coid:
-                    self.router.cancel_order(symbol=symbol, order_id=oid, client_order_id=coid)
-                    self.logger.info(f"[SL] cancel old STOP for {symbol} ({old_sp})")
-            except Exception as e:
-                self.logger.warning(f"[SL] cancel failed for {symbol}: {e}")
+            return await self._swap_stop(symbol, side_close, float(stop_price), qty,
+                                   existed.get("orderId"), existed.get("clientOrderId"), old_sp)
+        return await self._swap_stop(symbol, side_close, float(stop_price), qty, None, None, old_sp)
+
+    async def replace_stop(
+        self,
+        symbol: str,
+        side_close: str,
+        stop_price: float,
+        qty: float,
+        old_order_id: Optional[str] = None,
+        old_client_order_id: Optional[str] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Karar zaten verilmişken (TrailingEngine) doğrudan değiştir: açık emir listelemesi,
+        min_move/debounce kontrolü YAPILMAZ; eski emir kimliği çağırandan gelir.
+        """
+        side_close = side_close.upper()
+        if side_close not in ("BUY", "SELL") or not stop_price or stop_price <= 0 or not qty or qty <= 0:
+            self.logger.error(f"[SL] replace_stop invalid args for {symbol}: side={side_close} stop={stop_price} qty={qty}")
+            return None
+        return await self._swap_stop(symbol, side_close, float(stop_price), float(qty), old_order_id, old_client_order_id, None)
 
-        # 6) Yeni STOP_MARKET emrini gönder
+    async def _swap_stop(self, symbol: str, side_close: str, stop_price: float, qty: float,
+                   old_oid, old_coid, old_sp: Optional[float]) -> Optional[Dict[str, Any]]:
+        """
+        Eski SL varsa router.amend_or_replace ile tek adımda günceller (STOP_MARKET amend edilemez →
+        önce yeni SL, sonra eski iptal; pozisyon arada korumasız kalmaz). Kimlik positions_cache'e yazılır.
+        """
+        replaced = bool(old_oid or old_coid)
         try:
-            res = self.router.place_order(
-                symbol=symbol,
-                side=side_close,
-                qty=qty,
-                order_type="STOP_MARKET",
-                stop_price=float(stop_price),
-                reduce_only=True,
-                tag="SL"
-            )
+            upd = getattr(self.router, "amend_or_replace", None)
+            if callable(upd):
+                res = await self._acall(
+                    upd,
+                    symbol=symbol,
+                    side=side_close,
+                    qty=qty,
+                    order_type="STOP_MARKET",
+                    stop_price=float(stop_price),
+                    order_id=old_oid,
+                    client_order_id=old_coid,
+                    reduce_only=True,
+                    tag="SL",
+                )
+            else:
+                if replaced:
+                    try:
+                        await self._cancel(symbol, old_oid, old_coid)
+                        self.logger.info(f"[SL] cancel old STOP for {symbol} ({old_sp})")
+                    except Exception as e:
+                        self.logger.warning(f"[SL] cancel failed for {symbol}: {e}")
+                res = await self._place(
+                    symbol=symbol,
+                    side=side_close,
+                    qty=qty,
+                    order_type="STOP_MARKET",
+                    stop_price=float(stop_price),
+                    reduce_only=True,
+                    tag="SL"
+                )
 
-            # 6.1) orderId bilgisini al
-            order_id = None
+            # 6.1) orderId / clientOrderId bilgisini al
+            order_id, client_id, mode = None, None, None
             try:
-                order_id = str(res.get("orderId") or res.get("order_id") or "")
+                order_id = str(res.get("orderId") or res.get("order_id") or "") or None
+                client_id = res.get("clientOrderId") or None
+                mode = res.get("_update_mode")
             except Exception:
-                order_id = None
+                pass
 
             # 6.2) zaman damgası ve log
             self._last_upsert_ts[symbol] = time.time()
-            self.logger.info(f"[SL] upsert {symbol} {side_close} stop={stop_price} qty={qty} replace={bool(existed and do_replace)}")
+            self.logger.info(
+                f"[SL] upsert {symbol} {side_close} stop={stop_price} qty={qty} replace={replaced} mode={mode or '-'}"
+            )
 
-            # 6.3) cache: SL seviyesi ve orderId
+            # 6.3) cache: SL seviyesi ve emir kimliği
             if hasattr(self.persistence, "cache_update_sl"):
                 try:
                     self.persistence.cache_update_sl(symbol, float(stop_price))
                 except Exception:
                     pass
 
-            if hasattr(self.persistence, "cache_update_sl_order_id") and order_id:
+            if order_id or client_id:
                 try:
-                    self.persistence.cache_update_sl_order_id(symbol, order_id)
+                    if hasattr(self.persistence, "cache_update_order_identity"):
+                        self.persistence.cache_update_order_identity(symbol, "sl", order_id, client_id)
+                    elif hasattr(self.persistence, "cache_update_sl_order_id") and order_id:
+                        self.persistence.cache_update_sl_order_id(symbol, order_id)
                 except Exception:
                     pass
 
@@ -208,3 +268,66 @@ class StopManager:
             self.logger.error(f"[SL] upsert failed for {symbol}: {e}")
             return None
 
+    async def place_native_trailing(
+        self,
+        symbol: str,
+        side_close: str,
+        qty: float,
+        callback_rate: float,
+        activation_price: Optional[float] = None,
+        old_order_id: Optional[str] = None,
+        old_client_order_id: Optional[str] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Borsa-yerel TRAILING_STOP_MARKET (reduceOnly). Önce yenisi konur, sonra eskisi iptal edilir:
+        korumasız pencere oluşmaz (iki reduceOnly emir kısa süre birlikte durabilir).
+        newClientOrderId burada üretilir; yanıtta orderId olmasa da eski emir origClientOrderId ile
+        iptal edilebilir. Dönen sonuçta "clientOrderId" her zaman doludur.
+        """
+        side_close = side_close.upper()
+        coid_fn = getattr(self.router, "_coid", None)
+        client_id = coid_fn("TS") if callable(coid_fn) else None
+        try:
+            res = await self._place(
+                symbol=symbol,
+                side=side_close,
+                qty=qty,
+                order_type="TRAILING_STOP_MARKET",
+                reduce_only=True,
+                callback_rate=float(callback_rate),
+                activation_price=activation_price,
+                tag="TS",
+                client_order_id=client_id,
+            )
+        except Exception as e:
+            self.logger.error(f"[SL] native trailing failed for {symbol}: {e}")
+            return None
+
+        order_id = None
+        try:
+            order_id = str(res.get("orderId") or res.get("order_id") or "") or None
+            # retry'da router yeni clientOrderId üretebilir → borsanın döndürdüğü esas alınır
+            client_id = res.get("clientOrderId") or (res.get("params") or {}).get("newClientOrderId") or client_id
+        except Exception:
+            order_id = None
+        if isinstance(res, dict):
+            res["clientOrderId"] = client_id
+
+        if (old_order_id and str(old_order_id) != str(order_id)) or \
+                (not old_order_id and old_client_order_id and old_client_order_id != client_id):
+            try:
+                await self._cancel(symbol, old_order_id, None if old_order_id else old_client_order_id)
+            except Exception as e:
+                self.logger.warning(f"[SL] cancel old trailing failed for {symbol}: {e}")
+
+        self._last_upsert_ts[symbol] = time.time()
+        self.logger.info(
+            f"[SL] native trailing {symbol} {side_close} cb={callback_rate}% act={activation_price} qty={qty} "
+            f"replace={bool(old_order_id or old_client_order_id)}"
+        )
+        if hasattr(self.persistence, "cache_update_trail"):
+            try:
+                self.persistence.cache_update_trail(symbol, order_id, float(callback_rate), client_id=client_id)
+            except Exception:
+                pass
+        return res
@@ -13,6 +13,7 @@ class Signal:
     entry: Optional[float] = None  # referans giriş fiyatı (son kapalı mum)
     sl: Optional[float] = None     # stop-loss fiyatı
     tp: Optional[float] = None     # take-profit fiyatı
+    strategy_id: Optional[str] = None  # çoklu strateji: sinyali üreten slot (StrategyRuntime doldurur)
 
 
 @dataclass
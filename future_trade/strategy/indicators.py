@@ -1,5 +1,5 @@
 # /opt/tradebot/future_trade/strategy/indicators.py
-from typing import List
+from typing import List, Optional
 from math import isnan
 
 
@@ -14,6 +14,36 @@ def ema(values, period=20):
     return out
 
 
+class EmaState:
+    """
+    Artımlı EMA: ema() ile aynı tanım (ilk değerle tohumlanır, period dolana kadar None).
+    update() O(1); peek() kapanmamış bir değeri state'i değiştirmeden dener.
+    """
+    __slots__ = ("period", "k", "value", "count")
+
+    def __init__(self, period: int = 20):
+        self.period = int(period)
+        self.k = 2 / (self.period + 1)
+        self.value: Optional[float] = None
+        self.count = 0
+
+    def update(self, v: float) -> Optional[float]:
+        v = float(v)
+        self.value = v if self.value is None else v * self.k + self.value * (1 - self.k)
+        self.count += 1
+        return self.current
+
+    def peek(self, v: float) -> Optional[float]:
+        if self.count + 1 < self.period:
+            return None
+        v = float(v)
+        return v if self.value is None else v * self.k + self.value * (1 - self.k)
+
+    @property
+    def current(self) -> Optional[float]:
+        return self.value if self.count >= self.period else None
+
+
 def rsi(closes: List[float], period: int = 14) -> float:
     if len(closes) < period + 1: return 50.0
     gains = []; losses = []
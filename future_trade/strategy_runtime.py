@@ -0,0 +1,148 @@
+# /opt/tradebot/future_trade/strategy_runtime.py
+# -*- coding: utf-8 -*-
+"""
+Çoklu strateji çalışma zamanı.
+
+Tek MarketStream / indeks snapshot / ctx üzerinden N stratejiyi (farklı sınıflar ya da
+aynı sınıfın farklı parametreleri) birlikte çalıştırır. strat_loop'a tek bir "strateji"
+gibi görünür: on_bar(event, ctx) her slotu sırayla değerlendirir ve birleşik risk
+kapısından geçen TEK sonucu döndürür.
+
+- İzole durum: her slot kendi strateji örneğine sahiptir; ctx slot başına sığ kopyadır.
+- Sermaye payı: slotun entry intent'ine risk_pct (ve varsa qty) allocation_pct oranında ölçeklenir.
+- Birleşik kapı: aynı bar/sembolde zıt yönlü sonuçlar (intent ya da Signal) iptal edilir; sembolde
+  zaten açık pozisyon varsa (PositionIndex) yeni sonuç düşürülür; kalanlardan en güçlüsü seçilir.
+  Dönen intent/Signal üreten slotun strategy_id'sini taşır.
+
+cfg:
+  strategies:
+    - {id: dt_fast, name: dominance_trend, allocation_pct: 60, params: {adx_min: 15}}
+    - {id: dt_slow, name: dominance_trend, allocation_pct: 40, params: {adx_min: 25}}
+"""
+from __future__ import annotations
+
+import dataclasses
+import logging
+import time
+from typing import Any, Dict, List, Optional
+
+from future_trade.loops import _resolve_strategy_call
+from future_trade.strategy.base import Signal
+
+
+class StrategySlot:
+    def __init__(self, sid: str, strategy, call, allocation_pct: float, risk_pct: Optional[float]):
+        self.id = sid
+        self.strategy = strategy
+        self.call = call
+        self.allocation = max(0.0, float(allocation_pct)) / 100.0
+        self.risk_pct = risk_pct
+        self.stats = {"evals": 0, "intents": 0, "signals": 0, "errors": 0, "last_ms": 0.0}
+
+
+class StrategyRuntime:
+    def __init__(self, slots: List[StrategySlot], persistence=None, base_risk_pct: Optional[float] = None,
+                 logger=None):
+        self.slots = slots
+        self.persistence = persistence
+        self.base_risk_pct = base_risk_pct
+        self.logger = logger or logging.getLogger("strategy_runtime")
+        self.gate_stats = {"conflict": 0, "position_open": 0, "passed": 0}
+
+    @classmethod
+    def from_cfg(cls, cfg: Dict[str, Any], registry: Dict[str, Any], persistence=None, logger=None):
+        base = dict(cfg.get("strategy", {}) or {})
+        specs = cfg.get("strategies") or [{"id": base.get("name", "dominance_trend"),
+                                           "name": base.get("name", "dominance_trend"),
+                                           "allocation_pct": 100}]
+        risk_cfg = cfg.get("risk", {}) or {}
+        base_risk = risk_cfg.get("per_trade_risk_pct")
+        slots = []
+        for i, spec in enumerate(specs):
+            if spec.get("enabled", True) is False:
+                continue
+            name = spec.get("name") or base.get("name", "dominance_trend")
+            strat_cls = registry.get(name)
+            if strat_cls is None:
+                raise RuntimeError(f"Strategy '{name}' registry'de yok")
+            s_cfg = dict(base, **{k: v for k, v in spec.items() if k not in ("id", "allocation_pct", "params")})
+            s_cfg["params"] = dict(base.get("params", {}) or {}, **(spec.get("params") or {}))
+            strategy = strat_cls(s_cfg)
+            sid = str(spec.get("id") or f"{name}#{i}")
+            slots.append(StrategySlot(sid, strategy, _resolve_strategy_call(strategy),
+                                      spec.get("allocation_pct", 100.0 / len(specs)), spec.get("risk_pct")))
+        if not slots:
+            raise RuntimeError("No enabled strategies")
+        total = sum(s.allocation for s in slots)
+        if total > 1.0 + 1e-9:
+            (logger or logging.getLogger("strategy_runtime")).warning(
+                f"[RUNTIME] allocation_pct total {total * 100:.0f}% > 100%; scaling down")
+            for s in slots:
+                s.allocation /= total
+        return cls(slots, persistence=persistence,
+                   base_risk_pct=float(base_risk) if base_risk is not None else None, logger=logger)
+
+    # ---------- değerlendirme ----------
+    def _scale_intent(self, slot: StrategySlot, intent: Dict[str, Any]) -> Dict[str, Any]:
+        out = dict(intent)
+        out["strategy_id"] = slot.id
+        rp = out.get("risk_pct", slot.risk_pct if slot.risk_pct is not None else self.base_risk_pct)
+        if rp is not None:
+            out["risk_pct"] = float(rp) * slot.allocation
+        if out.get("qty"):
+            out["qty"] = float(out["qty"]) * slot.allocation
+        return out
+
+    def on_bar(self, event: Dict[str, Any], ctx: Dict[str, Any]):
+        symbol = event.get("symbol")
+        intents: List[Dict[str, Any]] = []
+        signals: List[Signal] = []
+        for slot in self.slots:
+            if slot.call is None:
+                continue
+            sctx = dict(ctx, strategy_id=slot.id, allocation=slot.allocation, strategy=slot.strategy)
+            t0 = time.perf_counter()
+            try:
+                res = slot.call(event, sctx)
+            except Exception as e:
+                slot.stats["errors"] += 1
+                self.logger.error(f"[RUNTIME] {slot.id} on_bar error @ {symbol}: {e}")
+                continue
+            finally:
+                slot.stats["evals"] += 1
+                slot.stats["last_ms"] = (time.perf_counter() - t0) * 1000.0
+            if isinstance(res, dict) and res.get("action") == "entry":
+                slot.stats["intents"] += 1
+                intents.append(self._scale_intent(slot, res))
+            elif isinstance(res, Signal) and res.side in ("LONG", "SHORT"):
+                slot.stats["signals"] += 1
+                signals.append(dataclasses.replace(res, strategy_id=slot.id))
+                self.logger.debug(f"[RUNTIME] {slot.id} {symbol} signal {res.side}")
+
+        if not intents and not signals:
+            return Signal(side="FLAT", strength=0.0)
+        if not self._gate(symbol, intents, signals):
+            return None if intents else Signal(side="FLAT", strength=0.0)
+        if intents:
+            return max(intents, key=lambda i: float(i.get("strength") or 0.0))
+        return max(signals, key=lambda s: float(s.strength or 0.0))
+
+    def _gate(self, symbol: str, intents: List[Dict[str, Any]], signals: List[Signal]) -> bool:
+        """Birleşik risk kapısı (intent + Signal): zıt yön → iptal; açık pozisyon → düşür."""
+        sides = {"LONG" if (i.get("side") or "").upper() in ("BUY", "LONG") else "SHORT" for i in intents}
+        sides |= {s.side for s in signals}
+        if len(sides) > 1:
+            self.gate_stats["conflict"] += 1
+            ids = [i["strategy_id"] for i in intents] + [s.strategy_id for s in signals]
+            self.logger.info(f"[RUNTIME] {symbol} conflicting results {ids} → skip")
+            return False
+        idx = getattr(self.persistence, "position_index", None)
+        if idx is not None and idx.symbol_count(symbol):
+            self.gate_stats["position_open"] += 1
+            return False
+        self.gate_stats["passed"] += 1
+        return True
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"slots": {s.id: dict(s.stats, allocation=s.allocation) for s in self.slots},
+                "gate": dict(self.gate_stats)}
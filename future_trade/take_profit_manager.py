@@ -2,9 +2,11 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 
-import time, logging, asyncio
+import time, logging, asyncio, inspect
 from typing import Optional, Dict, Any, List, Tuple
 
+from future_trade.event_bus import idle_wait
+
 
 
 class TakeProfitManager:
@@ -12,8 +14,8 @@ class TakeProfitManager:
     TP (take profit) yönetimi (replace destekli):
       - Mevcut reduceOnly TAKE_PROFIT* emirlerini listeler
       - Hedef anlamlı değişmişse (min_move_pct) ve "debounce" süresi geçmişse:
-          * mevcut TP iptal edilir
-          * yeni TAKE_PROFIT_MARKET reduceOnly gönderilir
+          * take_profit.order_type=LIMIT ise mevcut TP yerinde değiştirilir (PUT /fapi/v1/order)
+          * aksi halde önce yeni TAKE_PROFIT_MARKET reduceOnly, sonra eski TP iptal
     Modlar:
       - percent: entry'ye göre % hedef
       - rr: risk/ödül (entry, SL ve RR katsayısı ile)
@@ -34,6 +36,8 @@ class TakeProfitManager:
         self.logger = logger or logging.getLogger("tp_manager")
         self._last_upsert_ts: Dict[str, float] = {}
         self._orderbook = orderbook_provider  # async/sync toleranslı
+        self._sub = None                      # EventBus aboneliği (bind_bus)
+        self._idle_sec = None
 
     # -------------------- yardımcılar --------------------
     def _last_price(self, symbol: str) -> Optional[float]:
@@ -45,34 +49,35 @@ class TakeProfitManager:
                 return None
         return None
 
-    def _list_open_orders_sync(self, symbol: str) -> List[Dict[str, Any]]:
+    @staticmethod
+    async def _acall(fn, *args, **kwargs):
+        ret = fn(*args, **kwargs)
+        if inspect.isawaitable(ret):
+            ret = await ret
+        return ret
+
+    async def _list_open_orders(self, symbol: str) -> List[Dict[str, Any]]:
         client = getattr(self.router, "client", None)
         if client is None:
             return []
         try:
-            coro = client.list_open_orders(symbol=symbol)
-            if asyncio.iscoroutine(coro):
-                return asyncio.get_running_loop().run_until_complete(coro)
-            return coro
-        except RuntimeError:
-            try:
-                return client.list_open_orders(symbol=symbol)
-            except Exception as e:
-                self.logger.debug(f"list_open_orders failed: {e}")
-                return []
+            return await self._acall(client.list_open_orders, symbol=symbol) or []
         except Exception as e:
             self.logger.debug(f"list_open_orders error: {e}")
             return []
 
-    def _find_existing_tp(self, symbol: str, side_close: str) -> Optional[Dict[str, Any]]:
-        open_orders = self._list_open_orders_sync(symbol)
+    def _tp_order_type(self) -> str:
+        return str((self.cfg.get("take_profit") or {}).get("order_type", "TAKE_PROFIT_MARKET")).upper()
+
+    async def _find_existing_tp(self, symbol: str, side_close: str) -> Optional[Dict[str, Any]]:
+        open_orders = await self._list_open_orders(symbol)
         if not open_orders:
             return None
         side_close = side_close.upper()
         for o in open_orders:
             try:
                 typ = (o.get("type") or "").upper()
-                if "TAKE_PROFIT" not in typ:
+                if "TAKE_PROFIT" not in typ and not (typ == "LIMIT" and self._tp_order_type() == "LIMIT"):
                     continue
                 if not bool(o.get("reduceOnly", False)):
                     continue
@@ -252,14 +257,20 @@ class TakeProfitManager:
             return side_close, float(target)
         return None
 
+    @staticmethod
+    def _unchanged(symbol: str, reason: str, old_tp: Optional[float]) -> Dict[str, Any]:
+        """Borsaya gidilmediğini hatadan (None) ayıran durum kaydı."""
+        return {"_update_mode": "unchanged", "symbol": symbol, "reason": reason, "stopPrice": old_tp}
+
     # -------------------- ana API --------------------
-    def upsert_take_profit(self, symbol: str, side_close: str, tp_price: float) -> Optional[Dict[str, Any]]:
+    async def upsert_take_profit(self, symbol: str, side_close: str, tp_price: float) -> Optional[Dict[str, Any]]:
         """
         Yeni TP hedefi verildiğinde:
         1) mevcut reduceOnly TAKE_PROFIT* emri bulunur
         2) replace kriterleri (min_move_pct, debounce_sec) sağlanıyorsa: cancel + yeni TAKE_PROFIT_MARKET
         3) yoksa yeni TAKE_PROFIT_MARKET direkt gönderilir
         4) başarılı upsert sonrası TP seviyesi ve orderId cache'e yazılır
+        Dönüş: emir yanıtı | {"_update_mode": "unchanged", ...} (borsaya gidilmedi) | None (hata/geçersiz girdi)
         """
         # 0) TP yapılandırma parametreleri
         tp_cfg = (self.cfg.get("take_profit") or {})
@@ -277,7 +288,7 @@ class TakeProfitManager:
             return None
 
         # 2) Mevcut TP emri var mı?
-        existed = self._find_existing_tp(symbol, side_close)
+        existed = await self._find_existing_tp(symbol, side_close)
         old_tp = 0.0
         if existed:
             try:
@@ -289,57 +300,67 @@ class TakeProfitManager:
         qty = self._position_qty_for_close(symbol, side_close)
         if qty <= 0:
             self.logger.debug(f"[TP] no position to protect for {symbol}")
-            return None
+            return self._unchanged(symbol, "no_position", old_tp)
 
         # 4) Replace mi, yeni mi?
         do_replace = False
         if existed and old_tp > 0:
             do_replace = self._should_replace(symbol, float(tp_price), old_tp, min_move_pct, debounce_sec)
-
-        # 5) Replace gerekiyorsa eski TP emrini iptal et
-        if existed and do_replace:
-            try:
-                oid = existed.get("orderId")
-                coid = existed.get("clientOrderId")
-                if oid or coid:
-                    self.router.cancel_order(symbol=symbol, order_id=oid, client_order_id=coid)
-                    self.logger.info(f"[TP] cancel old TP for {symbol} ({old_tp})")
-            except Exception as e:
-                self.logger.warning(f"[TP] cancel failed for {symbol}: {e}")
-
-        # 6) Yeni TAKE_PROFIT_MARKET emrini gönder
+            if not do_replace:
+                # mevcut TP yeterince yakın / debounce: borsaya gitme (kopya emir açma)
+                return self._unchanged(symbol, "debounce_or_min_move", old_tp)
+
+        # 5-6) Güncelle: LIMIT → amend; *_MARKET → önce yeni, sonra eski iptal; eski yoksa yeni
+        tp_type = self._tp_order_type()
+        old_oid = existed.get("orderId") if (existed and do_replace) else None
+        old_coid = existed.get("clientOrderId") if (existed and do_replace) else None
         try:
-            res = self.router.place_order(
-                symbol=symbol,
-                side=side_close,
-                qty=qty,
-                order_type="TAKE_PROFIT_MARKET",
-                stop_price=float(tp_price),
-                reduce_only=True,
-                tag="TP"
-            )
-
-            # 6.1) orderId bilgisini al
-            order_id = None
+            upd = getattr(self.router, "amend_or_replace", None)
+            px_kw = {"price": float(tp_price)} if tp_type == "LIMIT" else {"stop_price": float(tp_price)}
+            if callable(upd):
+                res = await self._acall(upd, symbol=symbol, side=side_close, qty=qty, order_type=tp_type,
+                                        order_id=old_oid, client_order_id=old_coid, reduce_only=True, tag="TP",
+                                        **px_kw)
+            else:
+                if old_oid or old_coid:
+                    try:
+                        cancel = getattr(self.router, "cancel_order_async", None) or self.router.cancel_order
+                        await self._acall(cancel, symbol=symbol, order_id=old_oid, client_order_id=old_coid)
+                        self.logger.info(f"[TP] cancel old TP for {symbol} ({old_tp})")
+                    except Exception as e:
+                        self.logger.warning(f"[TP] cancel failed for {symbol}: {e}")
+                place = getattr(self.router, "place_order_async", None) or self.router.place_order
+                res = await self._acall(place, symbol=symbol, side=side_close, qty=qty, order_type=tp_type,
+                                        reduce_only=True, tag="TP", **px_kw)
+
+            # 6.1) orderId / clientOrderId bilgisini al
+            order_id, client_id, mode = None, None, None
             try:
-                order_id = str(res.get("orderId") or res.get("order_id") or "")
+                order_id = str(res.get("orderId") or res.get("order_id") or "") or None
+                client_id = res.get("clientOrderId") or None
+                mode = res.get("_update_mode")
             except Exception:
-                order_id = None
+                pass
 
             # 6.2) zaman damgası ve log
             self._last_upsert_ts[symbol] = time.time()
-            self.logger.info(f"[TP] upsert {symbol} {side_close} tp={tp_price} qty={qty} replace={bool(existed and do_replace)}")
+            self.logger.info(
+                f"[TP] upsert {symbol} {side_close} tp={tp_price} qty={qty} replace={bool(existed and do_replace)} mode={mode or '-'}"
+            )
 
-            # 6.3) cache: TP seviyesi ve orderId
+            # 6.3) cache: TP seviyesi ve emir kimliği
             if hasattr(self.persistence, "cache_update_tp"):
                 try:
                     self.persistence.cache_update_tp(symbol, float(tp_price))
                 except Exception:
                     pass
 
-            if hasattr(self.persistence, "cache_update_tp_order_id") and order_id:
+            if order_id or client_id:
                 try:
-                    self.persistence.cache_update_tp_order_id(symbol, order_id)
+                    if hasattr(self.persistence, "cache_update_order_identity"):
+                        self.persistence.cache_update_order_identity(symbol, "tp", order_id, client_id)
+                    elif hasattr(self.persistence, "cache_update_tp_order_id") and order_id:
+                        self.persistence.cache_update_tp_order_id(symbol, order_id)
                 except Exception:
                     pass
 
@@ -349,6 +370,11 @@ class TakeProfitManager:
             self.logger.error(f"[TP] upsert failed for {symbol}: {e}")
             return None
 
+    def bind_bus(self, bus, idle_sec: float = 120.0):
+        """position_change/order_update gelince hemen hedef hesapla; olay yoksa idle_sec'te bir tur."""
+        self._sub = bus.subscribe("take_profit", types=("position_change", "order_update"), maxsize=256)
+        self._idle_sec = float(idle_sec)
+
     # -------------------- periyodik (otomatik) --------------------
     async def run(self, stop_event: asyncio.Event = None, poll_sec: int = None):
         """
@@ -379,7 +405,10 @@ class TakeProfitManager:
                     if not comp:
                         continue
                     side_close, target = comp
-                    self.upsert_take_profit(sym, side_close, target)
+                    await self.upsert_take_profit(sym, side_close, target)
             except Exception as e:
                 self.logger.error(f"TP loop error: {e}")
-            await asyncio.sleep(max(5, poll_sec))
+            if self._sub is not None:
+                await idle_wait(self._sub, max(5, poll_sec, self._idle_sec or 0))
+            else:
+                await asyncio.sleep(max(5, poll_sec))
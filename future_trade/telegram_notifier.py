@@ -2,12 +2,17 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 
+import asyncio
 import json
 import logging
-from typing import Any, Dict, Optional
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
 import re
 import aiohttp
 
+TG_MAX_LEN = 4096
+
 def escape_markdown_v2(text: str) -> str:
     """Telegram MarkdownV2 özel karakterlerini kaçır"""
     special_chars = '_*[]()~`>#+-=|{}.!'
@@ -19,6 +24,18 @@ class Notifier:
     Telegram bildirim yöneticisi.
     - alerts_bot ve trades_bot kanallarına gönderim
     - persistence varsa gönderilen tüm payload'ları notifications_log tablosuna yazar (ayna)
+
+    Outbox (bloklamayan gönderim):
+    - Çağıranlar (alert/info_trades/notify_*) mesajı kuyruğa atar ve hemen döner;
+      emir yolu Telegram round-trip'i beklemez.
+    - Arka plan worker'ı chat başına toplar; aynı parse_mode'lu ardışık mesajları
+      4096 karakteri aşmadan tek "digest" mesajda birleştirir.
+    - Hız limitleri: global `global_per_sec` (Telegram ~30 msg/s), chat başına
+      `per_chat_interval_sec` (~1 msg/s). 429'da retry_after'a uyulur.
+    - Aynı chat'e bekleyen özdeş metin tekrar gelirse tek mesaja indirilir (×N).
+    - notifications_log aynası tamponlanır ve toplu (executemany) yazılır.
+    cfg["outbox"]: {"max_pending", "global_per_sec", "per_chat_interval_sec",
+                    "log_flush_sec", "log_batch"}
     """
 
     # 1) Kurulum / bağımlılıklar
@@ -40,6 +57,25 @@ class Notifier:
         # aiohttp oturumu
         self._session: Optional[aiohttp.ClientSession] = None
 
+        # outbox
+        ob = tg.get("outbox") or {}
+        self._max_pending = int(ob.get("max_pending", 1000))
+        self._global_per_sec = max(1, int(ob.get("global_per_sec", 30)))
+        self._per_chat_interval = float(ob.get("per_chat_interval_sec", 1.0))
+        self._log_flush_sec = float(ob.get("log_flush_sec", 2.0))
+        self._log_batch = int(ob.get("log_batch", 50))
+
+        self._chats: Dict[Tuple[str, str], Deque[dict]] = {}   # (token, chat_id) → bekleyenler
+        self._chat_next_ok: Dict[Tuple[str, str], float] = {}
+        self._sent_ts: Deque[float] = deque()                  # son 1 sn'deki gönderimler
+        self._pending = 0
+        self._seq = 0                                          # kuyruğa giriş sırası (global, artan)
+        self.dropped = 0
+        self._wake: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._log_buf: List[tuple] = []
+        self._log_last_flush = time.monotonic()
+
     # 2) İç yardımcılar
     async def _ensure_session(self) -> aiohttp.ClientSession:
         if self._session is None:
@@ -49,17 +85,30 @@ class Notifier:
     def _mirror_to_db(self, channel: str, topic: str, level: str, payload: Dict[str, Any] | str) -> None:
         """
         Telegram'a gönderilen mesajların DB'ye aynalanması (opsiyonel).
+        Satırlar tamponlanır; worker (veya aclose) toplu yazar.
         """
+        if not self.persistence:
+            return
         try:
-            if self.persistence and hasattr(self.persistence, "log_notification"):
-                self.persistence.log_notification(channel=channel, topic=topic, level=level, payload=payload)
+            if not isinstance(payload, str):
+                payload = json.dumps(payload, ensure_ascii=False)
+            self._log_buf.append((int(time.time()), channel, topic, str(level).upper(), payload))
+            if len(self._log_buf) >= self._log_batch and self._worker is None:
+                self._flush_log_sync()   # worker yoksa tampon sınırsız büyümesin
         except Exception as e:
                 # DB aynalama tek başına kritik değil; log seviyesini düşük tut
                 self.logger.debug(f"notification mirror skipped: {e}")
 
+    def _flush_log_sync(self) -> None:
+        rows, self._log_buf = self._log_buf, []
+        self._log_last_flush = time.monotonic()
+        if rows:
+            self._write_rows(rows)
+
     async def _send(self, bot: Dict[str, Any], text: str, parse_mode: Optional[str] = None) -> None:
         """
-        Tek bir bota (token/chat_id) mesaj gönder.
+        Mesajı ilgili chat'in outbox kuyruğuna atar ve hemen döner (ağ beklemez).
+        Event loop yoksa (senkron bağlam) doğrudan gönderir.
         """
         token = bot.get("token")
         chat_id = bot.get("chat_id")
@@ -68,6 +117,149 @@ class Notifier:
             self.logger.debug("telegram config missing (token/chat_id)")
             return
 
+        if not self._ensure_worker():
+            await self._send_now(str(token), str(chat_id), text, parse_mode)
+            return
+
+        key = (str(token), str(chat_id))
+        q = self._chats.setdefault(key, deque())
+
+        # özdeş bekleyen mesaj → tek mesaja indir
+        for item in q:
+            if item["text"] == text and item["parse_mode"] == parse_mode:
+                item["count"] += 1
+                return
+
+        if self._pending >= self._max_pending:
+            self._drop_oldest()
+        self._seq += 1
+        q.append({"text": text, "parse_mode": parse_mode, "count": 1, "seq": self._seq})
+        self._pending += 1
+        self._wake.set()
+
+    def _ensure_worker(self) -> bool:
+        """Arka plan worker'ını (çalışan loop varsa) tembel başlatır."""
+        if self._worker is not None and not self._worker.done():
+            return True
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return False
+        self._wake = self._wake or asyncio.Event()
+        self._worker = asyncio.create_task(self._run_outbox(), name="notifier_outbox")
+        return True
+
+    def _drop_oldest(self) -> None:
+        """Tüm chat kuyruklarının başları (kuyruk içi FIFO) arasından en erken kuyruğa gireni düşürür."""
+        oldest = min((q for q in self._chats.values() if q), key=lambda q: q[0]["seq"], default=None)
+        if oldest:
+            oldest.popleft()
+            self._pending -= 1
+            self.dropped += 1
+            self.logger.warning(f"[NOTIFY] outbox full; oldest message dropped (total={self.dropped})")
+
+    @staticmethod
+    def _with_count(text: str, count: int, parse_mode: Optional[str]) -> str:
+        if count <= 1:
+            return text
+        suffix = f"(×{count})"
+        if parse_mode == "MarkdownV2":
+            suffix = escape_markdown_v2(suffix)
+        return f"{text}\n{suffix}"
+
+    def _take_digest(self, q: Deque[dict]) -> Tuple[str, Optional[str], int]:
+        """
+        Kuyruğun başından aynı parse_mode'lu mesajları TG_MAX_LEN'i aşmadan birleştirir.
+        Dönüş: (text, parse_mode, mesaj_sayısı)
+        """
+        first = q.popleft()
+        parse_mode = first["parse_mode"]
+        parts = [self._with_count(first["text"], first["count"], parse_mode)]
+        size = len(parts[0])
+        while q and q[0]["parse_mode"] == parse_mode:
+            nxt = self._with_count(q[0]["text"], q[0]["count"], parse_mode)
+            if size + 2 + len(nxt) > TG_MAX_LEN:
+                break
+            q.popleft()
+            parts.append(nxt)
+            size += 2 + len(nxt)
+        return "\n\n".join(parts), parse_mode, len(parts)
+
+    async def _run_outbox(self) -> None:
+        while True:
+            try:
+                now = time.monotonic()
+
+                # notifications_log toplu yazım
+                if self._log_buf and (len(self._log_buf) >= self._log_batch
+                                      or now - self._log_last_flush >= self._log_flush_sec):
+                    rows, self._log_buf = self._log_buf, []
+                    self._log_last_flush = now
+                    await asyncio.to_thread(self._write_rows, rows)
+
+                # global hız limiti (kayan 1 sn penceresi)
+                while self._sent_ts and now - self._sent_ts[0] >= 1.0:
+                    self._sent_ts.popleft()
+                if len(self._sent_ts) >= self._global_per_sec:
+                    await asyncio.sleep(max(0.0, 1.0 - (now - self._sent_ts[0])))
+                    continue
+
+                # gönderime hazır chat
+                ready = None
+                wait = self._log_flush_sec if self._log_buf else 60.0
+                for key, q in self._chats.items():
+                    if not q:
+                        continue
+                    nxt = self._chat_next_ok.get(key, 0.0)
+                    if nxt <= now:
+                        ready = key
+                        break
+                    wait = min(wait, nxt - now)
+
+                if ready is None:
+                    self._wake.clear()
+                    try:
+                        await asyncio.wait_for(self._wake.wait(), timeout=max(0.01, wait))
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+                q = self._chats[ready]
+                head_seq = q[0]["seq"]
+                text, parse_mode, n = self._take_digest(q)
+                self._pending -= n
+                self._chat_next_ok[ready] = now + self._per_chat_interval
+                self._sent_ts.append(now)
+
+                retry_after = await self._send_now(ready[0], ready[1], text, parse_mode)
+                if retry_after:
+                    # 429: chat'i bekletip digest'i başa geri koy
+                    self._chat_next_ok[ready] = time.monotonic() + retry_after
+                    q.appendleft({"text": text, "parse_mode": parse_mode, "count": 1, "seq": head_seq})
+                    self._pending += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.warning(f"[NOTIFY] outbox worker error: {e}")
+                await asyncio.sleep(1.0)
+
+    def _write_rows(self, rows: List[tuple]) -> None:
+        if not self.persistence:
+            return
+        try:
+            if hasattr(self.persistence, "log_notifications_bulk"):
+                self.persistence.log_notifications_bulk(rows)
+            elif hasattr(self.persistence, "log_notification"):
+                for _ts, channel, topic, level, payload in rows:
+                    self.persistence.log_notification(channel=channel, topic=topic, level=level, payload=payload)
+        except Exception as e:
+            self.logger.debug(f"notification mirror flush skipped: {e}")
+
+    async def _send_now(self, token: str, chat_id: str, text: str, parse_mode: Optional[str] = None) -> Optional[float]:
+        """
+        Tek bir bota (token/chat_id) mesajı gerçekten gönderir.
+        Dönüş: 429 alınırsa beklenecek saniye, aksi halde None.
+        """
         api_url = f"https://api.telegram.org/bot{token}/sendMessage"
         payload = {
             "chat_id": str(chat_id),
@@ -81,11 +273,18 @@ class Notifier:
             sess = await self._ensure_session()
             async with sess.post(api_url, json=payload) as resp:
                 # telegram çoğu zaman 200 döner; problemde hata logla
+                if resp.status == 429:
+                    try:
+                        body = await resp.json(content_type=None)
+                        return float((body.get("parameters") or {}).get("retry_after", 1))
+                    except Exception:
+                        return 1.0
                 if resp.status >= 300:
                     body = await resp.text()
                     self.logger.warning(f"telegram send {resp.status}: {body}")
         except Exception as e:
             self.logger.warning(f"telegram send error: {e}")
+        return None
 
 
 
@@ -228,7 +427,20 @@ class Notifier:
         await self._send(self._trades, text, parse_mode="Markdown")
 
     # 5) Temizlik
-    async def aclose(self) -> None:
+    async def aclose(self, drain_timeout: float = 5.0) -> None:
+        # bekleyen mesajları kısa süre boşaltmayı dene
+        deadline = time.monotonic() + float(drain_timeout)
+        while self._pending > 0 and self._worker and not self._worker.done() and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        if self._worker:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._worker = None
+        self._flush_log_sync()
+
         if self._session:
             try:
                 await self._session.close()
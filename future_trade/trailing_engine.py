@@ -0,0 +1,273 @@
+# /opt/tradebot/future_trade/trailing_engine.py
+# -*- coding: utf-8 -*-
+"""
+Olay güdümlü trailing SL motoru.
+
+trailing_loop her turda SQLite'tan pozisyonları okuyup her pozisyon için StopManager'a
+(o da REST ile açık emirleri listeleyerek) gidiyordu. Bu motor:
+  - pozisyon başına trail durumunu (peak/trough, mevcut stop, son replace zamanı) RAM'de tutar,
+  - MarketStream tick dinleyicisiyle beslenir (on_tick),
+  - yalnız sıkılaştırma yönünde, min_move_pct ve debounce_sec yerelde sağlanınca borsaya gider.
+Borsa çağrısı sayısı = gerçek stop hareketi sayısı.
+on_tick senkron ve yalnız RAM hesabıdır; borsa değişikliği sembol başına tek uçuşlu (single-flight)
+bir asyncio görevinde await edilir — görev sürerken gelen tick'ler yeni istek açmaz.
+
+trailing.mode = "native" iken stop taşınmaz; pozisyon başına tek bir borsa-yerel
+TRAILING_STOP_MARKET konur (callbackRate = ATR·mult/fiyat ya da step_pct, %0.1–5'e kırpılır)
+ve yalnız ATR rejimi değiştiğinde (|Δcallback| ≥ native_regime_step) yenilenir.
+activationPrice, trailing seviyesi ilk SL'yi geçtiği fiyata konur; o ana dek mevcut SL korur.
+"""
+from __future__ import annotations
+
+import asyncio
+import inspect
+import logging
+import time
+from typing import Any, Callable, Dict, Optional
+
+from future_trade.event_bus import idle_wait
+
+
+class TrailingEngine:
+    def __init__(self, cfg: Dict[str, Any], stop_manager, persistence, get_atr: Optional[Callable] = None,
+                 get_price: Optional[Callable] = None, logger=None):
+        tr = (cfg or {}).get("trailing", {}) or {}
+        self.type = (tr.get("type") or "step_pct").lower()
+        self.mode = (tr.get("mode") or "emulated").lower()
+        self.native_regime_step = float(tr.get("native_regime_step", 0.2))
+        self.atr_period = int(tr.get("atr_period", 14))
+        self.atr_mult = float(tr.get("atr_mult", 2.5))
+        self.step_pct = float(tr.get("step_pct", 0.1))
+        self.min_move_pct = float(tr.get("min_move_pct", 0.05))
+        self.debounce_sec = float(tr.get("debounce_sec", 15))
+        self.resync_sec = float(tr.get("resync_sec", 15))
+        self.atr_refresh_sec = float(tr.get("atr_refresh_sec", 30))
+
+        self.stop_manager = stop_manager
+        self.persistence = persistence
+        self.get_atr = get_atr
+        self.get_price = get_price
+        self.logger = logger or logging.getLogger("trailing_engine")
+
+        # {symbol: {"side","qty","extreme","stop","order_id","last_replace"}}
+        self._state: Dict[str, Dict[str, Any]] = {}
+        self._atr: Dict[str, tuple] = {}      # {symbol: (ts, atr)}
+        self._inflight: Dict[str, asyncio.Task] = {}   # {symbol: borsa görevi} (single-flight)
+        self._sub = None                      # position_change aboneliği (bind_bus)
+
+    # ---------- pozisyon senkronu (yalnız yerel DB) ----------
+    def sync_positions(self) -> None:
+        try:
+            rows = self.persistence.list_open_positions() or []
+        except Exception as e:
+            self.logger.debug(f"[TRAIL] list positions failed: {e}")
+            return
+        seen = set()
+        for p in rows:
+            sym = p.get("symbol")
+            side = (p.get("side") or "").upper()
+            if not sym or side not in ("LONG", "SHORT"):
+                continue
+            seen.add(sym)
+            st = self._state.get(sym)
+            if st is None or st["side"] != side:
+                st = {"side": side, "extreme": None, "stop": p.get("sl"),
+                      "order_id": p.get("sl_order_id"), "last_replace": 0.0,
+                      "trail_order_id": p.get("trail_order_id"), "trail_client_id": p.get("trail_client_id"),
+                      "trail_cb": p.get("trail_cb")}
+                self._state[sym] = st
+            st["qty"] = abs(float(p.get("qty") or 0.0))
+            if p.get("sl") is not None and st["stop"] is None:
+                st["stop"] = float(p["sl"])
+        for sym in list(self._state):
+            if sym not in seen:
+                self._state.pop(sym, None)
+
+    def forget(self, symbol: str) -> None:
+        self._state.pop(symbol, None)
+
+    # ---------- borsa görevleri ----------
+    @staticmethod
+    async def _acall(fn, *args, **kwargs):
+        res = fn(*args, **kwargs)
+        if inspect.isawaitable(res):
+            res = await res
+        return res
+
+    def _busy(self, symbol: str) -> bool:
+        t = self._inflight.get(symbol)
+        return t is not None and not t.done()
+
+    def _spawn(self, symbol: str, coro) -> None:
+        """Sembol başına tek görev; bitince kayıt silinir."""
+        t = asyncio.get_running_loop().create_task(coro, name=f"trail_{symbol}")
+        self._inflight[symbol] = t
+
+        def _done(task, sym=symbol):
+            if self._inflight.get(sym) is task:
+                self._inflight.pop(sym, None)
+        t.add_done_callback(_done)
+
+    # ---------- hesap ----------
+    def _atr_value(self, symbol: str, now: float) -> Optional[float]:
+        if self.type != "atr" or not callable(self.get_atr):
+            return None
+        hit = self._atr.get(symbol)
+        if hit and now - hit[0] < self.atr_refresh_sec:
+            return hit[1]
+        try:
+            v = self.get_atr(symbol, self.atr_period)
+            v = float(v) if v else None
+        except Exception:
+            v = None
+        self._atr[symbol] = (now, v)
+        return v
+
+    def _candidate(self, st: Dict[str, Any], symbol: str, now: float) -> float:
+        ext = st["extreme"]
+        atr = self._atr_value(symbol, now)
+        if st["side"] == "LONG":
+            return ext - self.atr_mult * atr if atr and atr > 0 else ext * (1.0 - self.step_pct / 100.0)
+        return ext + self.atr_mult * atr if atr and atr > 0 else ext * (1.0 + self.step_pct / 100.0)
+
+    # ---------- tick ----------
+    def on_tick(self, symbol: str, price: float, ts: Optional[float] = None) -> None:
+        st = self._state.get(symbol)
+        if st is None or not price or price <= 0 or st.get("qty", 0) <= 0:
+            return
+        price = float(price)
+        if self.mode == "native":
+            st["last_px"] = price
+            if not self._has_native(st):
+                self._maybe_native(symbol, st, float(ts or time.time()))
+            return
+        long_ = st["side"] == "LONG"
+
+        ext = st["extreme"]
+        if ext is None or (price > ext if long_ else price < ext):
+            st["extreme"] = price
+
+        now = float(ts or time.time())
+        cand = self._candidate(st, symbol, now)
+        cur = st["stop"]
+
+        if cur is not None:
+            if (cand <= cur) if long_ else (cand >= cur):
+                return  # yalnız sıkılaştırma
+            if abs(cand - cur) / price * 100.0 < self.min_move_pct:
+                return
+        if now - st["last_replace"] < self.debounce_sec:
+            return
+        if self._busy(symbol):
+            return
+        st["last_replace"] = now       # görev açılırken debounce başlar (başarısızlıkta da: hata fırtınası yok)
+        self._spawn(symbol, self._replace(symbol, st, cand))
+
+    async def _replace(self, symbol: str, st: Dict[str, Any], new_stop: float) -> None:
+        side_close = "SELL" if st["side"] == "LONG" else "BUY"
+        try:
+            res = await self._acall(
+                self.stop_manager.replace_stop,
+                symbol, side_close, float(new_stop), st["qty"], old_order_id=st.get("order_id"),
+            )
+        except Exception as e:
+            self.logger.warning(f"[TRAIL] replace failed for {symbol}: {e}")
+            res = None
+        if res is None:
+            return
+        st["stop"] = float(new_stop)
+        try:
+            oid = res.get("orderId") or res.get("order_id")
+            st["order_id"] = str(oid) if oid else None
+        except Exception:
+            st["order_id"] = None
+        self.logger.info(f"[TRAIL] {symbol} {st['side']} stop→{new_stop:.8g} (ext={st['extreme']:.8g})")
+
+    # ---------- native TRAILING_STOP_MARKET ----------
+    def _native_callback(self, symbol: str, price: float, now: float) -> float:
+        atr = self._atr_value(symbol, now)
+        cb = (self.atr_mult * atr / price * 100.0) if (atr and price > 0) else self.step_pct
+        return round(min(5.0, max(0.1, cb)), 1)
+
+    @staticmethod
+    def _has_native(st: Dict[str, Any]) -> bool:
+        return bool(st.get("trail_order_id") or st.get("trail_client_id"))
+
+    def _maybe_native(self, symbol: str, st: Dict[str, Any], now: float) -> None:
+        """Senkron karar; gerekirse borsa işi tek uçuşlu göreve devredilir."""
+        price = st.get("last_px")
+        if not price and callable(self.get_price):
+            try:
+                price = float(self.get_price(symbol) or 0.0)
+            except Exception:
+                price = 0.0
+        if not price or price <= 0 or self._busy(symbol):
+            return
+        cb = self._native_callback(symbol, price, now)
+        cur_cb = st.get("trail_cb")
+        if self._has_native(st) and cur_cb is not None and abs(cb - float(cur_cb)) < self.native_regime_step:
+            return  # rejim aynı → borsadaki emir kalır
+        if now - st["last_replace"] < self.debounce_sec:
+            return  # başarısız ilk yerleştirme de her tick'te tekrar denenmez
+        st["last_replace"] = now
+        self._spawn(symbol, self._place_native(symbol, st, price, cb))
+
+    async def _place_native(self, symbol: str, st: Dict[str, Any], price: float, cb: float) -> None:
+        cur_cb = st.get("trail_cb")
+        # activationPrice: trailing seviyesi mevcut SL'den sıkı olana dek mevcut SL korur
+        act = None
+        sl = st.get("stop")
+        if sl:
+            if st["side"] == "LONG":
+                act = float(sl) / (1.0 - cb / 100.0)
+                act = act if act > price else None
+            else:
+                act = float(sl) / (1.0 + cb / 100.0)
+                act = act if act < price else None
+
+        side_close = "SELL" if st["side"] == "LONG" else "BUY"
+        try:
+            res = await self._acall(
+                self.stop_manager.place_native_trailing,
+                symbol, side_close, st["qty"], cb, activation_price=act,
+                old_order_id=st.get("trail_order_id"), old_client_order_id=st.get("trail_client_id"),
+            )
+        except Exception as e:
+            self.logger.warning(f"[TRAIL] native trailing failed for {symbol}: {e}")
+            res = None
+        if res is None:
+            return
+        try:
+            oid = res.get("orderId") or res.get("order_id")
+            coid = res.get("clientOrderId")
+        except Exception:
+            oid, coid = None, None
+        # yer tutucu yazılmaz: orderId yoksa gönderilen clientOrderId ile iptal edilir
+        st["trail_order_id"] = str(oid) if oid else None
+        st["trail_client_id"] = coid or None
+        st["trail_cb"] = cb
+        self.logger.info(f"[TRAIL] {symbol} native cb={cb}% act={act} (prev cb={cur_cb})")
+
+    def check_regimes(self) -> None:
+        """Native modda ATR rejim kontrolü (resync turunda; tick başına değil)."""
+        if self.mode != "native":
+            return
+        now = time.time()
+        for sym, st in list(self._state.items()):
+            if st.get("qty", 0) > 0:
+                self._maybe_native(sym, st, now)
+
+    # ---------- yaşam döngüsü ----------
+    def bind_bus(self, bus) -> None:
+        """position_change gelince resync beklenmeden pozisyonlar yeniden okunur."""
+        self._sub = bus.subscribe("trailing_engine", types=("position_change",), maxsize=64)
+
+    async def run(self, stop_event: asyncio.Event = None):
+        """Yerel pozisyon senkronu (REST yok); tick'ler on_tick ile gelir."""
+        while not (stop_event and stop_event.is_set()):
+            self.sync_positions()
+            self.check_regimes()
+            await idle_wait(self._sub, max(1.0, self.resync_sec))
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        return {k: dict(v) for k, v in self._state.items()}
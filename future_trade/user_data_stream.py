@@ -28,6 +28,8 @@ class UserDataStream:
         logger: Optional[logging.Logger] = None,
         ws_base_url: Optional[str] = None,
         risk=None,                     # RiskManager (opsiyonel, kullanılmıyor
+        bus=None,                      # EventBus (opsiyonel): order_update/account_update/position_change
+        equity_tracker=None,           # EquityTracker (opsiyonel): ACCOUNT_UPDATE → cüzdan/pozisyon
     ):
         self.client = client
         self.notifier = notifier
@@ -44,6 +46,8 @@ class UserDataStream:
         self._stop = asyncio.Event()
         self._keepalive_task: Optional[asyncio.Task] = None
         self.risk = risk  # RiskManager (opsiyonel, kullanılmıyor
+        self.bus = bus
+        self.equity_tracker = equity_tracker
 
     # ------------- lifecycle -------------
     async def _create_or_refresh_key(self) -> str:
@@ -141,6 +145,7 @@ class UserDataStream:
         """
         try:
             et = data.get("e")
+            self._publish(et, data)
             if et == "ACCOUNT_UPDATE":
                 self._on_account_update(data)
             elif et == "ORDER_TRADE_UPDATE":
@@ -154,33 +159,58 @@ class UserDataStream:
         except Exception as e:
             self.logger.error(f"[UDS] handle error: {e}")
 
-    # ------------- handlers -------------
-        def _on_account_update(self, data: Dict[str, Any]):
-            """
-            ACCOUNT_UPDATE (Futures):
-            data["a"]["B"] = [{"a":"USDT","wb":"...","cw":"..."} , ...]
-            Burada "cw" (crossWalletBalance) pratikte anlık kullanılabilir bakiyeye en yakın değerdir.
-            İzole pozisyonlarda sembol bazlı farklar olabilir; approx kabul ederek cache'e yazarız.
-            """
-            try:
+    def _publish(self, et: Optional[str], data: Dict[str, Any]) -> None:
+        """Ham UDS mesajını veriyoluna tipli olay olarak aktar (abone yoksa maliyetsiz)."""
+        bus = self.bus
+        if bus is None:
+            return
+        try:
+            ts = int(data.get("E") or 0)
+            if et == "ORDER_TRADE_UPDATE":
+                o = data.get("o") or {}
+                bus.publish({"type": "order_update", "symbol": o.get("s"), "status": (o.get("X") or "").upper(),
+                             "order_type": (o.get("ot") or "").upper(), "order_id": str(o.get("i") or ""),
+                             "client_id": o.get("c"), "reduce_only": bool(o.get("R")), "time": ts, "raw": o})
+            elif et == "ACCOUNT_UPDATE":
                 a = data.get("a") or {}
-                balances = a.get("B") or []
-                usdt = None
-                for b in balances:
-                    if str(b.get("a")).upper() == "USDT":
-                        usdt = b
-                        break
-                if not usdt:
-                    return
-                # wb: wallet balance, cw: cross wallet balance
-                wb = float(usdt.get("wb") or 0.0)
-                cw = float(usdt.get("cw") or wb)
-                approx_available = cw  # approx olarak cw'yi alıyoruz
-                if getattr(self, "risk", None) and hasattr(self.risk, "update_balance_cache"):
-                    self.risk.update_balance_cache(approx_available)
-                    self.logger.debug(f"[UDS] ACCOUNT_UPDATE → cache avail={approx_available:.4f}")
-            except Exception as e:
-                self.logger.debug(f"[UDS] account_update parse error: {e}")
+                bus.publish({"type": "account_update", "reason": a.get("m"), "balances": a.get("B") or [],
+                             "time": ts})
+                for p in a.get("P") or []:
+                    bus.publish({"type": "position_change", "symbol": p.get("s"),
+                                 "qty": float(p.get("pa") or 0.0), "entry_price": float(p.get("ep") or 0.0),
+                                 "position_side": p.get("ps"), "time": ts})
+        except Exception as e:
+            self.logger.debug(f"[UDS] bus publish failed: {e}")
+
+    # ------------- handlers -------------
+    def _on_account_update(self, data: Dict[str, Any]):
+        """
+        ACCOUNT_UPDATE (Futures):
+        data["a"]["B"] = [{"a":"USDT","wb":"...","cw":"..."} , ...]
+        Burada "cw" (crossWalletBalance) pratikte anlık kullanılabilir bakiyeye en yakın değerdir.
+        İzole pozisyonlarda sembol bazlı farklar olabilir; approx kabul ederek cache'e yazarız.
+        """
+        try:
+            a = data.get("a") or {}
+            balances = a.get("B") or []
+            usdt = None
+            for b in balances:
+                if str(b.get("a")).upper() == "USDT":
+                    usdt = b
+                    break
+            if self.equity_tracker is not None:
+                self.equity_tracker.on_account_update(data)
+            if not usdt:
+                return
+            # wb: wallet balance, cw: cross wallet balance
+            wb = float(usdt.get("wb") or 0.0)
+            cw = float(usdt.get("cw") or wb)
+            approx_available = cw  # approx olarak cw'yi alıyoruz
+            if getattr(self, "risk", None) and hasattr(self.risk, "update_balance_cache"):
+                self.risk.update_balance_cache(approx_available)
+                self.logger.debug(f"[UDS] ACCOUNT_UPDATE → cache avail={approx_available:.4f}")
+        except Exception as e:
+            self.logger.debug(f"[UDS] account_update parse error: {e}")
 
 
     def _on_order_trade_update(self, data: Dict[str, Any]):
@@ -0,0 +1,198 @@
+# /opt/tradebot/globalislemler/core/index_feed.py
+# -*- coding: utf-8 -*-
+"""
+Global endeks snapshot'ı için bellek eşlemli (mmap) yayın kanalı.
+
+Kolektör (database_manager_5.py) her döngüde TOTAL3 / USDT.D / BTC.D için
+her timeframe'in son close + EMA20 değerini sabit boyutlu küçük bir dosyaya yazar;
+futures botu (MarketStream) aynı dosyayı kilitsiz okur.
+
+Dosya düzeni (little-endian, sabit boyut):
+    header : magic(4s) version(H) count(H) seq(Q) published_at(d)
+    kayıt  : close(d) ema20(d) bucket_ts(q)   × len(INDEX_KEYS) × len(TIMEFRAMES)
+
+Tutarlılık "seqlock" ile sağlanır: yazar önce seq'i tek sayıya çeker, kayıtları yazar,
+sonra seq'i çift sayıya çeker. Okur seq tek ise ya da okuma öncesi/sonrası seq
+farklıysa tekrar dener; böylece yarım yazılmış snapshot asla döndürülmez.
+"""
+from __future__ import annotations
+
+import math
+import mmap
+import os
+import struct
+import time
+from typing import Any, Dict, List, Optional
+
+DEFAULT_FEED_PATH = os.getenv("TRADEBOT_INDEX_FEED", "/dev/shm/tradebot_index_feed.bin")
+
+INDEX_KEYS = ("TOTAL3", "USDT.D", "BTC.D")
+TIMEFRAMES = ("15m", "1h", "4h", "1d")
+
+_MAGIC = b"TBIX"
+_VERSION = 1
+_HEADER = struct.Struct("<4sHHQd")
+_RECORD = struct.Struct("<ddq")
+_SEQ_OFFSET = 8            # magic(4) + version(2) + count(2)
+_SEQ = struct.Struct("<Q")
+_COUNT = len(INDEX_KEYS) * len(TIMEFRAMES)
+FEED_SIZE = _HEADER.size + _RECORD.size * _COUNT
+
+
+def index_key(symbol: str) -> str:
+    """'CRYPTOCAP:TOTAL3' → 'TOTAL3'"""
+    return symbol.split(":", 1)[-1].upper()
+
+
+def compute_ema(values: List[float], period: int = 20) -> Optional[float]:
+    """MarketStream._ema ile aynı tanım: ilk değerle tohumlanan klasik EMA."""
+    if not values or len(values) < period:
+        return None
+    k = 2.0 / (period + 1.0)
+    e = values[0]
+    for v in values[1:]:
+        e = v * k + e * (1.0 - k)
+    return e
+
+
+class IndexFeedWriter:
+    """Kolektör tarafı: snapshot'ı mmap dosyasına yazar (tek yazar varsayılır)."""
+
+    def __init__(self, path: str = DEFAULT_FEED_PATH):
+        self.path = path
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size != FEED_SIZE:
+                os.ftruncate(fd, FEED_SIZE)
+            self._mm = mmap.mmap(fd, FEED_SIZE, access=mmap.ACCESS_WRITE)
+        finally:
+            os.close(fd)
+
+        # Yeniden başlatmada seq geriye gitmesin (okurlar seq değişimine bakar)
+        magic, version, _count, seq, _ts = _HEADER.unpack_from(self._mm, 0)
+        self._seq = int(seq) if (magic == _MAGIC and version == _VERSION) else 0
+        if self._seq % 2:
+            self._seq += 1
+
+    @property
+    def seq(self) -> int:
+        return self._seq
+
+    def publish(self, snapshot: Dict[str, Dict[str, Dict[str, Any]]]) -> int:
+        """
+        snapshot: {"TOTAL3": {"15m": {"close": float, "ema20": float|None, "bucket": int}, ...}, ...}
+        Eksik anahtarlar close=0, ema20=None olarak yazılır. Yeni seq döner.
+        """
+        mm = self._mm
+        self._seq += 1                                   # tek → yazım sürüyor
+        _SEQ.pack_into(mm, _SEQ_OFFSET, self._seq)
+
+        off = _HEADER.size
+        for key in INDEX_KEYS:
+            per_tf = snapshot.get(key) or {}
+            for tf in TIMEFRAMES:
+                rec = per_tf.get(tf) or {}
+                ema = rec.get("ema20")
+                _RECORD.pack_into(
+                    mm, off,
+                    float(rec.get("close") or 0.0),
+                    float(ema) if ema is not None else math.nan,
+                    int(rec.get("bucket") or 0),
+                )
+                off += _RECORD.size
+
+        self._seq += 1                                   # çift → tutarlı
+        _HEADER.pack_into(mm, 0, _MAGIC, _VERSION, _COUNT, self._seq, time.time())
+        return self._seq
+
+    def close(self) -> None:
+        try:
+            self._mm.close()
+        except Exception:
+            pass
+
+
+class IndexFeedReader:
+    """
+    Futures tarafı: snapshot'ı kilitsiz okur.
+    - Dosya yoksa/uyumsuzsa/bayatsa read() None döner (çağıran DB'ye düşebilir).
+    - seq değişmediyse önceki parse sonucu döner (8 baytlık okuma).
+    """
+
+    def __init__(self, path: str = DEFAULT_FEED_PATH, max_age_sec: float = 180.0, retries: int = 5):
+        self.path = path
+        self.max_age_sec = float(max_age_sec)
+        self.retries = int(retries)
+        self._mm: Optional[mmap.mmap] = None
+        self._last_seq: Optional[int] = None
+        self._last: Optional[Dict[str, Any]] = None
+
+    def _open(self) -> bool:
+        if self._mm is not None:
+            return True
+        try:
+            fd = os.open(self.path, os.O_RDONLY)
+        except OSError:
+            return False
+        try:
+            if os.fstat(fd).st_size < FEED_SIZE:
+                return False
+            self._mm = mmap.mmap(fd, FEED_SIZE, access=mmap.ACCESS_READ)
+            return True
+        except Exception:
+            return False
+        finally:
+            os.close(fd)
+
+    def read(self) -> Optional[Dict[str, Any]]:
+        """
+        Dönüş: {"seq": int, "published_at": float,
+                "indices": {"TOTAL3": {"tf1h": {"close", "ema20", "bucket"}, ...}, ...}}
+        """
+        if not self._open():
+            return None
+        mm = self._mm
+        for _ in range(max(1, self.retries)):
+            (seq1,) = _SEQ.unpack_from(mm, _SEQ_OFFSET)
+            if seq1 % 2:
+                continue
+            if seq1 == self._last_seq and self._last is not None:
+                return self._last if self._is_fresh(self._last) else None
+            raw = mm[:FEED_SIZE]
+            (seq2,) = _SEQ.unpack_from(mm, _SEQ_OFFSET)
+            if seq1 != seq2:
+                continue
+
+            magic, version, count, seq, published_at = _HEADER.unpack_from(raw, 0)
+            if magic != _MAGIC or version != _VERSION or count != _COUNT:
+                return None
+
+            indices: Dict[str, Dict[str, Any]] = {}
+            off = _HEADER.size
+            for key in INDEX_KEYS:
+                per_tf: Dict[str, Any] = {}
+                for tf in TIMEFRAMES:
+                    close, ema, bucket = _RECORD.unpack_from(raw, off)
+                    off += _RECORD.size
+                    per_tf[f"tf{tf}"] = {
+                        "close": close,
+                        "ema20": None if math.isnan(ema) else ema,
+                        "bucket": bucket,
+                    }
+                indices[key] = per_tf
+
+            self._last_seq = int(seq)
+            self._last = {"seq": int(seq), "published_at": float(published_at), "indices": indices}
+            return self._last if self._is_fresh(self._last) else None
+        return None
+
+    def _is_fresh(self, snap: Dict[str, Any]) -> bool:
+        return (time.time() - float(snap.get("published_at") or 0.0)) <= self.max_age_sec
+
+    def close(self) -> None:
+        try:
+            if self._mm is not None:
+                self._mm.close()
+        except Exception:
+            pass
+        self._mm = None
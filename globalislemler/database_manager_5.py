@@ -50,6 +50,9 @@ import requests
 
 # Playwright (aktif kullanım için)
 from playwright.async_api import async_playwright, TimeoutError as PWTimeout
+
+# Futures botuna mmap üzerinden endeks snapshot yayını
+from core.index_feed import IndexFeedWriter, DEFAULT_FEED_PATH, TIMEFRAMES as FEED_TIMEFRAMES, compute_ema, index_key
 print("✅ Script başladı")
 # ─────────────────────────────────────────────
 # 📁 Merkezî Yol Sabitleri (ENV ile override edilebilir)
@@ -81,6 +84,18 @@ RECORD_LIMITS = {
     "global_close_15m": 100000,
     "global_close_1h":  50000,
     "global_close_4h":  30000,
+    "global_ohlc_15m":  100000,
+    "global_ohlc_1h":   50000,
+    "global_ohlc_4h":   30000,
+    "global_ohlc_1d":   10000,
+}
+
+# 🕯️ OHLC rollup tabloları (tf → tablo). Fiyat geldikçe artımlı güncellenir.
+OHLC_TABLES = {
+    "15m": "global_ohlc_15m",
+    "1h":  "global_ohlc_1h",
+    "4h":  "global_ohlc_4h",
+    "1d":  "global_ohlc_1d",
 }
 
 # ─────────────────────────────────────────────
@@ -114,6 +129,7 @@ INTERVAL_DUPLICATE_CHECK = {
 LIVE_TABLE_NAME = "global_live_data"
 LIVE_PRICE_COL  = "live_price"
 LIVE_TS_COL     = "timestamp"
+LIVE_EPOCH_COL  = "ts_utc"      # INTEGER epoch (UTC); indeksli okumalar bu kolonu kullanır
 
 TIMEFRAME_SECONDS = {
     "15m": 15 * 60,
@@ -372,8 +388,12 @@ def collect_health_snapshot(conn, cursor, symbols: list[str]) -> Dict[str, Any]:
     }
 
     # global_live_data
-    last_live = _max_int(cursor,
-        "SELECT MAX(COALESCE(ts_utc, CAST(strftime('%s', timestamp) AS INTEGER))) FROM global_live_data")
+    # sembol başına MAX(ts_utc) → (symbol, ts_utc, ...) indeksinden tek adımda okunur
+    last_live = None
+    for sym in symbols:
+        v = _max_int(cursor, "SELECT MAX(ts_utc) FROM global_live_data WHERE symbol = ?", (sym,))
+        if v is not None and (last_live is None or v > last_live):
+            last_live = v
     live_rows = _count_int(cursor, "SELECT COUNT(*) FROM global_live_data")
     snapshot["db"]["live"] = {
         "last_ts": last_live,
@@ -398,6 +418,16 @@ def collect_health_snapshot(conn, cursor, symbols: list[str]) -> Dict[str, Any]:
             "rows": rows,
         }
 
+    # OHLC rollup kovaları
+    snapshot["db"]["ohlc"] = {}
+    for tf, tbl in OHLC_TABLES.items():
+        last_bucket = _max_int(cursor, f"SELECT MAX(ts_bucket_utc) FROM {tbl}")
+        snapshot["db"]["ohlc"][tf] = {
+            "last_bucket": last_bucket,
+            "last_age_sec": (now_epoch - last_bucket) if last_bucket else None,
+            "rows": _count_int(cursor, f"SELECT COUNT(*) FROM {tbl}"),
+        }
+
     # 1D kapanışlar (global_closing_data)
     last_1d = _max_int(cursor, """
         SELECT MAX(CAST(strftime('%s', timestamp) AS INTEGER))
@@ -690,6 +720,163 @@ def send_telegram_message(message: str, bot_name: str, bots: dict, retries: int
             raise Exception(f"Failed to send Telegram message for '{bot_name}' after {retries} tries (part {idx}).")
 
 
+# ─────────────────────────────────────────────────────────────
+# Asenkron Telegram outbox (event loop asla Telegram'ı beklemez)
+# ─────────────────────────────────────────────────────────────
+class TelegramOutbox:
+    """
+    Async kodun çağırdığı bildirimleri kuyruğa alır; arka plan görevi gönderir.
+      - enqueue() anında döner (ağ yok, sleep yok)
+      - Bot(chat) başına en az `per_chat_interval_sec` aralık (Telegram ~1 msg/s/chat)
+      - Aynı metin, gönderilmeyi beklerken tekrar gelirse birleştirilir (×N);
+        gönderildikten sonra `coalesce_sec` içinde tekrar gelirse bastırılır ve
+        pencere dolunca tek mesaj olarak (×N) iletilir
+      - Bellek sınırlı: toplam bekleyen > max_pending olursa en eski mesaj düşer
+      - Gönderim, mevcut dayanıklı send_telegram_message ile thread'de yapılır
+    """
+
+    def __init__(self, bots: dict, max_pending: int = 200,
+                 per_chat_interval_sec: float = 1.0, coalesce_sec: float = 300.0):
+        self.bots = bots or {}
+        self.max_pending = max(1, int(max_pending))
+        self.per_chat_interval_sec = float(per_chat_interval_sec)
+        self.coalesce_sec = float(coalesce_sec)
+
+        self._queues: Dict[str, List[dict]] = {}        # bot_name → [{"text","count","bot","ts"}]
+        self._pending: Dict[Tuple[str, str], dict] = {}  # (bot, text) → kuyruktaki kayıt
+        self._recent: Dict[Tuple[str, str], float] = {}  # (bot, text) → son gönderim ts
+        self._suppressed: Dict[Tuple[str, str], int] = {}
+        self._next_ok: Dict[str, float] = {}             # bot_name → bir sonraki izinli gönderim
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.dropped = 0
+        self.sent = 0
+
+    # ---- dış API ----
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="telegram_outbox")
+
+    def enqueue(self, message: str, bot_name: str) -> None:
+        if message is None or not str(message).strip():
+            return
+        text = str(message)
+        key = (bot_name, text)
+        now = time.monotonic()
+
+        rec = self._pending.get(key)
+        if rec is not None:                   # henüz gönderilmedi → birleştir
+            rec["count"] += 1
+            return
+        last = self._recent.get(key)
+        if last is not None and (now - last) < self.coalesce_sec:
+            self._suppressed[key] = self._suppressed.get(key, 0) + 1
+            self._wake.set()                  # worker pencere bitişine göre uyansın
+            return
+
+        if sum(len(q) for q in self._queues.values()) >= self.max_pending:
+            self._drop_oldest()
+        rec = {"text": text, "count": 1, "bot": bot_name, "ts": now}
+        self._queues.setdefault(bot_name, []).append(rec)
+        self._pending[key] = rec
+        self._wake.set()
+
+    async def aclose(self, timeout: float = 5.0) -> None:
+        """Bekleyenleri kısa süre boşaltmayı dener, sonra görevi kapatır."""
+        deadline = time.monotonic() + float(timeout)
+        while self._pending and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+
+    # ---- iç ----
+    def _drop_oldest(self) -> None:
+        """Tüm kuyrukların başları (kuyruk içinde sıra FIFO) arasından en erken kuyruğa gireni düşürür."""
+        heads = [b for b, q in self._queues.items() if q]
+        oldest_bot = min(heads, key=lambda b: self._queues[b][0]["ts"], default=None)
+        if oldest_bot:
+            rec = self._queues[oldest_bot].pop(0)
+            self._pending.pop((rec["bot"], rec["text"]), None)
+            self.dropped += 1
+            logging.warning(f"Telegram outbox dolu; en eski mesaj düştü (toplam düşen={self.dropped})")
+
+    def _pick(self, now: float) -> Tuple[Optional[dict], float]:
+        """Gönderime hazır ilk bot'un ilk mesajı; yoksa bir sonraki uyanma süresi."""
+        wait = None
+        for bot_name, q in self._queues.items():
+            if not q:
+                continue
+            ready_at = self._next_ok.get(bot_name, 0.0)
+            if ready_at <= now:
+                return q.pop(0), 0.0
+            wait = ready_at - now if wait is None else min(wait, ready_at - now)
+        return None, (wait if wait is not None else 60.0)
+
+    def _flush_suppressed(self, now: float) -> float:
+        """Penceresi dolan bastırılmış tekrarları kuyruğa alır; bir sonraki kontrol süresini döner."""
+        next_check = 60.0
+        for key, n in list(self._suppressed.items()):
+            age = now - self._recent.get(key, 0.0)
+            if age >= self.coalesce_sec:
+                self._suppressed.pop(key, None)
+                self._recent.pop(key, None)
+                rec = {"text": key[1], "count": n, "bot": key[0], "ts": now}
+                self._queues.setdefault(key[0], []).append(rec)
+                self._pending[key] = rec
+            else:
+                next_check = min(next_check, self.coalesce_sec - age)
+        return next_check
+
+    async def _run(self) -> None:
+        while True:
+            now = time.monotonic()
+            next_check = self._flush_suppressed(now) if self._suppressed else 60.0
+            rec, wait = self._pick(now)
+            wait = min(wait, next_check)
+            if rec is None:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            key = (rec["bot"], rec["text"])
+            self._pending.pop(key, None)
+            text = rec["text"] if rec["count"] <= 1 else f"{rec['text']}\n(×{rec['count']})"
+            self._next_ok[rec["bot"]] = now + self.per_chat_interval_sec
+            try:
+                await asyncio.to_thread(send_telegram_message, text, rec["bot"], self.bots)
+                self.sent += 1
+            except Exception as e:
+                logging.warning(f"Telegram outbox gönderim hatası ({rec['bot']}): {e}")
+            self._recent[key] = time.monotonic()
+
+            # eski coalesce kayıtlarını buda (bellek sınırı)
+            if len(self._recent) > 4 * self.max_pending:
+                cutoff = time.monotonic() - self.coalesce_sec
+                for k in [k for k, ts in self._recent.items() if ts < cutoff and k not in self._suppressed]:
+                    self._recent.pop(k, None)
+
+
+TELEGRAM_OUTBOX: Optional[TelegramOutbox] = None
+
+
+def notify_telegram(message: str, bot_name: str, bots: dict) -> None:
+    """
+    Async kod için bildirim girişi: outbox çalışıyorsa kuyruğa atar ve hemen döner,
+    değilse (örn. event loop öncesi) doğrudan senkron gönderir.
+    """
+    if TELEGRAM_OUTBOX is not None:
+        TELEGRAM_OUTBOX.enqueue(message, bot_name)
+        return
+    send_telegram_message(message, bot_name, bots)
+
+
 def send_startup_info():
     """
     Kodun başlangıcında Telegram'a bilgi mesajı gönderir.
@@ -743,6 +930,48 @@ def connect_db(db_path: str | None = None):
         raise ConnectionError(f"Database open failed: {e}") from e
 
 
+def migrate_live_ts_utc(cursor, batch_size: int = 5000, pause_sec: float = 0.01) -> None:
+    """
+    global_live_data için çevrimiçi göç:
+      1) ts_utc INTEGER kolonu yoksa ekler (ALTER TABLE ADD COLUMN anlıktır)
+      2) Eski satırları id aralıkları halinde doldurur: her parti ayrı commit edilir ve partiler
+         arasında pause_sec beklenir → yazma kilidi parti başına kısa tutulur, diğer yazıcılar araya girer
+      3) (symbol, ts_utc, live_price) kapsayan indeksini oluşturur
+    Tekrar çalıştırmak güvenlidir; doldurulacak satır yoksa hızlıca çıkar.
+    """
+    cursor.execute(f"PRAGMA table_info({GLOBAL_LIVE_TABLE})")
+    cols = {row[1] for row in cursor.fetchall()}
+    if LIVE_EPOCH_COL not in cols:
+        cursor.execute(f"ALTER TABLE {GLOBAL_LIVE_TABLE} ADD COLUMN {LIVE_EPOCH_COL} INTEGER")
+        logging.info(f"{GLOBAL_LIVE_TABLE}: {LIVE_EPOCH_COL} kolonu eklendi.")
+
+    cursor.execute(f"SELECT MIN(id), MAX(id) FROM {GLOBAL_LIVE_TABLE} WHERE {LIVE_EPOCH_COL} IS NULL")
+    lo, hi = cursor.fetchone() or (None, None)
+    filled = 0
+    if lo is not None and hi is not None:
+        start = int(lo) - 1
+        while start < int(hi):
+            end = start + int(batch_size)
+            cursor.execute(f"""
+                UPDATE {GLOBAL_LIVE_TABLE}
+                SET {LIVE_EPOCH_COL} = CAST(strftime('%s', {LIVE_TS_COL}) AS INTEGER)
+                WHERE id > ? AND id <= ? AND {LIVE_EPOCH_COL} IS NULL
+            """, (start, end))
+            filled += max(0, cursor.rowcount or 0)
+            start = end
+            conn = cursor.connection
+            if conn.in_transaction:          # autocommit dışı bağlantıda parti kilidini bırak
+                conn.commit()
+            if pause_sec and start < int(hi):
+                time.sleep(pause_sec)        # bekleyen yazıcılara (canlı veri) sıra ver
+        logging.info(f"{GLOBAL_LIVE_TABLE}: {filled} satır için {LIVE_EPOCH_COL} dolduruldu.")
+
+    cursor.execute(f"""
+        CREATE INDEX IF NOT EXISTS idx_gld_symbol_ts
+        ON {GLOBAL_LIVE_TABLE}(symbol, {LIVE_EPOCH_COL}, {LIVE_PRICE_COL})
+    """)
+
+
 def create_global_tables(cursor):
     """
     Gerekli tabloları oluşturur.
@@ -756,9 +985,11 @@ def create_global_tables(cursor):
             change_15M FLOAT,
             change_1H FLOAT,
             change_4H FLOAT,
-            change_1D FLOAT
+            change_1D FLOAT,
+            ts_utc INTEGER
         )
     """)
+    migrate_live_ts_utc(cursor)
     cursor.execute(f"""
         CREATE TABLE IF NOT EXISTS {GLOBAL_CLOSING_TABLE} (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -809,6 +1040,24 @@ def create_global_tables(cursor):
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_gc4h_symbol ON global_close_4h(symbol)")
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_gc4h_bucket ON global_close_4h(ts_bucket_utc)")
 
+    # OHLC rollup'ları: (symbol, ts_bucket_utc) UNIQUE → aralık sorguları bu indeksten okunur
+    for tf, table in OHLC_TABLES.items():
+        cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {table} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            symbol TEXT NOT NULL,
+            ts_bucket_utc INTEGER NOT NULL,
+            open REAL NOT NULL,
+            high REAL NOT NULL,
+            low REAL NOT NULL,
+            close REAL NOT NULL,
+            ticks INTEGER NOT NULL DEFAULT 1,
+            updated_at_utc INTEGER NOT NULL,
+            UNIQUE(symbol, ts_bucket_utc)
+        )
+        """)
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_go{tf}_bucket ON {table}(ts_bucket_utc)")
+
 async def clean_old_data_task(cursor, conn):
     """
     Eski verileri düzenli olarak temizler.
@@ -816,11 +1065,18 @@ async def clean_old_data_task(cursor, conn):
     while True:
         try:
             for table_name, limit in RECORD_LIMITS.items():
+                # kova tablolarında zaman kolonu ts_bucket_utc, canlı tabloda ts_utc'dir
+                if table_name.startswith(("global_close_", "global_ohlc_")):
+                    order_col = "ts_bucket_utc"
+                elif table_name == GLOBAL_LIVE_TABLE:
+                    order_col = LIVE_EPOCH_COL
+                else:
+                    order_col = "timestamp"
                 cursor.execute(f"""
                     DELETE FROM {table_name}
                     WHERE id NOT IN (
                         SELECT id FROM {table_name}
-                        ORDER BY timestamp DESC LIMIT ?
+                        ORDER BY {order_col} DESC LIMIT ?
                     )
                 """, (limit,))
                 deleted_rows = cursor.rowcount
@@ -829,7 +1085,7 @@ async def clean_old_data_task(cursor, conn):
             conn.commit()
         except Exception as e:
             logging.error(f"Error in clean_old_data_task: {e}")
-            send_telegram_message(f"❌ Temizlik Hatası: {str(e)}", "main_bot", bots)
+            notify_telegram(f"❌ Temizlik Hatası: {str(e)}", "main_bot", bots)
 
 
         await asyncio.sleep(3600)  # Her saat başı temizlik yap
@@ -852,6 +1108,67 @@ def save_period_close(cursor, conn, symbol: str, price: float, now_dt: datetime,
     """, (symbol, bstart, price, now_epoch))
     conn.commit()
 
+def save_period_ohlc(cursor, conn, symbol: str, price: float, now_dt: datetime,
+                     tfs: tuple = ("15m", "1h", "4h", "1d")) -> None:
+    """
+    Gelen fiyatı her tf için o anki kovanın OHLC + tick sayısına işler (UPSERT).
+    - open: kovanın ilk fiyatı (çakışmada korunur)
+    - high/low: MAX/MIN
+    - close: son fiyat, ticks: +1
+    Tüm tf'ler tek commit ile yazılır.
+    """
+    now_epoch = int(now_dt.replace(tzinfo=timezone.utc).timestamp())
+    p = float(price)
+    for tf in tfs:
+        table = OHLC_TABLES[tf]
+        bstart = bucket_start(now_dt, tf)
+        cursor.execute(f"""
+            INSERT INTO {table} (symbol, ts_bucket_utc, open, high, low, close, ticks, updated_at_utc)
+            VALUES (?, ?, ?, ?, ?, ?, 1, ?)
+            ON CONFLICT(symbol, ts_bucket_utc)
+            DO UPDATE SET high=MAX(high, excluded.high),
+                          low=MIN(low, excluded.low),
+                          close=excluded.close,
+                          ticks=ticks + 1,
+                          updated_at_utc=excluded.updated_at_utc
+        """, (symbol, bstart, p, p, p, p, now_epoch))
+    conn.commit()
+
+def publish_index_feed(cursor, writer: "IndexFeedWriter", symbols: list[str],
+                       ema_period: int = 20, bars: int = 60) -> Optional[int]:
+    """
+    OHLC rollup'larından her endeks/tf için son close + EMA(ema_period) hesaplar ve
+    mmap feed'e yazar. Sorgular (symbol, ts_bucket_utc) indeksinden okunur.
+    Dönüş: yayınlanan seq (hata olursa None).
+    """
+    snapshot: Dict[str, Dict[str, Dict[str, Any]]] = {}
+    now_dt = datetime.now(timezone.utc)
+    try:
+        for sym in symbols:
+            per_tf: Dict[str, Dict[str, Any]] = {}
+            for tf in FEED_TIMEFRAMES:
+                since = bucket_start(now_dt, tf) - (bars - 1) * TIMEFRAME_SECONDS[tf]
+                cursor.execute(f"""
+                    SELECT ts_bucket_utc, close
+                    FROM {OHLC_TABLES[tf]}
+                    WHERE symbol = ? AND ts_bucket_utc >= ?
+                    ORDER BY ts_bucket_utc
+                """, (sym, since))
+                rows = cursor.fetchall()
+                if not rows:
+                    continue
+                closes = [float(r[1]) for r in rows]
+                per_tf[tf] = {
+                    "close": closes[-1],
+                    "ema20": compute_ema(closes, ema_period),
+                    "bucket": int(rows[-1][0]),
+                }
+            snapshot[index_key(sym)] = per_tf
+        return writer.publish(snapshot)
+    except Exception as e:
+        logging.warning(f"index feed publish failed: {e}")
+        return None
+
 def get_reference_close(
     cursor,
     symbol: str,
@@ -1091,13 +1408,13 @@ def check_price_limits(symbol, price, bots):
         if price < lower_limit:
             message = f"⚠️ {symbol}: Fiyat {price} alt limite ({lower_limit}) düştü!"
             logging.warning(message)
-            send_telegram_message(message, "alerts_bot", bots)
+            notify_telegram(message, "alerts_bot", bots)
 
         # Limitlerin üstüne çıkarsa uyarı gönder
         elif price > upper_limit:
             message = f"⚠️ {symbol}: Fiyat {price} üst limite ({upper_limit}) çıktı!"
             logging.warning(message)
-            send_telegram_message(message, "alerts_bot", bots)
+            notify_telegram(message, "alerts_bot", bots)
 
         # Eğer fiyat sınırlar içinde ise bilgi logu
         else:
@@ -1218,6 +1535,7 @@ async def save_live_data(cursor, conn, symbol, live_price, changes, now=None):
       - Fiyat eşitliği toleranslı kontrol (symbol bazlı abs/rel tolerans).
       - Uzun süre değişim yoksa zorunlu snapshot (default 5 dk).
       - Zaman damgası to_sqlite_dt(now) ile ISO string olarak yazılır.
+      - Aynı an ts_utc (INTEGER epoch) kolonuna da yazılır; okumalar bu kolondan yapılır.
       - Uyarılar Telegram'a JSON formatında iletilir (parse sorunlarını azaltır).
 
     Notlar:
@@ -1282,7 +1600,7 @@ async def save_live_data(cursor, conn, symbol, live_price, changes, now=None):
             _bots = globals().get("bots", {})
             payload = {"event": event, "ts": int(time.time()), **fields}
             text = json.dumps(payload, ensure_ascii=False)
-            send_telegram_message(text, "alerts_bot", _bots)  # parse-mode otomatik yönetiliyor
+            notify_telegram(text, "alerts_bot", _bots)  # outbox: event loop bloklanmaz
         except Exception:
             pass
 
@@ -1310,7 +1628,7 @@ async def save_live_data(cursor, conn, symbol, live_price, changes, now=None):
             SELECT live_price
             FROM global_live_data
             WHERE symbol = ?
-            ORDER BY timestamp DESC
+            ORDER BY ts_utc DESC
             LIMIT 1
             """,
             (clean_sym,),
@@ -1341,8 +1659,8 @@ async def save_live_data(cursor, conn, symbol, live_price, changes, now=None):
 
     sql = """
         INSERT INTO global_live_data (
-            timestamp, symbol, live_price, change_15M, change_1H, change_4H, change_1D
-        ) VALUES (?, ?, ?, ?, ?, ?, ?)
+            timestamp, symbol, live_price, change_15M, change_1H, change_4H, change_1D, ts_utc
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
     """
     params = (
         ts_text,
@@ -1352,6 +1670,7 @@ async def save_live_data(cursor, conn, symbol, live_price, changes, now=None):
         None if ch_1h  is None else float(ch_1h),
         None if ch_4h  is None else float(ch_4h),
         None if ch_1d  is None else float(ch_1d),
+        int(now.timestamp()),
     )
 
     try:
@@ -1449,20 +1768,19 @@ def calculate_changes(
         if ref is None or (isinstance(ref, (int, float)) and ref <= 0):
             try:
                 secs = TIMEFRAME_SECONDS[tf]
-                target_dt = now_dt - timedelta(seconds=secs)
-                target_ts_text = to_sqlite_dt(target_dt)  # 'YYYY-MM-DD HH:MM:SS' (UTC)
+                target_epoch = int((now_dt - timedelta(seconds=secs)).timestamp())
 
                 # NOT: Şemanıza göre sabitler dosyanın başında tanımlı olmalı:
                 # LIVE_TABLE_NAME = "global_live_data"
                 # LIVE_PRICE_COL  = "live_price"
-                # LIVE_TS_COL     = "timestamp"
+                # LIVE_EPOCH_COL  = "ts_utc"
                 cursor.execute(f"""
                     SELECT {LIVE_PRICE_COL}
                     FROM {LIVE_TABLE_NAME}
-                    WHERE symbol = ? AND {LIVE_TS_COL} <= ?
-                    ORDER BY {LIVE_TS_COL} DESC
+                    WHERE symbol = ? AND {LIVE_EPOCH_COL} <= ?
+                    ORDER BY {LIVE_EPOCH_COL} DESC
                     LIMIT 1
-                """, (sym, target_ts_text))
+                """, (sym, target_epoch))
                 row = cursor.fetchone()
                 if row and row[0] and float(row[0]) > 0:
                     ref = float(row[0])
@@ -1529,7 +1847,7 @@ def get_latest_live_data(cursor, symbol):
             SELECT live_price, timestamp
             FROM global_live_data
             WHERE symbol = ?
-            ORDER BY timestamp DESC
+            ORDER BY ts_utc DESC
             LIMIT 1
         """, (symbol,))
         result = cursor.fetchone()
@@ -1617,7 +1935,7 @@ async def run_fetching_cycle(
                         except Exception as process_error:
                             logging.error(f"Error processing {symbol}: {process_error}")
                             try:
-                                send_telegram_message(
+                                notify_telegram(
                                     f"⚠️ Veri işleme hatası: {symbol}\nHata: {str(process_error)}",
                                     "alerts_bot",
                                     bots,
@@ -1628,14 +1946,14 @@ async def run_fetching_cycle(
                     error_message = f"Failed to fetch live price for {symbol}."
                     logging.error(error_message)
                     try:
-                        send_telegram_message(f"⚠️ {error_message}", "alerts_bot", bots)
+                        notify_telegram(f"⚠️ {error_message}", "alerts_bot", bots)
                     except Exception:
                         logging.warning("Telegram bildirimi gönderilemedi (price missing).")
 
         except Exception as e:
             logging.error(f"Error in fetching cycle: {e}", exc_info=True)
             try:
-                send_telegram_message(f"❌ Veri Kaydı Hatası: {e}", "alerts_bot", bots)
+                notify_telegram(f"❌ Veri Kaydı Hatası: {e}", "alerts_bot", bots)
             except Exception:
                 logging.warning("Telegram bildirimi gönderilemedi (cycle error).")
 
@@ -1653,7 +1971,7 @@ async def run_fetching_cycle(
             )
             logging.warning(warning_message)
             try:
-                send_telegram_message(warning_message, "alerts_bot", bots)
+                notify_telegram(warning_message, "alerts_bot", bots)
             except Exception:
                 logging.warning("Telegram bildirimi gönderilemedi (inactive warn).")
 
@@ -1665,6 +1983,8 @@ async def main_trading(
     conn,
     cursor,
     fetch_cfg: dict,
+    feed_cfg: Optional[dict] = None,
+    outbox_cfg: Optional[dict] = None,
 ) -> None:
     """
     Semboller için fiyatları çeker, limitleri kontrol eder ve DB'ye yazar.
@@ -1680,6 +2000,14 @@ async def main_trading(
             - timeout_sec (int, varsayılan: 30)  # wait_seconds ile geri uyumlu
             - fetch_every_sec (int, varsayılan: 60)
             - concurrency (int, varsayılan: 1)
+        feed_cfg: "index_feed" bölümü (opsiyonel):
+            - enabled (bool, varsayılan: True)
+            - path (str, varsayılan: /dev/shm/tradebot_index_feed.bin)
+            - ema_period (int, varsayılan: 20)
+        outbox_cfg: "telegram_outbox" bölümü (opsiyonel):
+            - max_pending (int, varsayılan: 200)
+            - per_chat_interval_sec (float, varsayılan: 1.0)
+            - coalesce_sec (float, varsayılan: 300)
     """
     # --- JSON → çalışma parametreleri ---
     retries         = int(fetch_cfg.get("retries", 3))
@@ -1692,6 +2020,29 @@ async def main_trading(
     stale_live_max_sec  = int(fetch_cfg.get("stale_live_max_sec", 600))     # 10 dk
     stale_symbol_max_sec= int(fetch_cfg.get("stale_symbol_max_sec", 900))   # 15 dk
 
+    # Telegram outbox: döngü içi bildirimler kuyruğa atılır, arka planda gönderilir
+    global TELEGRAM_OUTBOX
+    outbox_cfg = outbox_cfg or {}
+    if bots and TELEGRAM_OUTBOX is None:
+        TELEGRAM_OUTBOX = TelegramOutbox(
+            bots,
+            max_pending=int(outbox_cfg.get("max_pending", 200)),
+            per_chat_interval_sec=float(outbox_cfg.get("per_chat_interval_sec", 1.0)),
+            coalesce_sec=float(outbox_cfg.get("coalesce_sec", 300)),
+        )
+        TELEGRAM_OUTBOX.start()
+
+    # Endeks snapshot yayını (mmap)
+    feed_cfg = feed_cfg or {}
+    feed_writer = None
+    feed_ema_period = int(feed_cfg.get("ema_period", 20))
+    if feed_cfg.get("enabled", True):
+        try:
+            feed_writer = IndexFeedWriter(feed_cfg.get("path") or DEFAULT_FEED_PATH)
+            logging.info(f"Index feed aktif: {feed_writer.path} (seq={feed_writer.seq})")
+        except Exception:
+            logging.exception("Index feed açılamadı; yayın devre dışı")
+
     # Başlatma mesajı (opsiyonel)
     try:
         script_path = os.path.abspath(__file__)
@@ -1704,9 +2055,10 @@ async def main_trading(
             f"  - Canlı: {GLOBAL_LIVE_TABLE}\n"
             f"  - Günlük Kapanış: {GLOBAL_CLOSING_TABLE}\n"
             f"  - Periyot Kapanışları: global_close_15m / _1h / _4h\n"
+            f"  - OHLC Rollup: global_ohlc_15m / _1h / _4h / _1d\n"
         )
         if bots:
-            send_telegram_message(message, "main_bot", bots)
+            notify_telegram(message, "main_bot", bots)
     except Exception:
         logging.warning("Başlatma mesajı gönderilemedi.", exc_info=True)
 
@@ -1784,12 +2136,22 @@ async def main_trading(
                 except Exception:
                     logging.exception(f"[{symbol}] save_period_close hatası")
 
+                # 2.4.1) OHLC rollup'ları (15m/1h/4h/1d) artımlı güncelle
+                try:
+                    save_period_ohlc(cursor, conn, symbol, price, now)
+                except Exception:
+                    logging.exception(f"[{symbol}] save_period_ohlc hatası")
+
                 # 2.5) Günlük kapanışı işle (aynı gün için ikinci kez yazmaz)
                 try:
                     await save_closing_price(cursor, conn, symbol, price, now)
                 except Exception:
                     logging.exception(f"[{symbol}] save_closing_price hatası")
 
+            # 2.6) Güncel endeks snapshot'ını futures botuna yayınla
+            if feed_writer is not None:
+                publish_index_feed(cursor, feed_writer, symbols, ema_period=feed_ema_period)
+
             # global ve sembol-bazlı “akış durdu mu?” kontrollerini yapar,
             #  6 saatte bir (veya config’ten ayarlanabilir) heartbeat mesajı yollar.
                         # 3) Döngü arası bekleme ÖNCESİ: Heartbeat & Stale kontrolleri
@@ -1812,7 +2174,7 @@ async def main_trading(
                                 f"Son canlı kayıt {delta_live} sn önce atıldı.\n"
                                 f"Beklenen max: {stale_liveMax} sn."
                             )
-                            send_telegram_message(msg, "alerts_bot", bots)
+                            notify_telegram(msg, "alerts_bot", bots)
                             logging.warning(msg)
                 except Exception:
                     logging.exception("Global stale kontrolü sırasında hata")
@@ -1834,7 +2196,7 @@ async def main_trading(
                             f"Geciken: {', '.join(late_syms)}\n"
                             f"Eşik: {stale_symMax} sn"
                         )
-                        send_telegram_message(msg, "alerts_bot", bots)
+                        notify_telegram(msg, "alerts_bot", bots)
                         logging.warning(msg)
                 except Exception:
                     logging.exception("Sembol-bazlı stale kontrolü sırasında hata")
@@ -1857,7 +2219,7 @@ async def main_trading(
                             f"Son canlı insert: {live_age} sn önce\n"
                             f"DB: {DB_NAME}"
                         )
-                        send_telegram_message(hb_msg, "main_bot", bots)
+                        notify_telegram(hb_msg, "main_bot", bots)
                         logging.info("Heartbeat gönderildi.")
                         LAST_HEARTBEAT_TS = now_epoch
                 except Exception:
@@ -1875,7 +2237,7 @@ async def main_trading(
             logging.error(f"Error in main_trading loop: {e}", exc_info=True)
             if bots:
                 try:
-                    send_telegram_message(f"❌ Error in main_trading loop: {str(e)}", "main_bot", bots)
+                    notify_telegram(f"❌ Error in main_trading loop: {str(e)}", "main_bot", bots)
                 except Exception:
                     logging.warning("Telegram bildirimi gönderilemedi (loop error).")
 
@@ -1964,6 +2326,7 @@ if __name__ == "__main__":
                 "global_close_15m": "global_close_15m",
                 "global_close_1h":  "global_close_1h",
                 "global_close_4h":  "global_close_4h",
+                **{t: t for t in OHLC_TABLES.values()},
             }
             for key, limit in cfg["retention"].items():
                 table = mapping.get(key)
@@ -1976,7 +2339,9 @@ if __name__ == "__main__":
                     logger.warning(f"Bilinmeyen retention anahtarı: {key}")
 
         # 9) Ana işlem döngüsü
-        asyncio.run(main_trading(global_symbols, bots, conn, cursor, fetch_cfg))
+        asyncio.run(main_trading(global_symbols, bots, conn, cursor, fetch_cfg,
+                                 feed_cfg=cfg.get("index_feed") or {},
+                                 outbox_cfg=cfg.get("telegram_outbox") or {}))
 
     except FileNotFoundError as e:
         logger.error(f"File not found: {e}", exc_info=True)
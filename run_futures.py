@@ -10,17 +10,108 @@ Bu komutla dosya doğrudan çalıştırılır, çünkü shebang satırı Python
 
 
 #!/usr/bin/env python3
+# Çok çekirdek: ./run_futures.py --workers 4
+#   supervisor süreci ShardCoordinator'ı (Unix soket) çalıştırır, whitelist'i 4 worker sürecine böler;
+#   çöken worker geri çekilmeli (backoff) yeniden başlatılır. SIGINT/SIGTERM worker'lara iletilir.
+import argparse
 import asyncio
+import logging
+import os
+import signal
 import sys
+import time
 ROOT = "/opt/tradebot"
 if ROOT not in sys.path:
     sys.path.insert(0, ROOT)
-from future_trade.app import main as app_main  # noqa: E402
+from future_trade.app import main as app_main, CONFIG_PATH  # noqa: E402
+from future_trade.config_loader import load_config  # noqa: E402
+from future_trade.shard_coordinator import ShardCoordinator, DEFAULT_SOCKET_PATH  # noqa: E402
+
+
+def _parse_args():
+    ap = argparse.ArgumentParser(description="Futures bot (tek süreç | supervisor | shard worker)")
+    ap.add_argument("--workers", type=int, default=int(os.environ.get("FUTURE_TRADE_WORKERS", "1")),
+                    help="worker süreç sayısı (>1 → supervisor modu)")
+    ap.add_argument("--shard", type=int, default=None, help="(iç) worker shard indeksi")
+    ap.add_argument("--shards", type=int, default=None, help="(iç) toplam shard sayısı")
+    ap.add_argument("--coordinator", default=DEFAULT_SOCKET_PATH, help="koordinatör Unix soket yolu")
+    return ap.parse_args()
+
+
+BACKOFF_MAX_SEC = 60
+
+
+async def _worker(i: int, n: int, sock: str, stop: asyncio.Event, log: logging.Logger):
+    """
+    Tek worker sürecini ayakta tutar; beklenmedik çıkışta 2,4,…,60 sn bekleyip yeniden başlatır.
+    Tavandan (60 sn) uzun sağlıklı çalışmış bir worker'ın çöküşü yeni seri sayılır (backoff 2'ye döner).
+    """
+    backoff = 2
+    while not stop.is_set():
+        started = time.monotonic()
+        proc = await asyncio.create_subprocess_exec(
+            sys.executable, os.path.abspath(__file__),
+            "--shard", str(i), "--shards", str(n), "--coordinator", sock,
+        )
+        log.info(f"[SUPERVISOR] shard {i}/{n} started pid={proc.pid}")
+        waiter = asyncio.ensure_future(proc.wait())
+        stopper = asyncio.ensure_future(stop.wait())
+        await asyncio.wait({waiter, stopper}, return_when=asyncio.FIRST_COMPLETED)
+        if stop.is_set():
+            stopper.cancel()
+            if proc.returncode is None:
+                proc.send_signal(signal.SIGTERM)
+                try:
+                    await asyncio.wait_for(waiter, timeout=30)
+                except asyncio.TimeoutError:
+                    proc.kill()
+                    await waiter
+            log.info(f"[SUPERVISOR] shard {i}/{n} stopped rc={proc.returncode}")
+            return
+        stopper.cancel()
+        if time.monotonic() - started > BACKOFF_MAX_SEC:
+            backoff = 2
+        log.error(f"[SUPERVISOR] shard {i}/{n} exited rc={proc.returncode}; restart in {backoff}s")
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=backoff)
+        except asyncio.TimeoutError:
+            pass
+        backoff = min(BACKOFF_MAX_SEC, backoff * 2)
+
+
+async def supervise(workers: int, sock: str):
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s [supervisor] %(message)s")
+    log = logging.getLogger("supervisor")
+    cfg_env = os.environ.get("FUTURE_TRADE_CONFIG")
+    cfg = await load_config(cfg_env or CONFIG_PATH)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            pass
+
+    coord = ShardCoordinator(cfg, path=sock, logger=logging.getLogger("shard_coordinator"))
+    serve = asyncio.create_task(coord.serve(stop), name="coordinator")
+    await asyncio.sleep(0.2)  # soket hazır olsun; worker'lar ilk istekte bağlanır
+    n = min(workers, max(1, len(cfg.get("symbols_whitelist") or [])))
+    log.info(f"[SUPERVISOR] {n} workers over {len(cfg.get('symbols_whitelist') or [])} symbols")
+    await asyncio.gather(*(_worker(i, n, sock, stop, log) for i in range(n)))
+    await serve
 
 
 if __name__ == "__main__":
+    args = _parse_args()
     try:
-        asyncio.run(app_main())
+        if args.shard is not None:
+            asyncio.run(app_main(shard_index=args.shard, shard_count=args.shards,
+                                 coordinator_path=args.coordinator))
+        elif args.workers > 1:
+            asyncio.run(supervise(args.workers, args.coordinator))
+        else:
+            asyncio.run(app_main())
     except KeyboardInterrupt:
         print("Bot durduruldu (Ctrl+C)")
     except Exception as e:
@@ -26,12 +26,24 @@ def get_columns(cursor, table):
         "not_null": bool(col[3]),
         "default": col[4]
     } for col in cursor.fetchall()]
+def get_time_column(cursor, table):
+    """
+    Sıralama/filtre için zaman kolonu: ts_utc (INTEGER epoch, indeksli) varsa onu,
+    yoksa timestamp metin kolonunu döndürür.
+    """
+    cursor.execute(f"PRAGMA table_info({table})")
+    cols = [col[1] for col in cursor.fetchall()]
+    if "ts_utc" in cols:
+        return "ts_utc"
+    return "timestamp" if "timestamp" in cols else None
+
 def get_last_price(cursor, table, symbol):
     try:
+        ts_col = get_time_column(cursor, table) or "timestamp"
         cursor.execute(f"""
             SELECT close FROM {table}
             WHERE symbol = ?
-            ORDER BY timestamp DESC LIMIT 1
+            ORDER BY {ts_col} DESC LIMIT 1
         """, (symbol,))
         result = cursor.fetchone()
         return float(result[0]) if result else None
@@ -51,10 +63,11 @@ def get_last_timestamp(cursor: sqlite3.Cursor, table: str, symbol: str) -> str |
         str | None: En son timestamp değeri veya None.
     """
     try:
+        ts_col = get_time_column(cursor, table) or "timestamp"
         query = f"""
             SELECT timestamp FROM {table}
             WHERE symbol = ?
-            ORDER BY timestamp DESC
+            ORDER BY {ts_col} DESC
             LIMIT 1
         """
         cursor.execute(query, (symbol,))
@@ -140,6 +153,14 @@ def get_recent_data(cursor, table, days=30):
         return []  # Analiz için uygun değil
 
     try:
+        if "ts_utc" in columns:
+            cursor.execute(f"""
+                SELECT timestamp, {value_column}
+                FROM {table}
+                WHERE ts_utc >= ?
+                ORDER BY ts_utc ASC
+            """, (int(since.timestamp()),))
+            return cursor.fetchall()
         cursor.execute(f"""
             SELECT timestamp, {value_column}
             FROM {table}
@@ -270,10 +291,11 @@ def analyze_table_structure(cursor, table):
     last_timestamp = None
     last_value = None
     if value_column and timestamp_column:
+        order_column = "ts_utc" if "ts_utc" in column_names else timestamp_column
         cursor.execute(f"""
             SELECT {timestamp_column}, {value_column}
             FROM {table}
-            ORDER BY {timestamp_column} DESC
+            ORDER BY {order_column} DESC
             LIMIT 1
         """)
         result = cursor.fetchone()